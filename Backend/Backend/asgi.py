@@ -3,14 +3,30 @@ ASGI config for Backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Requests served here resolve against ``Backend.urls_async``, which routes the
+hot read endpoints to async views so they don't each occupy a thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Backend.settings')
 
-application = get_asgi_application()
+import django
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
+
+django.setup(set_prefix=False)
+
+
+class AsyncURLConfRequest(ASGIRequest):
+    # BaseHandler.resolve_request() honours a per-request urlconf.
+    urlconf = 'Backend.urls_async'
+
+
+class AsyncURLConfHandler(ASGIHandler):
+    request_class = AsyncURLConfRequest
+
+
+application = AsyncURLConfHandler()
@@ -0,0 +1,88 @@
+"""
+ASGI-native read endpoints.
+
+DRF views are synchronous, so under ASGI every request to one is handed to
+a thread and holds it for its whole lifetime, slow clients included.
+``AsyncAPIView`` is a small async counterpart for read-only endpoints: it
+authenticates with ``aauthenticate`` (token verification runs off the event
+loop), lets subclasses query through the async ORM and serialize with the
+existing serializers, and renders the same JSON the DRF views do.
+
+The async views are only routed under ASGI (see ``Backend.asgi`` and
+``Backend.urls_async``); WSGI workers keep serving the sync views, which
+avoids spinning up an event loop per request there.
+"""
+from abc import ABC, abstractmethod
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+
+class AsyncAPIView(ABC, View):
+    """
+    Subclasses implement ``async def aget(self, request, **kwargs)``, where
+    ``request`` is a DRF ``Request`` with ``user`` already set, and return a
+    DRF ``Response`` or a plain ``HttpResponse``. Serializers must only touch
+    rows and relations loaded up front (select_related/prefetch_related):
+    a lazy query in async code raises ``SynchronousOnlyOperation``.
+    """
+    http_method_names = ['get', 'head', 'options']
+    authentication_classes = ()
+    require_authentication = False
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Views are only instantiated per request; refuse to route an
+        # incomplete one when the URLconf loads instead.
+        if cls.__abstractmethods__:
+            raise TypeError(f"Can't route {cls.__name__} without {', '.join(sorted(cls.__abstractmethods__))}")
+        return super().as_view(**initkwargs)
+
+    async def get(self, request, *args, **kwargs):
+        request = Request(request)
+        try:
+            request.user = await self.aauthenticate(request)
+            if self.require_authentication and not request.user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            self.initial(request, *args, **kwargs)
+            response = await self.aget(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            response = self.handle_exception(exc)
+        if isinstance(response, Response):
+            response = self.render(response)
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        # Runs after authentication, like DRF's APIView.initial.
+        pass
+
+    @abstractmethod
+    async def aget(self, request, *args, **kwargs):
+        pass
+
+    async def aauthenticate(self, request):
+        for authentication_class in self.authentication_classes:
+            result = await authentication_class().aauthenticate(request)
+            if result is not None:
+                return result[0]
+        return AnonymousUser()
+
+    def handle_exception(self, exc):
+        # Same bodies as DRF's exception handler. Firebase auth sends no
+        # WWW-Authenticate challenge, so DRF answers 403 rather than 401.
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.status_code = 403
+        detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        return Response(detail, status=exc.status_code)
+
+    def render(self, response):
+        return HttpResponse(
+            JSONRenderer().render(response.data),
+            status=response.status_code,
+            content_type='application/json',
+        )
@@ -0,0 +1,149 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``. Reads go to the ``DATABASE_REPLICA`` alias
+only while a view that opts in with ``ReplicaReadMixin`` handles a GET or
+HEAD, and only for users who haven't written anything in the last
+``DATABASE_REPLICA_STICKY_SECONDS``: the replica may not have their change
+yet, so they read their own writes from the primary until it has. Every
+other read, including the auth user lookup that runs before a view decides,
+stays on the primary.
+
+The "wrote recently" marker lives in the ``DATABASE_REPLICA_STICKY_CACHE``
+alias, which must be shared by every web process (file-based, Redis,
+Memcached, database): a user's next request may land on another worker.
+Process-local backends are refused as soon as the middleware loads.
+
+Only views whose GET never writes may opt in. The cached catalogue views
+(``services.cache``) deliberately don't: a page filled from a lagging
+replica right after a write would be cached under the new catalogue
+version and served stale until the next one.
+
+With ``DATABASE_REPLICA`` unset the router sends everything to ``default``.
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.permissions import SAFE_METHODS
+
+_state = ContextVar('db_routing', default=None)
+
+# Backends whose entries other processes can't see.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class RoutingState:
+    def __init__(self):
+        self.user = None
+        self.replica = False
+        self.wrote = False
+
+
+def _sticky_key(user):
+    return f'db-sticky:{user.pk}'
+
+
+def sticky_cache():
+    """The cache holding the sticky markers; ImproperlyConfigured unless shared."""
+    alias = getattr(settings, 'DATABASE_REPLICA_STICKY_CACHE', 'default')
+    if alias not in settings.CACHES:
+        raise ImproperlyConfigured(f"DATABASE_REPLICA_STICKY_CACHE {alias!r} is not in CACHES.")
+    if settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_CACHES:
+        raise ImproperlyConfigured(
+            f"DATABASE_REPLICA_STICKY_CACHE {alias!r} is local to each process; "
+            "with DATABASE_REPLICA set it must be shared by every web worker."
+        )
+    return caches[alias]
+
+
+def bind_user(user):
+    """Called by authentication once the request's user is known."""
+    state = _state.get()
+    if state is not None:
+        state.user = user
+
+
+def use_replica():
+    """Route the rest of this request's reads to the replica, if allowed."""
+    state = _state.get()
+    if state is None or not getattr(settings, 'DATABASE_REPLICA', None):
+        return
+    if state.user is not None and sticky_cache().get(_sticky_key(state.user)):
+        return
+    state.replica = True
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.replica:
+            return settings.DATABASE_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same rows.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema along with the data (see sync_replica).
+        return db == 'default'
+
+
+class DatabaseRoutingMiddleware:
+    """Scopes routing state to one request and makes writers sticky."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        if getattr(settings, 'DATABASE_REPLICA', None):
+            sticky_cache()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            return self.get_response(request)
+        finally:
+            _state.reset(token)
+            self.finish(state)
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            return await self.get_response(request)
+        finally:
+            _state.reset(token)
+            self.finish(state)
+
+    def finish(self, state):
+        if state.wrote and state.user is not None and getattr(settings, 'DATABASE_REPLICA', None):
+            sticky_cache().set(_sticky_key(state.user), True, getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 10))
+
+
+class ReplicaReadMixin:
+    """For DRF and async views whose GET only reads: serve it from the replica."""
+
+    def initial(self, request, *args, **kwargs):
+        # Runs after authentication, so the user's stickiness is known.
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            use_replica()
@@ -0,0 +1,360 @@
+"""
+Prometheus metrics that add up across worker processes.
+
+Every process keeps its samples in its own memory-mapped file under
+``METRICS_DIR``; an increment is a dict lookup and an 8-byte write, with no
+syscall. ``GET /metrics`` reads every file in the directory, sums matching
+samples and renders the text exposition format, so whichever worker serves
+the scrape reports for all of them. Gauges live in separate per-process
+files and only count while their process is alive.
+
+Point ``METRICS_DIR`` at a directory shared by all workers and empty it
+when the server starts (counters from a previous deploy would otherwise be
+added in). Without it each process uses a private temporary directory and
+reports only itself, which is fine for runserver and tests.
+"""
+import bisect
+import functools
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import weakref
+from collections import defaultdict
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Request methods kept as labels; anything else is counted as 'other'.
+HTTP_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'})
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HEADER = 8
+_INITIAL_SIZE = 1 << 16
+
+
+class MmapStore:
+    """
+    ``{key: float}`` in a file: an 8-byte header holding the bytes used, then
+    entries of ``u32 key length, key (padded to 8 bytes), f64 value``.
+    Values are only ever written in place, so readers in other processes
+    can scan the file while it is being updated.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._file = os.fdopen(fd, 'r+b')
+        size = os.fstat(fd).st_size
+        if size < _INITIAL_SIZE:
+            self._file.truncate(_INITIAL_SIZE)
+            size = _INITIAL_SIZE
+        self._map = mmap.mmap(fd, size)
+        self._positions = {}
+        self._used = struct.unpack_from('<I', self._map, 0)[0] or _HEADER
+        for key, _, position in _entries(self._map, self._used):
+            self._positions[key] = position
+
+    def _position(self, key):
+        position = self._positions.get(key)
+        if position is None:
+            encoded = key.encode('utf-8')
+            padded = len(encoded) + (-(4 + len(encoded)) % 8)
+            needed = self._used + 4 + padded + 8
+            if needed > len(self._map):
+                size = len(self._map)
+                while size < needed:
+                    size *= 2
+                self._file.truncate(size)
+                self._map.close()
+                self._map = mmap.mmap(self._file.fileno(), size)
+            struct.pack_into(f'<I{padded}sd', self._map, self._used, len(encoded), encoded, 0.0)
+            position = self._used + 4 + padded
+            self._used = needed
+            # Publish the entry only once it is fully written.
+            struct.pack_into('<I', self._map, 0, self._used)
+            self._positions[key] = position
+        return position
+
+    def inc(self, key, amount=1.0):
+        position = self._position(key)
+        value = struct.unpack_from('<d', self._map, position)[0]
+        struct.pack_into('<d', self._map, position, value + amount)
+
+    def set(self, key, value):
+        struct.pack_into('<d', self._map, self._position(key), value)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _entries(buffer, used):
+    position = _HEADER
+    while position < used:
+        length = struct.unpack_from('<I', buffer, position)[0]
+        padded = length + (-(4 + length) % 8)
+        key = bytes(buffer[position + 4:position + 4 + length]).decode('utf-8')
+        value_at = position + 4 + padded
+        yield key, struct.unpack_from('<d', buffer, value_at)[0], value_at
+        position = value_at + 8
+
+
+def read_file(path):
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    if len(data) < _HEADER:
+        return []
+    used = struct.unpack_from('<I', data, 0)[0]
+    return [(key, value) for key, value, _ in _entries(data, min(used, len(data)))]
+
+
+_lock = threading.Lock()
+_stores = {}
+_private_dir = None
+
+
+def metrics_dir():
+    global _private_dir
+    configured = getattr(settings, 'METRICS_DIR', None)
+    if configured:
+        return Path(configured)
+    if _private_dir is None:
+        _private_dir = Path(tempfile.mkdtemp(prefix='metrics-'))
+    return _private_dir
+
+
+def _store(kind):
+    # Keyed by pid too, so a forked worker never writes into its parent's file.
+    pid = os.getpid()
+    store = _stores.get((kind, pid))
+    if store is None:
+        directory = metrics_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        store = _stores[(kind, pid)] = MmapStore(str(directory / f'{kind}_{pid}.db'))
+    return store
+
+
+@functools.lru_cache(maxsize=4096)
+def _key(name, labels):
+    return json.dumps([name, dict(labels)], sort_keys=True, separators=(',', ':'))
+
+
+REGISTRY = {}
+
+
+class Metric:
+    kind = None
+    store_kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY[name] = self
+
+    def _labels(self, labels):
+        if len(labels) != len(self.labelnames) or set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1.0, **labels):
+        key = _key(self.name + '_total', self._labels(labels))
+        with _lock:
+            _store(self.store_kind).inc(key, amount)
+
+
+class Gauge(Metric):
+    """Per-process value, summed over live processes."""
+    kind = 'gauge'
+    store_kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _key(self.name, self._labels(labels))
+        with _lock:
+            _store(self.store_kind).set(key, value)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        # Buckets are stored non-cumulatively and summed up on render.
+        bucket = self.buckets[bisect.bisect_left(self.buckets, value)]
+        bucket_labels = tuple(sorted(labels + (('le', _format_value(bucket)),)))
+        with _lock:
+            store = _store(self.store_kind)
+            store.inc(_key(self.name + '_bucket', bucket_labels))
+            store.inc(_key(self.name + '_sum', labels), value)
+            store.inc(_key(self.name + '_count', labels))
+
+
+REQUESTS = Counter('http_requests', 'HTTP requests by route, method and status.', ('route', 'method', 'status'))
+LATENCY = Histogram('http_request_duration_seconds', 'Request latency by route and method.', ('route', 'method'))
+AUTH_CACHE = Counter('auth_cache_requests', 'Firebase auth cache lookups.', ('cache', 'result'))
+DB_CONNECTIONS_CREATED = Counter('db_connections_created', 'Database connections opened.', ('alias',))
+DB_CONNECTIONS_OPEN = Gauge('db_connections_open', 'Database connections currently open.', ('alias',))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    """``{sample key: value}`` summed across every process's files."""
+    totals = defaultdict(float)
+    for path in metrics_dir().glob('*.db'):
+        kind, _, pid = path.stem.partition('_')
+        if kind == 'gauge' and not (pid.isdigit() and _alive(int(pid))):
+            continue
+        for key, value in read_file(path):
+            totals[key] += value
+    return totals
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value):
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _sample_line(name, labels, value):
+    if labels:
+        rendered = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+        return f'{name}{{{rendered}}} {_format_value(value)}'
+    return f'{name} {_format_value(value)}'
+
+
+def render():
+    samples = defaultdict(list)
+    for key, value in collect().items():
+        name, labels = json.loads(key)
+        samples[name].append((labels, value))
+
+    lines = []
+    for metric in REGISTRY.values():
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        if isinstance(metric, Histogram):
+            lines.extend(_histogram_lines(metric, samples))
+            continue
+        name = metric.name + ('_total' if isinstance(metric, Counter) else '')
+        for labels, value in sorted(samples.get(name, []), key=lambda row: sorted(row[0].items())):
+            lines.append(_sample_line(name, sorted(labels.items()), value))
+    return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(metric, samples):
+    buckets = defaultdict(dict)
+    for labels, value in samples.get(metric.name + '_bucket', []):
+        le = labels.pop('le')
+        buckets[tuple(sorted(labels.items()))][le] = value
+    sums = {tuple(sorted(labels.items())): value for labels, value in samples.get(metric.name + '_sum', [])}
+    counts = {tuple(sorted(labels.items())): value for labels, value in samples.get(metric.name + '_count', [])}
+
+    lines = []
+    for labels in sorted(counts):
+        running = 0.0
+        for bound in metric.buckets:
+            le = _format_value(bound)
+            running += buckets[labels].get(le, 0.0)
+            lines.append(_sample_line(metric.name + '_bucket', labels + (('le', le),), running))
+        lines.append(_sample_line(metric.name + '_sum', labels, sums.get(labels, 0.0)))
+        lines.append(_sample_line(metric.name + '_count', labels, counts[labels]))
+    return lines
+
+
+_open_connections = weakref.WeakSet()
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _open_connections.add(connection)
+    DB_CONNECTIONS_CREATED.inc(alias=connection.alias)
+
+
+def _update_connection_gauge():
+    # Also picks up connections this thread opened before the signal was hooked.
+    _open_connections.update(connections.all(initialized_only=True))
+    open_by_alias = defaultdict(int)
+    for connection in list(_open_connections):
+        if connection.connection is not None:
+            open_by_alias[connection.alias] += 1
+    for alias in settings.DATABASES:
+        DB_CONNECTIONS_OPEN.set(open_by_alias[alias], alias=alias)
+
+
+class MetricsMiddleware:
+    """Counts and times every request under its URL name."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(_on_connection_created, dispatch_uid='metrics-db-connections')
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        # Unmatched paths share one label so scanners can't blow up cardinality.
+        route = (match.url_name or match.view_name) if match else 'unmatched'
+        # Likewise any verb the client makes up.
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        REQUESTS.inc(route=route, method=method, status=response.status_code)
+        LATENCY.observe(elapsed, route=route, method=method)
+        _update_connection_gauge()
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not constant_time_compare(supplied, f'Bearer {token}'):
+            return HttpResponse(status=401)
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,88 @@
+"""
+Event-loop-native versions of the stock Django middleware in ``MIDDLEWARE``.
+
+Under ASGI, ``MiddlewareMixin`` runs every ``process_request`` and
+``process_response`` through ``sync_to_async``, and the handler does the
+same for ``process_view``: each is a hop to the one sync thread and back,
+two or three per middleware on every request, and all requests queue for
+that thread. None of these hooks does I/O on an API request, so here they
+run inline on the event loop. Sessions and messages only reach their
+storage when a request used them (the admin); those responses still go
+through the sync thread. Under WSGI the classes behave exactly like
+Django's.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import middleware as auth
+from django.contrib.messages import middleware as messages
+from django.contrib.sessions import middleware as sessions
+from django.middleware import clickjacking, common, csrf, security
+
+
+class InlineAsyncMixin:
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if self.async_mode and self.inline() and hasattr(self, 'process_view'):
+            # The handler wraps a sync process_view in sync_to_async.
+            process_view = self.process_view
+
+            async def aprocess_view(request, view_func, view_args, view_kwargs):
+                return process_view(request, view_func, view_args, view_kwargs)
+
+            self.process_view = aprocess_view
+
+    async def __acall__(self, request):
+        if not self.inline():
+            return await super().__acall__(request)
+        response = None
+        if hasattr(self, 'process_request'):
+            response = self.process_request(request)
+        response = response or await self.get_response(request)
+        if hasattr(self, 'process_response'):
+            if self.response_does_io(request):
+                response = await sync_to_async(self.process_response, thread_sensitive=True)(request, response)
+            else:
+                response = self.process_response(request, response)
+        return response
+
+    def inline(self):
+        return True
+
+    def response_does_io(self, request):
+        return False
+
+
+class SecurityMiddleware(InlineAsyncMixin, security.SecurityMiddleware):
+    pass
+
+
+class SessionMiddleware(InlineAsyncMixin, sessions.SessionMiddleware):
+    def response_does_io(self, request):
+        # An untouched session is never loaded or saved.
+        session = getattr(request, 'session', None)
+        return session is not None and session.accessed
+
+
+class CommonMiddleware(InlineAsyncMixin, common.CommonMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(InlineAsyncMixin, csrf.CsrfViewMiddleware):
+    def inline(self):
+        # A token kept in the session would be loaded and saved with it.
+        return not settings.CSRF_USE_SESSIONS
+
+
+class AuthenticationMiddleware(InlineAsyncMixin, auth.AuthenticationMiddleware):
+    # request.user is lazy; process_request does no lookup.
+    pass
+
+
+class MessageMiddleware(InlineAsyncMixin, messages.MessageMiddleware):
+    def response_does_io(self, request):
+        storage = getattr(request, '_messages', None)
+        return storage is not None and (storage.used or storage.added_new)
+
+
+class XFrameOptionsMiddleware(InlineAsyncMixin, clickjacking.XFrameOptionsMiddleware):
+    pass
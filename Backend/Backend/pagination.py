@@ -0,0 +1,165 @@
+import base64
+import datetime
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder truncates datetimes to milliseconds, which would make
+    # the cursor skip rows whose keys differ only in the microseconds.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor keyset pagination.
+
+    Rows are ordered by ``ordering`` (which must end in a unique column) and
+    the cursor carries the ordering values of the last row served, so the next
+    page is a plain ``WHERE (a, b) < (x, y)`` range read on an index instead of
+    an OFFSET scan. Views can override the ordering with ``keyset_ordering``.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._page(list(self._window(queryset, request, view)))
+
+    def paginate_sorted(self, objects, request, view=None):
+        """
+        ``paginate_queryset`` for objects already sorted by the ordering in
+        Python (e.g. by a computed distance), each with the ordering fields
+        as attributes. Cursor values are kept as decoded from JSON.
+        """
+        self._start(request, view)
+        position = self.decode_cursor(request, None)
+        if position is not None:
+            try:
+                objects = [obj for obj in objects if self._follows(obj, position)]
+            except TypeError:
+                raise NotFound(self.invalid_cursor_message)
+        return self._page(list(objects[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views, using the async ORM."""
+        return self._page([row async for row in self._window(queryset, request, view)])
+
+    def _start(self, request, view):
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        self.page_size = self.get_page_size(request)
+        self.next_position = None
+
+    def _window(self, queryset, request, view):
+        self._start(request, view)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.build_position_filter(position))
+        return queryset[:self.page_size + 1]
+
+    def _page(self, rows):
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            last = rows[-1]
+            # Rows are model instances, or dicts from a projection (Backend.projection).
+            if isinstance(last, dict):
+                self.next_position = [last[name] for name in self._field_names()]
+            else:
+                self.next_position = [getattr(last, name) for name in self._field_names()]
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, 'keyset_ordering', self.ordering))
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def encode_cursor(self, position):
+        raw = json.dumps(position, cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+            names = self._field_names()
+            if not isinstance(values, list) or len(values) != len(names):
+                raise ValueError
+            if model is None:
+                return values
+            return [
+                None if value is None else model._meta.get_field(name).to_python(value)
+                for name, value in zip(names, values)
+            ]
+        except (TypeError, ValueError, UnicodeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def build_position_filter(self, position):
+        # (a, b, c) after (x, y, z) expands to
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        clauses = []
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {self.ordering[j].lstrip('-'): position[j] for j in range(i)}
+            clauses.append(Q(**equal) & Q(**{f'{name}__{lookup}': position[i]}))
+        return reduce(or_, clauses)
+
+    def _follows(self, obj, position):
+        """Whether ``obj`` comes after ``position`` in the ordering."""
+        for field, value in zip(self.ordering, position):
+            current = getattr(obj, field.lstrip('-'))
+            if current != value:
+                return current < value if field.startswith('-') else current > value
+        return False
+
+    def _field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
@@ -0,0 +1,198 @@
+"""
+Opt-in per-request profiling.
+
+``ProfilingMiddleware`` breaks a request's wall time into phases:
+
+* ``auth``: Firebase token verification and user lookup
+  (``FirebaseAuthentication`` wraps itself in ``phase('auth')``).
+* ``db``: SQL outside other phases, with the query count.
+* ``render``: rendering a DRF response to JSON.
+* ``app``: everything else in the view, which for the API is mostly
+  serialization.
+
+Statements repeated ``PROFILING_N_PLUS_ONE_THRESHOLD`` times or more in one
+request are flagged as a probable N+1.
+
+A request is profiled when ``PROFILING_SERVER_TIMING`` is on (every response
+then carries a ``Server-Timing`` header) or when it falls in the
+``PROFILING_SAMPLE_RATE`` sample, which is logged as one JSON object to the
+``profiling`` logger. With both off the middleware removes itself from the
+chain; with only sampling on, an unsampled request costs one random() call
+and each of its queries one context variable lookup.
+"""
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('profiling')
+
+_current = ContextVar('profile', default=None)
+
+
+class Profile:
+    def __init__(self, sampled=False):
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.depth = 0
+        self.queries = 0
+        self.db = 0.0
+        self.nested_db = 0.0
+        self.statements = Counter()
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def record_query(self, sql, seconds):
+        self.queries += 1
+        self.db += seconds
+        if self.depth:
+            self.nested_db += seconds
+        self.statements[sql] += 1
+
+    def repeated(self, threshold):
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+    def timings(self):
+        """[(name, milliseconds)] including ``db``, ``app`` and ``total``."""
+        total = time.perf_counter() - self.started
+        own_db = self.db - self.nested_db
+        app = total - sum(self.phases.values()) - own_db
+        rows = list(self.phases.items()) + [('db', own_db), ('app', max(app, 0.0)), ('total', total)]
+        return [(name, seconds * 1000) for name, seconds in rows]
+
+
+@contextmanager
+def phase(name):
+    """Time the block as ``name`` if the current request is being profiled."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    profile.depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.depth -= 1
+        profile.add(name, time.perf_counter() - started)
+
+
+def _record_sql(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, time.perf_counter() - started)
+
+
+def _install(connection):
+    if _record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_sql)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install(connection)
+
+
+def install_sql_hook():
+    # New connections get the wrapper as they open; this covers any that
+    # are already open in the current thread.
+    connection_created.connect(_on_connection_created, dispatch_uid='profiling-sql-hook')
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.server_timing = getattr(settings, 'PROFILING_SERVER_TIMING', False)
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.threshold = getattr(settings, 'PROFILING_N_PLUS_ONE_THRESHOLD', 3)
+        if not self.server_timing and not self.sample_rate:
+            # Drops out of the middleware chain entirely.
+            raise MiddlewareNotUsed
+        install_sql_hook()
+
+    def start(self):
+        sampled = bool(self.sample_rate) and random.random() < self.sample_rate
+        if sampled or self.server_timing:
+            return Profile(sampled)
+        return None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile = self.start()
+        if profile is None:
+            return self.get_response(request)
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = self.start()
+        if profile is None:
+            return await self.get_response(request)
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered by the handler after the view returns.
+        profile = _current.get()
+        if profile is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda r: profile.add('render', time.perf_counter() - started))
+        return response
+
+    def finish(self, request, response, profile):
+        timings = profile.timings()
+        repeated = profile.repeated(self.threshold)
+        if self.server_timing:
+            entries = []
+            for name, ms in timings:
+                entry = f'{name};dur={ms:.2f}'
+                if name == 'db':
+                    entry += f';desc="{profile.queries} queries"'
+                entries.append(entry)
+            if repeated:
+                entries.append(f'n-plus-one;desc="{len(repeated)} repeated statements"')
+            response['Server-Timing'] = ', '.join(entries)
+        if profile.sampled:
+            match = getattr(request, 'resolver_match', None)
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'route': match.url_name if match else None,
+                'status': response.status_code,
+                'timings_ms': {name: round(ms, 3) for name, ms in timings},
+                'queries': profile.queries,
+                'repeated': [{'sql': sql, 'count': count} for sql, count in repeated],
+            }))
+        return response
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +44,8 @@ INSTALLED_APPS = [
     'rest_framework',
     "corsheaders",
     'Booking',
+    'jobs',
+    'perf',
 ]
 
 REST_FRAMEWORK = {
@@ -54,15 +58,19 @@ AUTH_USER_MODEL = 'au.CustomUser'
 
 
 MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'Backend.metrics.MetricsMiddleware',
+    'Backend.profiling.ProfilingMiddleware',
+    'Backend.db_router.DatabaseRoutingMiddleware',
+    # Django's own middleware, minus the thread hops under ASGI (see
+    # Backend/middleware.py).
+    'Backend.middleware.SecurityMiddleware',
+    'Backend.middleware.SessionMiddleware',
+    'Backend.middleware.CommonMiddleware',
+    'Backend.middleware.CsrfViewMiddleware',
+    'Backend.middleware.AuthenticationMiddleware',
+    'Backend.middleware.MessageMiddleware',
+    'Backend.middleware.XFrameOptionsMiddleware',
     "corsheaders.middleware.CorsMiddleware",
-    "django.middleware.common.CommonMiddleware",
 ]
 
 ROOT_URLCONF = 'Backend.urls'
@@ -88,13 +96,74 @@ WSGI_APPLICATION = 'Backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections are kept open for DB_CONN_MAX_AGE seconds and reused by the
+# next request on the same worker thread (checked before reuse), rather
+# than opened per request. SQLite runs in WAL mode so list reads don't wait
+# on the booking writer's lock.
+
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+SQLITE_INIT_COMMAND = 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Transactions stay DEFERRED; the booking conflict checks take
+            # the write lock themselves (Booking/availability.py).
+            'init_command': SQLITE_INIT_COMMAND,
+        },
     }
 }
 
+# Read replica (Backend/db_router.py). Locally, point DATABASE_REPLICA_PATH
+# at a second SQLite file and keep it filled with `manage.py sync_replica`.
+# Users who wrote within DATABASE_REPLICA_STICKY_SECONDS read from the
+# primary; the marker lives in the DATABASE_REPLICA_STICKY_CACHE alias, which
+# must be shared by all workers (see CACHES below).
+
+DATABASE_REPLICA = None
+DATABASE_REPLICA_STICKY_SECONDS = 10
+DATABASE_REPLICA_STICKY_CACHE = 'default'
+
+if os.environ.get('DATABASE_REPLICA_PATH'):
+    DATABASE_REPLICA = 'replica'
+    DATABASES[DATABASE_REPLICA] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['DATABASE_REPLICA_PATH'],
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'init_command': SQLITE_INIT_COMMAND + '; PRAGMA query_only=ON'},
+    }
+
+DATABASE_ROUTERS = ['Backend.db_router.PrimaryReplicaRouter']
+
+
+# Caches
+# The public catalogue response cache (services/cache.py) uses
+# SERVICES_CACHE_ALIAS; point it at a shared backend (e.g. Redis) to share
+# entries across worker processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if DATABASE_REPLICA:
+    # Sticky markers must be seen by every worker process on the host; use
+    # a shared backend (e.g. Redis) across hosts.
+    CACHES['replica-sticky'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DATABASE_REPLICA_STICKY_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'replica-sticky')),
+    }
+    DATABASE_REPLICA_STICKY_CACHE = 'replica-sticky'
+
+SERVICES_CACHE_ALIAS = 'default'
+SERVICES_CACHE_TIMEOUT = 3600
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -139,17 +208,43 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 
-import os
-from firebase_admin import credentials, initialize_app
-
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-# Path to your Firebase JSON key file
-firebase_key_path = os.path.join(BASE_DIR, 'credentials', 'firebase-adminsdk.json')
-
-# Initialize Firebase Admin SDK
-cred = credentials.Certificate(firebase_key_path)
-initialize_app(cred)
+# Path to your Firebase JSON key file. The Admin SDK is initialised on first
+# token verification (au/firebase.py), not here.
+FIREBASE_CREDENTIALS = os.environ.get(
+    'FIREBASE_CREDENTIALS', os.path.join(BASE_DIR, 'credentials', 'firebase-adminsdk.json'),
+)
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Background jobs (see jobs/queue.py); run them with `manage.py worker`.
+JOBS_ALWAYS_EAGER = False
+JOBS_MAX_ATTEMPTS = 5
+
+# Bookable hours and slot grid for the availability endpoint (Booking/availability.py).
+BOOKING_WORKING_HOURS = ('09:00', '18:00')
+BOOKING_SLOT_STEP_MINUTES = 30
+
+# Processes used to encode image derivatives (services/images.py); None = CPU count.
+IMAGE_DERIVATIVE_WORKERS = None
+
+# Media URLs (services/media.py). With MEDIA_CDN_ORIGIN (e.g.
+# https://cdn.example.com) URLs point there instead of at the request's host;
+# versioning appends ?v=<content digest> once an image has been processed.
+MEDIA_CDN_ORIGIN = os.environ.get('MEDIA_CDN_ORIGIN') or None
+MEDIA_URL_VERSIONING = True
+MEDIA_URL_BUILDER = 'services.media.MediaURLBuilder'
+
+# Request profiling (Backend/profiling.py): Server-Timing on every response
+# and/or a sampled JSON log of phase timings and repeated SQL.
+PROFILING_SERVER_TIMING = False
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_N_PLUS_ONE_THRESHOLD = 3
+
+# Prometheus metrics (Backend/metrics.py). Set METRICS_DIR to a directory
+# shared by all workers and emptied at server start; METRICS_TOKEN, if set,
+# is required as a Bearer token on /metrics.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
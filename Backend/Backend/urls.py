@@ -19,12 +19,15 @@ from django.urls import path , include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('au.urls')),
     path('api/', include('services.urls')), 
     path('api/', include('Booking.urls')), 
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 
@@ -0,0 +1,18 @@
+"""
+URL configuration used under ASGI (see ``Backend.asgi``).
+
+The hot read endpoints resolve to their async views; everything else falls
+through to ``Backend.urls`` unchanged.
+"""
+from django.urls import include, path
+
+from Booking.views import AsyncProviderBookingsListView, AsyncUserBookingsListView
+from services.views import AsyncListAllServicesView, AsyncPublicRetrieveServiceView
+
+urlpatterns = [
+    path('api/services/', AsyncListAllServicesView.as_view(), name='list-all-services'),
+    path('api/services/<int:pk>/', AsyncPublicRetrieveServiceView.as_view(), name='public-retrieve-service'),
+    path('api/bookings/', AsyncUserBookingsListView.as_view(), name='user-bookings'),
+    path('api/provider/bookings/', AsyncProviderBookingsListView.as_view(), name='provider-bookings'),
+    path('', include('Backend.urls')),
+]
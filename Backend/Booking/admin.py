@@ -11,7 +11,7 @@ class BookingAdmin(admin.ModelAdmin):
 class FeedbackAdmin(admin.ModelAdmin):
     list_display = ['id', 'booking', 'rating', 'created_at']
     list_filter = ['rating', 'created_at']
-    search_fields = ['comment', 'booking__service__name', 'booking__provider__user__email']
+    search_fields = ['comment', 'booking__service__name', 'booking__service__provider__user__email']
 
 @admin.register(ProviderBan)
 class ProviderBanAdmin(admin.ModelAdmin):
@@ -0,0 +1,235 @@
+"""
+Daily booking rollups per service and per provider.
+
+The provider analytics endpoint answers a date range by summing at most one
+``ProviderDailyStats`` row per day, plus the ``ServiceDailyStats`` rows of
+the range for the per-service breakdown, instead of scanning bookings.
+Rows are keyed by the booking's date and kept current as bookings are
+created or change status and as feedback arrives: each change is applied
+as a delta with ``INSERT ... ON CONFLICT DO UPDATE SET x = x + d`` (one
+statement per table, in the caller's transaction), so concurrent requests
+don't lose counts and a rollup never commits without the write behind it.
+
+Writes that bypass ``save()`` (queryset updates, deletes) and later price
+changes make the rollups drift, so ``manage.py compact_booking_stats``
+recounts recent and upcoming days from the raw rows every night and drops
+rows that have gone empty.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Q, Sum
+
+from services.models import Service
+from .models import Booking, ProviderDailyStats, ServiceDailyStats
+
+ZERO = Decimal('0.00')
+COUNTERS = ServiceDailyStats.COUNTER_FIELDS
+# Rows per INSERT, well under SQLite's bound-parameter limit.
+UPSERT_BATCH_SIZE = 500
+
+
+def contribution(status, price):
+    """What one booking with ``status`` adds to its day."""
+    return {
+        'bookings': 1,
+        'completed': int(status == 'completed'),
+        'cancelled': int(status == 'cancelled'),
+        'revenue': price if status == 'completed' else ZERO,
+    }
+
+
+def _merge(changes, key, deltas, sign=1):
+    totals = changes[key]
+    for field, value in deltas.items():
+        totals[field] = totals.get(field, 0) + sign * value
+
+
+def _add(model, unique, rows):
+    """
+    Add ``rows`` (dicts of every column but the id, counters holding the
+    deltas) to ``model``: missing rows are inserted as they are, existing
+    ones (by the ``unique`` fields) get the deltas added.
+    """
+    rows = [row for row in rows if any(row[field] for field in COUNTERS)]
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    conflict = ', '.join(quote(model._meta.get_field(name).column) for name in unique)
+    increments = ', '.join(
+        f'{column} = {table}.{column} + excluded.{column}'
+        for column in (quote(model._meta.get_field(name).column) for name in COUNTERS)
+    )
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(quote(field.column) for field in fields)}) '
+                f'VALUES {", ".join([placeholders] * len(batch))} '
+                f'ON CONFLICT ({conflict}) DO UPDATE SET {increments}',
+                [field.get_db_prep_save(row[field.name], connection) for row in batch for field in fields],
+            )
+
+
+def _counters(deltas):
+    return {**dict.fromkeys(COUNTERS, 0), 'revenue': ZERO, **deltas}
+
+
+def apply(changes):
+    """Add ``{(service_id, provider_id, day): {counter: delta}}`` to both tables."""
+    services = []
+    providers = defaultdict(dict)
+    for (service_id, provider_id, day), deltas in changes.items():
+        services.append({'service': service_id, 'provider': provider_id, 'day': day, **_counters(deltas)})
+        _merge(providers, (provider_id, day), deltas)
+    # No savepoint: if the rollup fails, so does the write that caused it.
+    with transaction.atomic(savepoint=False):
+        _add(ServiceDailyStats, ('service', 'day'), services)
+        _add(ProviderDailyStats, ('provider', 'day'), [
+            {'provider': provider_id, 'day': day, **_counters(deltas)}
+            for (provider_id, day), deltas in providers.items()
+        ])
+
+
+def record_booking(booking, created):
+    """Apply the difference between what ``booking`` was counted as and its saved state."""
+    current = booking.rollup_state()
+    previous = None if created else getattr(booking, '_counted_as', None)
+    if current == previous or (previous is None and not created):
+        # Unchanged, or loaded without the fields we'd need to tell.
+        booking._counted_as = current
+        return
+    changes = defaultdict(dict)
+    service = booking.service
+    _merge(changes, (service.pk, service.provider_id, booking.date), contribution(booking.status, service.price))
+    if previous is not None:
+        service_id, day, status = previous
+        if service_id != service.pk:
+            service = Service.objects.only('provider_id', 'price').get(pk=service_id)
+        _merge(changes, (service.pk, service.provider_id, day), contribution(status, service.price), sign=-1)
+    apply(changes)
+    booking._counted_as = current
+
+
+def record_bookings(bookings):
+    """``record_booking`` for newly bulk-created bookings, one upsert per table."""
+    changes = defaultdict(dict)
+    for booking in bookings:
+        service = booking.service
+        _merge(changes, (service.pk, service.provider_id, booking.date), contribution(booking.status, service.price))
+        booking._counted_as = booking.rollup_state()
+    apply(changes)
+
+
+def record_rating(feedback):
+    booking = feedback.booking
+    service = booking.service
+    apply({(service.pk, service.provider_id, booking.date): {'ratings': 1, 'rating_sum': feedback.rating}})
+
+
+def _recount(model, bookings, group_by):
+    """
+    Insert ``model`` rows counting ``bookings`` grouped by
+    ``group_by`` (model column: Booking lookup), with one INSERT ... SELECT
+    so the rows never pass through Python. Returns the rows written.
+    """
+    counts = (
+        bookings.values(*group_by.values())
+        .annotate(
+            bookings=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+            revenue=Sum('service__price', filter=Q(status='completed'), default=ZERO),
+            ratings=Count('feedback'),
+            rating_sum=Sum('feedback__rating', default=0),
+        )
+        .order_by()
+    )
+    connection = connections[bookings.db]
+    columns = ', '.join(
+        connection.ops.quote_name(model._meta.get_field(name).column) for name in (*group_by, *COUNTERS)
+    )
+    sql, params = counts.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) {sql}', params)
+        return cursor.rowcount
+
+
+@transaction.atomic
+def compact(since=None):
+    """
+    Recount the rollups of every booking date from ``since`` on (all of
+    them if None) from the Booking and Feedback tables, and delete older
+    rows whose counters are all zero. Returns ``(service rows, provider
+    rows, empty rows deleted)``.
+    """
+    bookings = Booking.objects.using(router.db_for_write(ServiceDailyStats))
+    recounted = Q()
+    if since is not None:
+        bookings = bookings.filter(date__gte=since)
+        recounted = Q(day__gte=since)
+    empty = Q(**dict.fromkeys(COUNTERS, 0))
+
+    dropped = 0
+    for model in (ServiceDailyStats, ProviderDailyStats):
+        model.objects.filter(recounted).delete()
+        dropped += model.objects.filter(empty).delete()[0]
+
+    services = _recount(ServiceDailyStats, bookings, {
+        'service': 'service', 'provider': 'service__provider', 'day': 'date',
+    })
+    providers = _recount(ProviderDailyStats, bookings, {'provider': 'service__provider', 'day': 'date'})
+    return services, providers, dropped
+
+
+def _summary(row):
+    bookings, ratings = row['bookings'], row['ratings']
+    return {
+        'bookings': bookings,
+        'completed': row['completed'],
+        'cancelled': row['cancelled'],
+        'cancellation_rate': round(row['cancelled'] / bookings, 4) if bookings else 0.0,
+        'revenue': str(Decimal(row['revenue']).quantize(ZERO)),
+        'ratings': ratings,
+        'rating_avg': round(row['rating_sum'] / ratings, 2) if ratings else None,
+    }
+
+
+def report(provider_id, start, end):
+    """Totals, a row per day and a row per service for ``start``..``end`` inclusive."""
+    empty = dict.fromkeys(COUNTERS, 0)
+    days = {
+        row['day']: row
+        for row in ProviderDailyStats.objects.filter(provider_id=provider_id, day__range=(start, end))
+        .values('day', *COUNTERS)
+    }
+    totals = dict(empty)
+    for row in days.values():
+        for field in COUNTERS:
+            totals[field] += row[field]
+
+    services = (
+        ServiceDailyStats.objects.filter(provider_id=provider_id, day__range=(start, end))
+        .values('service', 'service__name')
+        .annotate(**{field: Sum(field) for field in COUNTERS})
+        .order_by('service')
+    )
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'totals': _summary(totals),
+        'daily': [
+            {'date': day.isoformat(), **_summary(days.get(day, empty))}
+            for day in (start + timedelta(days=offset) for offset in range((end - start).days + 1))
+        ],
+        'services': [
+            {'service': row['service'], 'name': row['service__name'], **_summary(row)}
+            for row in services
+        ],
+    }
@@ -0,0 +1,180 @@
+"""
+Provider availability built from existing bookings.
+
+A provider's day is an index of busy intervals (minutes since midnight)
+derived from ``Booking.date``/``time`` and the booked service's
+``duration_minutes``. Intervals are kept sorted by start with a running
+maximum of their ends, so "does [start, end) overlap anything?" is one
+bisect, O(log n) however many bookings the day has.
+
+A booking running past midnight is split at it: the rest lands in the next
+day's index. Days are read with the ``SPILL_DAYS`` before them, whose late
+bookings may reach into them.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from services.models import ServiceProvider
+from .models import Booking
+
+MINUTES_PER_DAY = 24 * 60
+# Days an earlier booking can reach into: services run for less than a day.
+SPILL_DAYS = 1
+
+
+def minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def format_minutes(value):
+    return f'{value // 60:02d}:{value % 60:02d}'
+
+
+class DayIndex:
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals)
+        self.starts = [start for start, _ in intervals]
+        self.max_ends = []
+        running = 0
+        for _, end in intervals:
+            running = max(running, end)
+            self.max_ends.append(running)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def conflicts(self, start, end):
+        # Only intervals starting before `end` can overlap; among those, the
+        # furthest-reaching one decides.
+        i = bisect_left(self.starts, end)
+        return i > 0 and self.max_ends[i - 1] > start
+
+    def free_slots(self, duration, opens, closes, step, not_before=0):
+        first = max(opens, not_before)
+        # Round up to the slot grid.
+        first = opens + -(-(first - opens) // step) * step
+        return [
+            start for start in range(first, closes - duration + 1, step)
+            if not self.conflicts(start, start + duration)
+        ]
+
+
+def split_days(day, start_time, duration):
+    """``[(date, start, end), ...]``: the booking's minutes on each day it covers."""
+    start = minutes(start_time)
+    end = start + duration
+    pieces = []
+    while end > MINUTES_PER_DAY:
+        pieces.append((day, start, MINUTES_PER_DAY))
+        day, start, end = day + timedelta(days=1), 0, end - MINUTES_PER_DAY
+    pieces.append((day, start, end))
+    return pieces
+
+
+def lock_providers(provider_ids):
+    """
+    Hold the providers' rows until the transaction ends, so their conflict
+    checks run one at a time. A no-op UPDATE rather than select_for_update(),
+    which SQLite ignores: as the transaction's first statement it takes the
+    database write lock up front, before the check reads anything.
+    """
+    ServiceProvider.objects.filter(pk__in=provider_ids).update(id=F('id'))
+
+
+def _busy_rows(provider_id, start_date, end_date, exclude_pk=None):
+    rows = Booking.objects.filter(
+        service__provider_id=provider_id,
+        date__gte=start_date - timedelta(days=SPILL_DAYS),
+        date__lte=end_date,
+        status='booked',
+    )
+    if exclude_pk is not None:
+        rows = rows.exclude(pk=exclude_pk)
+    return rows.values_list('date', 'time', 'service__duration_minutes')
+
+
+def build_indexes(provider_id, start_date, end_date, exclude_pk=None):
+    """{date: DayIndex} for every day in the range, from a single query."""
+    intervals = defaultdict(list)
+    for day, start_time, duration in _busy_rows(provider_id, start_date, end_date, exclude_pk):
+        for piece_day, start, end in split_days(day, start_time, duration):
+            if start_date <= piece_day <= end_date:
+                intervals[piece_day].append((start, end))
+    days = (end_date - start_date).days + 1
+    return {
+        start_date + timedelta(days=offset): DayIndex(intervals.get(start_date + timedelta(days=offset), ()))
+        for offset in range(days)
+    }
+
+
+def has_conflict(provider_id, day, start_time, duration, exclude_pk=None):
+    pieces = split_days(day, start_time, duration)
+    indexes = build_indexes(provider_id, day, pieces[-1][0], exclude_pk)
+    return any(indexes[piece_day].conflicts(start, end) for piece_day, start, end in pieces)
+
+
+def working_hours():
+    opens, closes = getattr(settings, 'BOOKING_WORKING_HOURS', ('09:00', '18:00'))
+    return minutes(time.fromisoformat(opens)), minutes(time.fromisoformat(closes))
+
+
+def free_slots(service, start_date, end_date):
+    """[(date, [start minutes, ...]), ...] of open start times for ``service``."""
+    opens, closes = working_hours()
+    step = getattr(settings, 'BOOKING_SLOT_STEP_MINUTES', 30)
+    now = timezone.localtime()
+    indexes = build_indexes(service.provider_id, start_date, end_date)
+    result = []
+    for day, index in sorted(indexes.items()):
+        if day < now.date():
+            continue
+        not_before = minutes(now) + 1 if day == now.date() else 0
+        result.append((day, index.free_slots(service.duration_minutes, opens, closes, step, not_before)))
+    return result
+
+
+def parse_date(value, default):
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+class BatchChecker:
+    """
+    Conflict checks for many new bookings at once: one query per provider
+    for the batch's date range (and the day after, for items running past
+    midnight), plus the intervals accepted so far in the batch so items
+    can't collide with each other.
+    """
+
+    def __init__(self, items):
+        # items: iterable of (provider_id, date)
+        self.indexes = {}
+        self.accepted = defaultdict(list)
+        by_provider = defaultdict(list)
+        for provider_id, day in items:
+            by_provider[provider_id].append(day)
+        for provider_id, days in by_provider.items():
+            self._load(provider_id, min(days), max(days) + timedelta(days=1))
+
+    def _load(self, provider_id, start_date, end_date):
+        for day, index in build_indexes(provider_id, start_date, end_date).items():
+            self.indexes[(provider_id, day)] = index
+
+    def try_accept(self, provider_id, day, start_time, duration):
+        pieces = [((provider_id, piece_day), start, end) for piece_day, start, end in split_days(day, start_time, duration)]
+        for key, start, end in pieces:
+            if key not in self.indexes:
+                self._load(provider_id, key[1], key[1])
+            if self.indexes[key].conflicts(start, end):
+                return False
+            if any(s < end and start < e for s, e in self.accepted[key]):
+                return False
+        for key, start, end in pieces:
+            self.accepted[key].append((start, end))
+        return True
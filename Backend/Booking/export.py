@@ -0,0 +1,109 @@
+"""
+Streaming export of a provider's booking history.
+
+The list endpoint pages through bookings for display; an accounting export
+wants all of them, possibly millions. Rows are read with ``iterator()``
+(a server-side cursor where the backend has one) as ``values_list()``
+tuples, feedback is fetched with one query per chunk, and each chunk is
+encoded and handed to the ``StreamingHttpResponse`` before the next is
+read, so memory stays flat however long the history is.
+"""
+import csv
+import io
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from services.models import Service
+from .models import Booking, Feedback
+
+CHUNK_SIZE = 2000
+
+HEADER = (
+    'id', 'created_at', 'service_id', 'service_name', 'service_price',
+    'date', 'time', 'status', 'customer_name', 'contact', 'location',
+    'latitude', 'longitude', 'description',
+    'feedback_rating', 'feedback_comment', 'feedback_created_at',
+)
+# Read from each booking, in HEADER order after the service columns.
+BOOKING_COLUMNS = (
+    'date', 'time', 'status', 'name', 'contact', 'location',
+    'latitude', 'longitude', 'description',
+)
+
+# Spreadsheets evaluate cells starting with these as formulas.
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def chunks(provider, using, chunk_size=CHUNK_SIZE):
+    """
+    Lists of export rows (lists in HEADER order) for ``provider``'s
+    bookings, ``chunk_size`` at a time, read from database ``using``.
+    Bookings come service by service and oldest first within each, so every
+    query walks booking_service_created_idx instead of sorting the whole
+    history.
+    """
+    services = Service.objects.using(using).filter(provider=provider).order_by('id').values_list('id', 'name', 'price')
+    chunk = []
+    for service_id, name, price in list(services):
+        rows = (
+            Booking.objects.using(using).filter(service_id=service_id)
+            .order_by('created_at', 'id')
+            .values_list('id', 'created_at', *BOOKING_COLUMNS)
+            .iterator(chunk_size=chunk_size)
+        )
+        for booking_id, created_at, *booking in rows:
+            chunk.append([booking_id, created_at, service_id, name, price, *booking])
+            if len(chunk) == chunk_size:
+                yield _with_feedback(chunk, using)
+                chunk = []
+    if chunk:
+        yield _with_feedback(chunk, using)
+
+
+def _with_feedback(chunk, using):
+    feedback = {
+        booking_id: (rating, comment, created_at)
+        for booking_id, rating, comment, created_at in Feedback.objects.using(using)
+        .filter(booking_id__in=[row[0] for row in chunk])
+        .values_list('booking_id', 'rating', 'comment', 'created_at')
+    }
+    missing = (None, None, None)
+    for row in chunk:
+        row.extend(feedback.get(row[0], missing))
+    return chunk
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return "'" + value if value.startswith(_FORMULA_PREFIXES) else value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def csv_stream(provider, using, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADER)
+    for chunk in chunks(provider, using, chunk_size):
+        writer.writerows([_cell(value) for value in row] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # No bookings: still send the header.
+        yield buffer.getvalue()
+
+
+def ndjson_stream(provider, using, chunk_size=CHUNK_SIZE):
+    encoder = DjangoJSONEncoder()
+    for chunk in chunks(provider, using, chunk_size):
+        yield ''.join(encoder.encode(dict(zip(HEADER, row))) + '\n' for row in chunk)
+
+
+FORMATS = {
+    'csv': (csv_stream, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_stream, 'application/x-ndjson'),
+}
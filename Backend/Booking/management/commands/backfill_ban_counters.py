@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from Booking.utils import rebuild_one_star_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-provider 1-star counters used by the ban engine from existing feedback."
+
+    def handle(self, *args, **options):
+        total = rebuild_one_star_counters()
+        self.stdout.write(self.style.SUCCESS(f"Backfilled counters for {total} one-star feedback rows."))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Booking.analytics import compact
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the daily booking rollups behind the provider analytics "
+        "endpoint from the Booking and Feedback tables, for booking dates from "
+        "--days ago onwards, and drop rollup rows that have gone empty. Meant "
+        "to run nightly; --all rebuilds (or backfills) every date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7,
+                            help='Recount booking dates from this many days ago onwards (default 7).')
+        parser.add_argument('--all', action='store_true', help='Recount every booking date.')
+
+    def handle(self, *args, **options):
+        since = None if options['all'] else timezone.localdate() - timedelta(days=options['days'])
+        services, providers, dropped = compact(since)
+        scope = 'all dates' if since is None else f'dates from {since.isoformat()}'
+        self.stdout.write(self.style.SUCCESS(
+            f"Recounted {services} service-days and {providers} provider-days for {scope}; "
+            f"dropped {dropped} empty rows."
+        ))
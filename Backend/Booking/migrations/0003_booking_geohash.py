@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+from services import geo
+
+
+def backfill_geohash(apps, schema_editor):
+    Booking = apps.get_model('Booking', 'Booking')
+    pending = Booking.objects.exclude(latitude=None).exclude(longitude=None)
+    for booking in pending.only('id', 'latitude', 'longitude').iterator():
+        booking.geohash = geo.encode(booking.latitude, booking.longitude)
+        booking.save(update_fields=['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Booking', '0002_booking_status_feedback_providerban'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
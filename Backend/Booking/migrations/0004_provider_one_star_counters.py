@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Booking', '0003_booking_geohash'),
+        ('services', '0004_serviceprovider_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderOneStarCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('provider', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='one_star_counter', to='services.serviceprovider')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProviderOneStarBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='one_star_buckets', to='services.serviceprovider')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('provider', 'bucket_start'), name='unique_provider_one_star_bucket')],
+            },
+        ),
+    ]
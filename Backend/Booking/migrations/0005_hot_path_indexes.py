@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+FK_COLUMNS = ('user', 'service')
+
+
+def drop_fk_indexes(apps, schema_editor):
+    Booking = apps.get_model('Booking', 'Booking')
+    for name in FK_COLUMNS:
+        column = Booking._meta.get_field(name).column
+        for index_name in schema_editor._constraint_names(Booking, [column], index=True, primary_key=False, unique=False):
+            schema_editor.execute(schema_editor._delete_index_sql(Booking, index_name))
+
+
+def create_fk_indexes(apps, schema_editor):
+    Booking = apps.get_model('Booking', 'Booking')
+    for name in FK_COLUMNS:
+        schema_editor.execute(schema_editor._create_index_sql(Booking, fields=[Booking._meta.get_field(name)]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Booking', '0004_provider_one_star_counters'),
+        ('services', '0007_catalogue_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Dropping db_index on SQLite would rebuild the whole table; only the
+        # single-column indexes need to go.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='booking',
+                    name='service',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='services.service'),
+                ),
+                migrations.AlterField(
+                    model_name='booking',
+                    name='user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(drop_fk_indexes, create_fk_indexes),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='booking_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['service', '-created_at', '-id'], name='booking_service_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['service', 'status', 'date', 'time'], name='booking_service_status_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Booking', '0005_hot_path_indexes'),
+        ('services', '0007_catalogue_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('bookings', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('ratings', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='services.serviceprovider')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('provider', 'day'), name='unique_provider_daily_stats')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ServiceDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('bookings', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('ratings', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='services.serviceprovider')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='services.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['provider', 'day'], name='service_stats_provider_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('service', 'day'), name='unique_service_daily_stats')],
+            },
+        ),
+    ]
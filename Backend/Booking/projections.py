@@ -0,0 +1,60 @@
+from django.db.models.fields.files import FieldFile
+
+from Backend.projection import Projection
+from services.images import variant_digests
+from services.media import media_url
+from services.models import Service
+from .serializers import BookingSerializer
+
+
+class BookingProjection(Projection):
+    """
+    ``BookingSerializer`` output for booking lists. ``customer_email`` and
+    ``cancellation_reason`` have no source attribute on Booking, so the
+    serializer skips them and so does this.
+    """
+    serializer_class = BookingSerializer
+    columns = (
+        'id', 'service', 'service__name', 'service__provider__full_name', 'service__thumbnail',
+        'service__thumbnail_variants',
+        'date', 'time', 'name', 'status', 'contact', 'description', 'location',
+        'latitude', 'longitude', 'created_at',
+    )
+
+    def represent(self, rows):
+        thumbnail_field = Service._meta.get_field('thumbnail')
+        date = self.fields['date'].to_representation
+        time = self.fields['time'].to_representation
+        created_at = self.fields['created_at'].to_representation
+
+        # Bookings of one service share its thumbnail URL.
+        images = {}
+        data = []
+        for row in rows:
+            thumbnail = FieldFile(None, thumbnail_field, row['service__thumbnail'])
+            variants = row['service__thumbnail_variants']
+            key = (thumbnail.name, variant_digests(thumbnail, variants).get(thumbnail.name))
+            if key not in images:
+                images[key] = media_url(thumbnail, self.request, variants)
+            day, at = date(row['date']), time(row['time'])
+            data.append({
+                'id': row['id'],
+                'service': row['service'],
+                'service_name': row['service__name'],
+                'provider_name': row['service__provider__full_name'],
+                'service_image': images[key],
+                'date': day,
+                'time': at,
+                'customer_name': row['name'],
+                'service_date': day,
+                'service_time': at,
+                'status': row['status'],
+                'name': row['name'],
+                'contact': row['contact'],
+                'description': row['description'],
+                'location': row['location'],
+                'latitude': row['latitude'],
+                'longitude': row['longitude'],
+                'created_at': created_at(row['created_at']),
+            })
+        return data
@@ -1,16 +1,75 @@
 # serializers.py
 from rest_framework import serializers
+from services.models import Service
+from services.serializers import MediaImageField
 from .models import Booking ,Feedback, ProviderBan
 
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    A PrimaryKeyRelatedField that resolves ids from ``prefetched`` (an
+    ``in_bulk`` dict filled in by a list serializer) instead of running a
+    query per value. Falls back to the normal lookup when nothing was
+    prefetched or the value is not an integer id.
+    """
+    prefetched = None
+
+    def to_internal_value(self, data):
+        if self.prefetched is not None and self.pk_field is None:
+            pk = _int_pk(data)
+            if pk is not None:
+                if pk not in self.prefetched:
+                    self.fail('does_not_exist', pk_value=data)
+                return self.prefetched[pk]
+        return super().to_internal_value(data)
+
+
+def _int_pk(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class BookingListSerializer(serializers.ListSerializer):
+    """
+    ``BookingSerializer(many=True)``. The services a batch refers to are
+    fetched with one ``in_bulk`` query before the items are validated, and
+    each item's outcome is kept in ``outcomes`` as ``(validated_data, None)``
+    or ``(None, errors)`` so a caller can accept the valid part of a batch.
+    """
+
+    def to_internal_value(self, data):
+        self.outcomes = []
+        if isinstance(data, list):
+            field = self.child.fields['service']
+            pks = {_int_pk(item.get('service')) for item in data if isinstance(item, dict)}
+            pks.discard(None)
+            field.prefetched = field.get_queryset().in_bulk(pks)
+        return super().to_internal_value(data)
+
+    def run_child_validation(self, data):
+        try:
+            validated = super().run_child_validation(data)
+        except serializers.ValidationError as exc:
+            self.outcomes.append((None, exc.detail))
+            raise
+        self.outcomes.append((validated, None))
+        return validated
+
+
 class BookingSerializer(serializers.ModelSerializer):
     service_name = serializers.CharField(source='service.name', read_only=True)
     provider_name = serializers.CharField(source='service.provider.full_name', read_only=True)
-    service_image = serializers.ImageField(source='service.thumbnail', read_only=True) 
+    service_image = MediaImageField(source='service.thumbnail', variants='thumbnail_variants', read_only=True)
     customer_name = serializers.CharField(source='name', read_only=True)
     customer_email = serializers.EmailField(source='customer.email', read_only=True)
     cancellation_reason = serializers.CharField(read_only=True)
     date = serializers.DateField()
     time = serializers.TimeField()
+    service = PrefetchedPrimaryKeyRelatedField(queryset=Service.objects.all())
 
     # Optional read-only aliases for display
     service_date = serializers.DateField(source='date', read_only=True)
@@ -26,7 +85,7 @@ class BookingSerializer(serializers.ModelSerializer):
             'name', 'contact', 'description', 'location', 'latitude', 'longitude', 'created_at'
         ]
         read_only_fields = ['status', 'created_at']
-    
+        list_serializer_class = BookingListSerializer
 
 class FeedbackSerializer(serializers.ModelSerializer):
     class Meta:
@@ -47,7 +106,7 @@ class FeedbackDetailSerializer(serializers.ModelSerializer):
 
 class ProviderBookingSerializer(serializers.ModelSerializer):
     service_name = serializers.CharField(source='service.name', read_only=True)
-    service_image = serializers.ImageField(source='service.thumbnail', read_only=True)
+    service_image = MediaImageField(source='service.thumbnail', variants='thumbnail_variants', read_only=True)
     feedback = serializers.SerializerMethodField()
     customer_name = serializers.SerializerMethodField()
 
@@ -60,9 +119,10 @@ class ProviderBookingSerializer(serializers.ModelSerializer):
         ]
 
     def get_feedback(self, obj):
+        # Uses the reverse one-to-one cache, so list views should
+        # select_related('feedback') to avoid a query per row.
         try:
-            feedback = Feedback.objects.get(booking=obj)
-            return FeedbackDetailSerializer(feedback).data
+            return FeedbackDetailSerializer(obj.feedback).data
         except Feedback.DoesNotExist:
             return None
 
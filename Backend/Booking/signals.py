@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from services.ratings import record_rating
+from . import analytics
+from .models import Booking, Feedback
+from .utils import record_feedback
+
+
+@receiver(post_save, sender=Feedback)
+def count_new_feedback(sender, instance, created, **kwargs):
+    if created:
+        service = instance.booking.service
+        record_feedback(instance, service.provider_id)
+        record_rating(service.pk, service.provider_id, instance.rating)
+        analytics.record_rating(instance)
+
+
+@receiver(post_save, sender=Booking)
+def roll_up_booking(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        analytics.record_booking(instance, created)
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from jobs.queue import register
+from services.models import ServiceProvider
+from .models import Booking, Feedback
+from .utils import evaluate_provider_ban
+
+
+@register('booking.evaluate_provider_ban')
+def evaluate_ban(provider_id):
+    evaluate_provider_ban(ServiceProvider.objects.get(pk=provider_id))
+
+
+@register('booking.notify_provider_of_booking')
+def notify_provider_of_booking(booking_id):
+    booking = Booking.objects.select_related('service__provider').get(pk=booking_id)
+    provider = booking.service.provider
+    send_mail(
+        subject=f"New booking for {booking.service.name}",
+        message=(
+            f"{booking.name} booked {booking.service.name} for {booking.date} at {booking.time}.\n"
+            f"Contact: {booking.contact}\nLocation: {booking.location}"
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[provider.email],
+    )
+
+
+@register('booking.notify_provider_of_feedback')
+def notify_provider_of_feedback(feedback_id):
+    feedback = Feedback.objects.select_related('booking__service__provider').get(pk=feedback_id)
+    service = feedback.booking.service
+    send_mail(
+        subject=f"New {feedback.rating}-star feedback for {service.name}",
+        message=feedback.comment or "No comment left.",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[service.provider.email],
+    )
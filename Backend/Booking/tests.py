@@ -1,3 +1,822 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from jobs.models import Job
+from jobs.queue import run_pending
+from au import authentication
+from Backend import db_router, metrics, profiling
+from au.tests import LOCAL_KEYS, PROJECT_ID, make_token
+from services.models import Service
+from services.tests import async_get, make_provider, make_service
+from .models import (
+    Booking, Feedback, ProviderBan, ProviderDailyStats, ProviderOneStarBucket, ProviderOneStarCounter,
+    ServiceDailyStats,
+)
+from .projections import BookingProjection
+from .serializers import BookingSerializer
+from . import analytics, availability, export
+from .availability import DayIndex
+from .utils import evaluate_provider_ban
+
+
+def make_booking(user, service, **extra):
+    defaults = {
+        'date': date(2025, 7, 1),
+        'time': time(10, 0),
+        'name': 'Customer',
+        'contact': '0311111111',
+        'location': 'Gulberg, Lahore',
+    }
+    defaults.update(extra)
+    return Booking.objects.create(user=user, service=service, **defaults)
+
+
+class BookingKeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.provider = make_provider('erin')
+        self.service = make_service(self.provider, gallery=0)
+        self.customer = make_provider('frank').user
+        self.bookings = [make_booking(self.customer, self.service) for _ in range(5)]
+        # Force created_at ties so the id tiebreaker is exercised.
+        Booking.objects.filter(pk__in=[b.pk for b in self.bookings[1:4]]).update(created_at=self.bookings[1].created_at)
+        self.client = APIClient()
+
+    def _walk(self, url):
+        seen = []
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(row['id'] for row in data['results'])
+            url = data['next']
+        return seen
+
+    def test_user_bookings_newest_first_across_pages(self):
+        self.client.force_authenticate(self.customer)
+        expected = list(Booking.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self._walk('/api/bookings/?page_size=2'), expected)
+
+    def test_provider_bookings_across_pages(self):
+        self.client.force_authenticate(self.provider.user)
+        expected = list(Booking.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self._walk('/api/provider/bookings/?page_size=2'), expected)
+
+
+class NearbyBookingsTests(TestCase):
+    def test_open_bookings_near_provider(self):
+        provider = make_provider('liam', latitude=31.5204, longitude=74.3587)
+        service = make_service(provider, gallery=0)
+        customer = make_provider('mia').user
+        near = make_booking(customer, service, latitude=31.5300, longitude=74.3500)
+        make_booking(customer, service, latitude=31.5300, longitude=74.3500, status='cancelled')
+        make_booking(customer, service, latitude=33.6844, longitude=73.0479)
+        self.assertTrue(near.geohash.startswith('tt'))
+
+        client = APIClient()
+        client.force_authenticate(provider.user)
+        data = client.get('/api/provider/bookings/nearby/?radius_km=3').json()
+        self.assertEqual([row['id'] for row in data['results']], [near.pk])
+
+    def test_pages_nearest_first_with_feedback_loaded(self):
+        provider = make_provider('lena', latitude=31.5204, longitude=74.3587)
+        service = make_service(provider, gallery=0)
+        customer = make_provider('milo').user
+        bookings = [
+            make_booking(customer, service, latitude=31.5204 + offset, longitude=74.3587)
+            for offset in (0.02, 0.0, 0.01, 0.01)
+        ]
+        Feedback.objects.create(booking=bookings[1], rating=5, comment='Close')
+
+        client = APIClient()
+        client.force_authenticate(provider.user)
+        # The ranking by coordinates, then the page's rows with their feedback.
+        with self.assertNumQueries(2):
+            first = client.get('/api/provider/bookings/nearby/?radius_km=5&page_size=2').json()
+        self.assertEqual([row['id'] for row in first['results']], [bookings[1].pk, bookings[2].pk])
+        self.assertEqual(first['results'][0]['feedback']['rating'], 5)
+        second = client.get(first['next']).json()
+        self.assertEqual([row['id'] for row in second['results']], [bookings[3].pk, bookings[0].pk])
+        self.assertIsNone(second['next'])
+        self.assertLess(second['results'][0]['distance_km'], second['results'][1]['distance_km'])
+        self.assertEqual(client.get('/api/provider/bookings/nearby/?cursor=WyJ4IiwxXQ').status_code, 404)
+
+
+class ProviderBookingsQueryCountTests(TestCase):
+    def test_feedback_and_service_load_in_bulk(self):
+        provider = make_provider('nina')
+        customer = make_provider('oscar').user
+        services = [make_service(provider, gallery=0, name=f'Service {i}') for i in range(3)]
+        for i in range(12):
+            booking = make_booking(customer, services[i % 3])
+            if i % 2:
+                Feedback.objects.create(booking=booking, rating=4, comment='Good')
+
+        client = APIClient()
+        client.force_authenticate(type(provider.user).objects.get(pk=provider.user.pk))
+        # provider profile + the page itself.
+        with self.assertNumQueries(2):
+            data = client.get('/api/provider/bookings/').json()
+        rows = data['results']
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(sum(1 for row in rows if row['feedback']), 6)
+        self.assertEqual(rows[0]['feedback']['rating'], 4)
+        self.assertEqual(rows[1]['feedback'], None)
+        self.assertEqual({row['service_name'] for row in rows}, {'Service 0', 'Service 1', 'Service 2'})
+
+
+class ProviderBookingsExportTests(TestCase):
+    def setUp(self):
+        self.provider = make_provider('nora')
+        customer = make_provider('owen').user
+        self.services = [make_service(self.provider, gallery=0, name=f'Service {i}') for i in range(2)]
+        self.bookings = [make_booking(customer, self.services[i % 2], name=f'Customer {i}') for i in range(7)]
+        Feedback.objects.create(booking=self.bookings[2], rating=5, comment='=HYPERLINK("x")')
+        make_booking(customer, make_service(make_provider('otto'), gallery=0))
+        self.client = APIClient()
+        self.client.force_authenticate(self.provider.user)
+
+    def get(self, fmt):
+        response = self.client.get(f'/api/provider/bookings/export/{fmt}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def expected_ids(self):
+        return [
+            booking.pk for service in self.services
+            for booking in Booking.objects.filter(service=service).order_by('created_at', 'id')
+        ]
+
+    def test_csv(self):
+        response, body = self.get('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="bookings-', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual([int(row['id']) for row in rows], self.expected_ids())
+        rated = next(row for row in rows if int(row['id']) == self.bookings[2].pk)
+        self.assertEqual((rated['service_name'], rated['customer_name']), ('Service 0', 'Customer 2'))
+        self.assertEqual(rated['feedback_rating'], '5')
+        # Neutralised so spreadsheets don't run it as a formula.
+        self.assertEqual(rated['feedback_comment'], '\'=HYPERLINK("x")')
+        self.assertEqual(sum(1 for row in rows if row['feedback_rating']), 1)
+
+    def test_ndjson(self):
+        _, body = self.get('ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], self.expected_ids())
+        self.assertEqual(list(rows[0]), list(export.HEADER))
+        self.assertEqual(rows[0]['service_price'], '1500.00')
+
+    def test_reads_in_chunks_with_one_feedback_query_each(self):
+        with self.assertNumQueries(1 + 2 + 4):
+            chunks = list(export.chunks(self.provider, 'default', chunk_size=2))
+        # services, bookings per service, feedback per chunk
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 2, 1])
+
+    def test_empty_and_unknown_format(self):
+        Booking.objects.all().delete()
+        _, body = self.get('csv')
+        self.assertEqual(body.strip(), ','.join(export.HEADER))
+        self.assertEqual(self.client.get('/api/provider/bookings/export/xlsx/').status_code, 404)
+        self.client.force_authenticate(type(self.provider.user).objects.create(username='pia', firebase_uid='pia'))
+        self.assertEqual(self.client.get('/api/provider/bookings/export/csv/').status_code, 404)
+
+
+class ProviderAnalyticsTests(TestCase):
+    def setUp(self):
+        self.provider = make_provider('quinn')
+        self.cleaning = make_service(self.provider, gallery=0, name='Cleaning', price='1000.00', duration_minutes=60)
+        self.repair = make_service(self.provider, gallery=0, name='Repair', price='250.50', duration_minutes=60)
+        self.customer = make_provider('rhea').user
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.client = APIClient()
+
+    def stats(self, model=ProviderDailyStats):
+        return sorted(
+            model.objects.values_list('day', *ServiceDailyStats.COUNTER_FIELDS)
+            if model is ProviderDailyStats else
+            model.objects.values_list('service', 'day', *ServiceDailyStats.COUNTER_FIELDS)
+        )
+
+    def build_history(self):
+        self.client.force_authenticate(self.customer)
+        done = make_booking(self.customer, self.cleaning, date=self.day, time=time(9, 0))
+        cancelled = make_booking(self.customer, self.cleaning, date=self.day, time=time(11, 0))
+        make_booking(self.customer, self.repair, date=self.day + timedelta(days=2), time=time(9, 0))
+        self.client.post(f'/api/bookings/{done.pk}/feedback/', {'rating': 4, 'comment': 'Fine'}, format='json')
+        self.client.post(f'/api/bookings/{cancelled.pk}/cancel/')
+        self.client.post('/api/bookings/bulk/', [{
+            'service': self.repair.pk, 'date': self.day.isoformat(), 'time': f'{hour}:00',
+            'name': 'Rhea', 'contact': '0300', 'location': 'DHA',
+        } for hour in (13, 15)], format='json')
+
+    def test_cancel_rolls_back_with_failed_rollup(self):
+        booking = make_booking(self.customer, self.cleaning, date=self.day, time=time(9, 0))
+        self.client.force_authenticate(self.customer)
+        with mock.patch.object(analytics, 'apply', side_effect=DatabaseError('rollup failed')):
+            with self.assertRaises(DatabaseError):
+                self.client.post(f'/api/bookings/{booking.pk}/cancel/')
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'booked')
+        self.assertEqual(ProviderDailyStats.objects.get(day=self.day).cancelled, 0)
+
+    def test_rollups_follow_bookings_and_feedback(self):
+        self.build_history()
+        day = ProviderDailyStats.objects.get(provider=self.provider, day=self.day)
+        self.assertEqual((day.bookings, day.completed, day.cancelled), (4, 1, 1))
+        self.assertEqual((day.revenue, day.ratings, day.rating_sum), (Decimal('1000.00'), 1, 4))
+        repair = ServiceDailyStats.objects.get(service=self.repair, day=self.day)
+        self.assertEqual((repair.bookings, repair.completed), (2, 0))
+
+        # Rescheduling moves the booking between days.
+        booking = Booking.objects.get(service=self.repair, date=self.day + timedelta(days=2))
+        booking.date = self.day
+        booking.save()
+        self.assertEqual(ProviderDailyStats.objects.get(day=self.day).bookings, 5)
+        self.assertEqual(ProviderDailyStats.objects.get(day=self.day + timedelta(days=2)).bookings, 0)
+
+        incremental = (self.stats(), self.stats(ServiceDailyStats))
+        self.assertEqual(analytics.compact(), (2, 1, 0))
+        self.assertEqual((self.stats(), self.stats(ServiceDailyStats)), tuple(
+            [row for row in rows if any(row[-6:])] for rows in incremental
+        ))
+
+    def test_endpoint_sums_rollups(self):
+        self.build_history()
+        self.client.force_authenticate(type(self.provider.user).objects.get(pk=self.provider.user.pk))
+        start, end = self.day - timedelta(days=1), self.day + timedelta(days=3)
+        # Provider profile, then one query per rollup table.
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/provider/analytics/?start={start}&end={end}')
+        body = response.json()
+        self.assertEqual(body['totals'], {
+            'bookings': 5, 'completed': 1, 'cancelled': 1, 'cancellation_rate': 0.2,
+            'revenue': '1000.00', 'ratings': 1, 'rating_avg': 4.0,
+        })
+        self.assertEqual([row['bookings'] for row in body['daily']], [0, 4, 0, 1, 0])
+        self.assertEqual(body['daily'][0]['rating_avg'], None)
+        self.assertEqual(
+            [(row['name'], row['bookings'], row['revenue']) for row in body['services']],
+            [('Cleaning', 2, '1000.00'), ('Repair', 3, '0.00')],
+        )
+
+        response = self.client.get(f'/api/provider/analytics/?start={self.day}&end={self.day}')
+        self.assertEqual(response.json()['totals']['bookings'], 4)
+        self.assertEqual(self.client.get('/api/provider/analytics/?start=2025-02-30').status_code, 400)
+        self.assertEqual(self.client.get('/api/provider/analytics/?start=2020-01-01&end=2025-01-01').status_code, 400)
+        self.assertEqual(len(self.client.get('/api/provider/analytics/').json()['daily']), 30)
+
+    def test_compaction_repairs_drift(self):
+        self.build_history()
+        expected = self.stats()
+        # Queryset updates bypass save() and so the rollups.
+        Booking.objects.filter(service=self.repair).update(status='cancelled')
+        ProviderDailyStats.objects.update(revenue=0)
+        old = ProviderDailyStats.objects.create(provider=self.provider, day=self.day - timedelta(days=60))
+
+        out = StringIO()
+        call_command('compact_booking_stats', '--days', '3', stdout=out)
+        self.assertIn('dropped 1 empty rows', out.getvalue())
+        self.assertFalse(ProviderDailyStats.objects.filter(pk=old.pk).exists())
+        day = ProviderDailyStats.objects.get(day=self.day)
+        self.assertEqual((day.cancelled, day.revenue), (3, Decimal('1000.00')))
+        self.assertEqual(len(self.stats()), len(expected))
+
+
+class ProviderBanEngineTests(TestCase):
+    def setUp(self):
+        self.provider = make_provider('paul')
+        self.service = make_service(self.provider, gallery=0)
+        self.customer = make_provider('quinn').user
+
+    def _feedback(self, rating):
+        return Feedback.objects.create(booking=make_booking(self.customer, self.service), rating=rating, comment='')
+
+    def test_counters_follow_new_feedback(self):
+        for rating in (1, 3, 1, 5):
+            self._feedback(rating)
+        self.assertEqual(ProviderOneStarCounter.objects.get(provider=self.provider).total, 2)
+        self.assertEqual(ProviderOneStarBucket.objects.get(provider=self.provider).count, 2)
+
+    def test_ban_after_threshold_then_permanent(self):
+        for _ in range(4):
+            self._feedback(1)
+        evaluate_provider_ban(self.provider)
+        self.assertFalse(ProviderBan.objects.exists())
+
+        self._feedback(1)
+        # counter, recent bucket, current ban, insert: flat regardless of history.
+        with self.assertNumQueries(4):
+            evaluate_provider_ban(self.provider)
+        ban = ProviderBan.objects.get(provider=self.provider)
+        self.assertFalse(ban.permanent)
+
+        ProviderBan.objects.filter(pk=ban.pk).update(banned_until=timezone.now() - timedelta(minutes=1))
+        evaluate_provider_ban(self.provider)
+        self.assertTrue(ProviderBan.objects.get(pk=ban.pk).permanent)
+
+    def test_backfill_matches_incremental_counters(self):
+        for rating in (1, 1, 2, 1):
+            self._feedback(rating)
+        old = self._feedback(1)
+        Feedback.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=10))
+        ProviderOneStarCounter.objects.all().delete()
+        ProviderOneStarBucket.objects.all().delete()
+
+        call_command('backfill_ban_counters', stdout=StringIO())
+
+        self.assertEqual(ProviderOneStarCounter.objects.get(provider=self.provider).total, 4)
+        self.assertEqual(
+            sum(ProviderOneStarBucket.objects.filter(provider=self.provider).values_list('count', flat=True)), 3
+        )
+
+    def test_submit_feedback_endpoint(self):
+        booking = make_booking(self.customer, self.service)
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f'/api/bookings/{booking.pk}/feedback/', {'rating': 1, 'comment': 'Late'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ProviderOneStarCounter.objects.get(provider=self.provider).total, 1)
+        self.assertEqual(
+            set(Job.objects.values_list('name', flat=True)),
+            {'booking.evaluate_provider_ban', 'booking.notify_provider_of_feedback'},
+        )
+
+        run_pending()
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {'done'})
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        self.provider = make_provider('vera')
+        self.service = make_service(self.provider, gallery=0, duration_minutes=60)
+        self.customer = make_provider('walt').user
+        self.day = timezone.localdate() + timedelta(days=3)
+
+    def test_day_index_overlaps(self):
+        # A long booking hides inside shorter later ones: 9:00-13:00, 10:00-10:30.
+        index = DayIndex([(540, 780), (600, 630)])
+        self.assertTrue(index.conflicts(700, 720))
+        self.assertTrue(index.conflicts(500, 541))
+        self.assertFalse(index.conflicts(780, 840))
+        self.assertFalse(index.conflicts(480, 540))
+
+    def test_create_rejects_overlapping_booking(self):
+        make_booking(self.customer, self.service, date=self.day, time=time(10, 0))
+        cancelled = make_booking(self.customer, self.service, date=self.day, time=time(12, 0))
+        cancelled.status = 'cancelled'
+        cancelled.save()
+
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        payload = {
+            'service': self.service.pk, 'date': self.day.isoformat(), 'name': 'Walt',
+            'contact': '0300', 'location': 'DHA',
+        }
+        clash = client.post('/api/bookings/create/', {**payload, 'time': '10:30'})
+        self.assertEqual(clash.status_code, 400)
+        self.assertIn('time', clash.json())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            free = client.post('/api/bookings/create/', {**payload, 'time': '12:00'})
+        self.assertEqual(free.status_code, 201)
+
+    def test_bookings_running_past_midnight_block_the_next_day(self):
+        overnight = make_service(self.provider, gallery=0, duration_minutes=90)
+        make_booking(self.customer, overnight, date=self.day, time=time(23, 30))
+        next_day = self.day + timedelta(days=1)
+        self.assertTrue(availability.has_conflict(self.provider.pk, next_day, time(0, 30), 60))
+        self.assertFalse(availability.has_conflict(self.provider.pk, next_day, time(1, 0), 60))
+        # And the other way round: a late booking reaching into an early one.
+        make_booking(self.customer, self.service, date=next_day + timedelta(days=1), time=time(0, 30))
+        self.assertTrue(availability.has_conflict(self.provider.pk, next_day, time(23, 30), 90))
+
+        checker = availability.BatchChecker([(self.provider.pk, next_day), (self.provider.pk, self.day)])
+        self.assertFalse(checker.try_accept(self.provider.pk, next_day, time(0, 0), 30))
+        self.assertTrue(checker.try_accept(self.provider.pk, next_day, time(23, 30), 60))
+        self.assertFalse(checker.try_accept(self.provider.pk, next_day + timedelta(days=1), time(0, 15), 30))
+
+    def test_free_slots_endpoint(self):
+        make_booking(self.customer, self.service, date=self.day, time=time(10, 0))
+        other_service = make_service(self.provider, gallery=0, duration_minutes=90)
+        make_booking(self.customer, other_service, date=self.day, time=time(14, 0))
+
+        response = APIClient().get(
+            f'/api/services/{self.service.pk}/availability/?start={self.day}&end={self.day}'
+        )
+        self.assertEqual(response.status_code, 200)
+        slots = response.json()['days'][0]['slots']
+        self.assertEqual(slots, [
+            '09:00', '11:00', '11:30', '12:00', '12:30', '13:00', '15:30', '16:00', '16:30', '17:00',
+        ])
+
+    def test_availability_validates_range(self):
+        url = f'/api/services/{self.service.pk}/availability/'
+        self.assertEqual(APIClient().get(url + '?start=2025-01-10&end=2025-01-01').status_code, 400)
+        self.assertEqual(APIClient().get(url + '?start=bad').status_code, 400)
+        self.assertEqual(APIClient().get('/api/services/999999/availability/').status_code, 404)
+
+
+class BulkBookingTests(TestCase):
+    def setUp(self):
+        self.provider = make_provider('xena')
+        self.service = make_service(self.provider, gallery=0, duration_minutes=60)
+        self.customer = make_provider('yuri').user
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def item(self, at, **extra):
+        return {
+            'service': self.service.pk, 'date': self.day.isoformat(), 'time': at,
+            'name': 'Yuri', 'contact': '0300', 'location': 'DHA', **extra,
+        }
+
+    def test_creates_batch_and_queues_notifications(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/bookings/bulk/', [self.item('09:00'), self.item('10:00'), self.item('11:00', latitude=31.5, longitude=74.3)],
+                format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['created'], body['failed']), (3, 0))
+        ids = [row['id'] for row in body['results']]
+        self.assertEqual(Booking.objects.filter(pk__in=ids, user=self.customer).count(), 3)
+        self.assertTrue(Booking.objects.get(pk=ids[2]).geohash)
+        self.assertEqual(Job.objects.filter(name='booking.notify_provider_of_booking').count(), 3)
+
+    def test_partial_success_reports_each_item(self):
+        make_booking(self.customer, self.service, date=self.day, time=time(9, 0))
+        response = self.client.post('/api/bookings/bulk/', [
+            self.item('09:30'),        # clashes with the existing booking
+            self.item('12:00'),
+            self.item('12:30'),        # clashes with the item above
+            self.item('14:00', service=999999),
+        ], format='json')
+        self.assertEqual(response.status_code, 207)
+        results = response.json()['results']
+        self.assertEqual([row['status'] for row in results], ['error', 'created', 'error', 'error'])
+        self.assertIn('time', results[0]['errors'])
+        self.assertIn('time', results[2]['errors'])
+        self.assertIn('service', results[3]['errors'])
+        self.assertEqual(Booking.objects.filter(date=self.day).count(), 2)
+
+    def test_items_clash_across_midnight(self):
+        response = self.client.post('/api/bookings/bulk/', [
+            self.item('23:30'),
+            self.item('00:15', date=(self.day + timedelta(days=1)).isoformat()),
+        ], format='json')
+        self.assertEqual([row['status'] for row in response.json()['results']], ['created', 'error'])
+
+    def test_query_count_does_not_grow_with_batch(self):
+        services = [make_service(self.provider, gallery=0, duration_minutes=15) for _ in range(3)]
+
+        def post(count, day):
+            items = [
+                self.item(f'{8 + i // 4:02d}:{i % 4 * 15:02d}', date=day.isoformat(), service=services[i % 3].pk)
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/bookings/bulk/', items, format='json')
+            self.assertEqual(response.json()['created'], count)
+            return len(queries)
+
+        self.assertEqual(post(2, self.day), post(30, self.day + timedelta(days=3)))
+
+    def test_rejects_bad_payloads(self):
+        self.assertEqual(self.client.post('/api/bookings/bulk/', {}, format='json').status_code, 400)
+        too_many = [self.item('09:00')] * 501
+        self.assertEqual(self.client.post('/api/bookings/bulk/', too_many, format='json').status_code, 400)
+        response = self.client.post('/api/bookings/bulk/', [self.item('09:00', name='')], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['created'], 0)
+
+
+@override_settings(FIREBASE_PUBLIC_KEYS=LOCAL_KEYS, FIREBASE_PROJECT_ID=PROJECT_ID)
+class AsyncBookingListViewTests(TestCase):
+    def setUp(self):
+        self.provider = make_provider('yara')
+        self.customer = make_provider('zeke').user
+        service = make_service(self.provider, gallery=0)
+        for i in range(3):
+            booking = make_booking(self.customer, service, time=time(9 + i, 0))
+            if i:
+                Feedback.objects.create(booking=booking, rating=5, comment='Great')
+
+    def assert_matches_sync(self, path, user):
+        client = APIClient()
+        client.force_authenticate(type(user).objects.get(pk=user.pk))
+        sync = client.get(path + '?page_size=2')
+        response = async_get(path + '?page_size=2', headers={'Authorization': f'Bearer {make_token(uid=user.firebase_uid)}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), sync.json())
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_user_bookings_match_sync_view(self):
+        self.assert_matches_sync('/api/bookings/', self.customer)
+
+    def test_provider_bookings_match_sync_view(self):
+        self.assert_matches_sync('/api/provider/bookings/', self.provider.user)
+
+    def test_requires_valid_token(self):
+        self.assertEqual(async_get('/api/bookings/').status_code, 403)
+        response = async_get('/api/provider/bookings/', headers={'Authorization': 'Bearer garbage'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'detail': 'Invalid Firebase ID token.'})
+
+
+@override_settings(FIREBASE_PUBLIC_KEYS=LOCAL_KEYS, FIREBASE_PROJECT_ID=PROJECT_ID)
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.provider = make_provider('quinn')
+        service = make_service(self.provider, gallery=0)
+        customer = make_provider('rory').user
+        for i in range(3):
+            make_booking(customer, service, time=time(9 + i, 0))
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {make_token(uid=self.provider.user.firebase_uid)}'}
+
+    def test_server_timing_breaks_down_phases(self):
+        with self.settings(PROFILING_SERVER_TIMING=True):
+            response = APIClient().get('/api/provider/bookings/', **self.headers)
+        self.assertEqual(response.status_code, 200)
+        entries = dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(list(entries), ['auth', 'render', 'db', 'app', 'total'])
+        # user lookup (inside auth), provider profile, the page.
+        self.assertIn('desc="3 queries"', entries['db'])
+
+    def test_sampled_requests_are_logged(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1.0), self.assertLogs('profiling') as logs:
+            response = APIClient().get('/api/provider/bookings/', **self.headers)
+        self.assertNotIn('Server-Timing', response)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['route'], 'provider-bookings')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['timings_ms']['auth'], 0)
+        self.assertEqual(record['repeated'], [])
+
+    def test_flags_repeated_statements(self):
+        profiling.install_sql_hook()
+        profile = profiling.Profile()
+        token = profiling._current.set(profile)
+        try:
+            for booking in Booking.objects.all():
+                booking.service.provider
+        finally:
+            profiling._current.reset(token)
+        repeated = profile.repeated(3)
+        self.assertEqual(len(repeated), 2)
+        self.assertEqual({count for _, count in repeated}, {3})
+
+    def test_disabled_by_default(self):
+        response = APIClient().get('/api/provider/bookings/', **self.headers)
+        self.assertNotIn('Server-Timing', response)
+
+
+def sample(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+@override_settings(FIREBASE_PUBLIC_KEYS=LOCAL_KEYS, FIREBASE_PROJECT_ID=PROJECT_ID)
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(METRICS_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(self.close_stores)
+        self.close_stores()
+        self.provider = make_provider('sasha')
+        make_service(self.provider, gallery=0)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {make_token(uid=self.provider.user.firebase_uid)}'}
+
+    def close_stores(self):
+        for store in metrics._stores.values():
+            store.close()
+        metrics._stores.clear()
+
+    def scrape(self, **headers):
+        response = APIClient().get('/metrics', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_counts_requests_by_route_and_status(self):
+        client = APIClient()
+        client.get('/api/services/')
+        client.get('/api/services/')
+        client.get('/api/provider/bookings/')
+        client.get('/no/such/path/')
+        client.generic('FOO', '/no/such/path/')
+        client.generic('BAR', '/no/such/path/')
+        text = self.scrape()
+        self.assertEqual(sample(text, 'http_requests_total{method="GET",route="list-all-services",status="200"}'), 2)
+        self.assertEqual(sample(text, 'http_requests_total{method="GET",route="provider-bookings",status="403"}'), 1)
+        self.assertEqual(sample(text, 'http_requests_total{method="GET",route="unmatched",status="404"}'), 1)
+        self.assertEqual(sample(text, 'http_requests_total{method="other",route="unmatched",status="404"}'), 2)
+        self.assertNotIn('method="FOO"', text)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertEqual(sample(text, 'http_request_duration_seconds_bucket{method="GET",route="list-all-services",le="+Inf"}'), 2)
+        self.assertEqual(sample(text, 'http_request_duration_seconds_count{method="GET",route="list-all-services"}'), 2)
+        self.assertEqual(sample(text, 'db_connections_open{alias="default"}'), 1)
+
+    def test_histogram_buckets_are_cumulative(self):
+        for seconds in (0.001, 0.02, 0.02, 3):
+            metrics.LATENCY.observe(seconds, route='r', method='GET')
+        text = self.scrape()
+        prefix = 'http_request_duration_seconds_bucket{method="GET",route="r",le="%s"}'
+        self.assertEqual(sample(text, prefix % '0.005'), 1)
+        self.assertEqual(sample(text, prefix % '0.025'), 3)
+        self.assertEqual(sample(text, prefix % '2.5'), 3)
+        self.assertEqual(sample(text, prefix % '5'), 4)
+        self.assertEqual(sample(text, prefix % '+Inf'), 4)
+        self.assertAlmostEqual(sample(text, 'http_request_duration_seconds_sum{method="GET",route="r"}'), 3.041)
+
+    def test_auth_cache_hits_and_misses(self):
+        client = APIClient()
+        for _ in range(3):
+            self.assertEqual(client.get('/api/provider/bookings/', **self.headers).status_code, 200)
+        text = self.scrape()
+        self.assertGreaterEqual(sample(text, 'auth_cache_requests_total{cache="token",result="hit"}'), 2)
+        self.assertGreaterEqual(sample(text, 'auth_cache_requests_total{cache="user",result="hit"}'), 2)
+
+    def test_aggregates_across_processes(self):
+        metrics.REQUESTS.inc(route='r', method='GET', status=200)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                metrics.REQUESTS.inc(3, route='r', method='GET', status=200)
+                metrics.DB_CONNECTIONS_OPEN.set(5, alias='replica')
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        text = self.scrape()
+        self.assertEqual(sample(text, 'http_requests_total{method="GET",route="r",status="200"}'), 4)
+        # The child has exited, so its gauge no longer counts.
+        self.assertIsNone(sample(text, 'db_connections_open{alias="replica"}'))
+
+    def test_store_survives_growing(self):
+        for i in range(3000):
+            metrics.REQUESTS.inc(route=f'route-{i}', method='GET', status=200)
+        metrics.REQUESTS.inc(route='route-0', method='GET', status=200)
+        totals = metrics.collect()
+        self.assertEqual(len(totals), 3000)
+        self.assertEqual(totals[metrics._key('http_requests_total', (('method', 'GET'), ('route', 'route-0'), ('status', '200')))], 2)
+
+    def test_token(self):
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(APIClient().get('/metrics').status_code, 401)
+            self.scrape(HTTP_AUTHORIZATION='Bearer s3cret')
+
+
+class RecordingRouter(db_router.PrimaryReplicaRouter):
+    """Notes where reads would go; the test database has no separate replica."""
+
+    def __init__(self):
+        self.reads = []
+
+    def db_for_read(self, model, **hints):
+        self.reads.append((model, super().db_for_read(model, **hints)))
+        return None
+
+    def aliases(self, model):
+        return {alias for read_model, alias in self.reads if read_model is model}
+
+
+STICKY_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sticky': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'booking-tests-replica-sticky'),
+    },
+}
+
+
+@override_settings(
+    FIREBASE_PUBLIC_KEYS=LOCAL_KEYS, FIREBASE_PROJECT_ID=PROJECT_ID, DATABASE_REPLICA='replica',
+    CACHES=STICKY_CACHES, DATABASE_REPLICA_STICKY_CACHE='sticky',
+)
+class DatabaseRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        db_router.sticky_cache().clear()
+        authentication.clear_caches()
+        self.addCleanup(authentication.clear_caches)
+        self.router = RecordingRouter()
+        override = override_settings(DATABASE_ROUTERS=[self.router])
+        override.enable()
+        self.addCleanup(override.disable)
+        self.service = make_service(make_provider('tess'), gallery=0, duration_minutes=60)
+        self.customer = make_provider('uma').user
+        self.other = make_provider('vic').user
+        make_booking(self.customer, self.service)
+        make_booking(self.other, self.service)
+
+    def get(self, path, user):
+        token = make_token(uid=user.firebase_uid)
+        response = APIClient().get(path, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def book(self, user):
+        token = make_token(uid=user.firebase_uid)
+        payload = {
+            'service': self.service.pk, 'date': (timezone.localdate() + timedelta(days=3)).isoformat(),
+            'time': '10:00', 'name': 'Uma', 'contact': '0300', 'location': 'DHA',
+        }
+        response = APIClient().post('/api/bookings/create/', payload, format='json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 201)
+
+    def test_list_views_read_from_replica(self):
+        self.get('/api/bookings/', self.customer)
+        self.assertEqual(self.router.aliases(Booking), {'replica'})
+        self.router.reads.clear()
+        self.get('/api/provider/services/', self.service.provider.user)
+        self.assertEqual(self.router.aliases(Service), {'replica'})
+
+    def test_async_views_read_from_replica(self):
+        async_get('/api/bookings/', headers={'Authorization': f'Bearer {make_token(uid=self.customer.firebase_uid)}'})
+        self.assertEqual(self.router.aliases(Booking), {'replica'})
+
+    def test_writes_and_their_reads_use_primary(self):
+        self.book(self.customer)
+        self.assertEqual(self.router.aliases(Booking), {None})
+
+    def test_writer_reads_own_writes_from_primary(self):
+        self.book(self.customer)
+        self.router.reads.clear()
+        response = self.get('/api/bookings/', self.customer)
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertEqual(self.router.aliases(Booking), {None})
+
+        # Other users aren't affected, and the writer returns to the
+        # replica once the marker expires.
+        self.router.reads.clear()
+        self.get('/api/bookings/', self.other)
+        self.assertEqual(self.router.aliases(Booking), {'replica'})
+        db_router.sticky_cache().clear()
+        self.router.reads.clear()
+        self.get('/api/bookings/', self.customer)
+        self.assertEqual(self.router.aliases(Booking), {'replica'})
+
+    def test_cached_catalogue_reads_primary(self):
+        APIClient().get('/api/services/')
+        self.assertEqual(self.router.aliases(Service), {None})
+
+    def test_marker_is_shared_across_processes(self):
+        self.book(self.customer)
+        # A fresh cache handle, as another worker process would open.
+        other_worker = FileBasedCache(STICKY_CACHES['sticky']['LOCATION'], {})
+        self.assertTrue(other_worker.get(f'db-sticky:{self.customer.pk}'))
+
+    def test_process_local_sticky_cache_is_refused(self):
+        with self.settings(DATABASE_REPLICA_STICKY_CACHE='default'):
+            with self.assertRaises(ImproperlyConfigured):
+                APIClient().get('/api/services/')
+
+    def test_no_replica_configured(self):
+        with self.settings(DATABASE_REPLICA=None):
+            self.get('/api/bookings/', self.customer)
+        self.assertEqual(self.router.aliases(Booking), {None})
+
+
+class BookingProjectionParityTests(TestCase):
+    def test_renders_the_same_bytes_as_the_serializer(self):
+        customer = make_provider('yara').user
+        pictured = make_service(make_provider('zane'), gallery=0, thumbnail_variants={
+            'source': 'service_thumbnails/thumb.jpg', 'digests': {'service_thumbnails/thumb.jpg': '9a9a'},
+        })
+        make_booking(customer, pictured, latitude=31.52, longitude=74.35)
+        make_booking(customer, make_service(make_provider('abel'), gallery=0, thumbnail=''),
+                     description='Gate code 42', status='cancelled', time=time(14, 30, 15))
+        Booking.objects.filter(description__isnull=True).update(created_at=timezone.now().replace(microsecond=0))
+
+        queryset = Booking.objects.filter(user=customer).select_related('service__provider').order_by('-created_at', '-id')
+        context = {'request': APIRequestFactory().get('/api/bookings/')}
+        expected = JSONRenderer().render(BookingSerializer(queryset, many=True, context=context).data)
+        projection = BookingProjection(context)
+        with self.assertNumQueries(1):
+            actual = JSONRenderer().render(projection.represent(list(projection.values(queryset))))
+        self.assertEqual(actual, expected)
+        self.assertIn(b'thumb.jpg?v=9a9a', actual)
@@ -5,12 +5,22 @@ from .views import (
     SubmitFeedbackView,
     CancelBookingView,
     ProviderBookingsListView,
+    ProviderBookingsExportView,
+    ProviderAnalyticsView,
+    NearbyBookingsView,
+    ServiceAvailabilityView,
+    BulkCreateBookingView,
 )
 
 urlpatterns = [
     path('bookings/', UserBookingsListView.as_view(), name='user-bookings'),
     path('bookings/create/', CreateBookingView.as_view(), name='create-booking'),
+    path('bookings/bulk/', BulkCreateBookingView.as_view(), name='bulk-create-booking'),
     path('bookings/<int:booking_id>/feedback/', SubmitFeedbackView.as_view()),
     path('bookings/<int:booking_id>/cancel/', CancelBookingView.as_view()),
     path('provider/bookings/', ProviderBookingsListView.as_view(), name='provider-bookings'),
+    path('provider/bookings/export/<str:fmt>/', ProviderBookingsExportView.as_view(), name='provider-bookings-export'),
+    path('provider/bookings/nearby/', NearbyBookingsView.as_view(), name='nearby-bookings'),
+    path('provider/analytics/', ProviderAnalyticsView.as_view(), name='provider-analytics'),
+    path('services/<int:pk>/availability/', ServiceAvailabilityView.as_view(), name='service-availability'),
 ]
@@ -1,13 +1,50 @@
 from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
 from django.utils import timezone
-from .models import Feedback, ProviderBan
-def evaluate_provider_ban(provider):
-    feedbacks = Feedback.objects.filter(booking__provider=provider).order_by('-created_at')
+from .models import Feedback, ProviderBan, ProviderOneStarBucket, ProviderOneStarCounter
+
+BAN_THRESHOLD = 5
+RECENT_WINDOW = timedelta(days=4)
+BAN_DURATION = timedelta(hours=24)
+
+
+def bucket_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def record_feedback(feedback, provider_id):
+    """
+    Fold a newly created feedback into the provider's 1-star counters.
+    Counters are bumped with UPDATE ... SET x = x + 1 so concurrent
+    submissions don't lose increments.
+    """
+    if feedback.rating != 1:
+        return
+    start = bucket_start(feedback.created_at)
+    with transaction.atomic():
+        ProviderOneStarCounter.objects.get_or_create(provider_id=provider_id)
+        ProviderOneStarCounter.objects.filter(provider_id=provider_id).update(total=F('total') + 1)
+        ProviderOneStarBucket.objects.get_or_create(provider_id=provider_id, bucket_start=start)
+        ProviderOneStarBucket.objects.filter(provider_id=provider_id, bucket_start=start).update(count=F('count') + 1)
+        # Buckets older than the window are never read again.
+        ProviderOneStarBucket.objects.filter(
+            provider_id=provider_id,
+            bucket_start__lt=bucket_start(timezone.now() - RECENT_WINDOW),
+        ).delete()
 
-    one_stars = [f for f in feedbacks if f.rating == 1]
 
-    # Count 1-stars in last 4 days
-    recent = [f for f in one_stars if f.created_at >= timezone.now() - timedelta(days=4)]
+def evaluate_provider_ban(provider):
+    # Both reads are single indexed lookups, independent of feedback history.
+    one_stars = ProviderOneStarCounter.objects.filter(provider=provider).values_list('total', flat=True).first() or 0
+
+    # Any 1-star in the last 4 days (hour granularity)
+    recent = ProviderOneStarBucket.objects.filter(
+        provider=provider,
+        bucket_start__gte=bucket_start(timezone.now() - RECENT_WINDOW),
+        count__gt=0,
+    ).exists()
 
     # Check current bans
     try:
@@ -19,12 +56,43 @@ def evaluate_provider_ban(provider):
     except ProviderBan.DoesNotExist:
         ban = None
 
-    if len(one_stars) >= 5:
+    if one_stars >= BAN_THRESHOLD:
         if ban:
             if recent:
                 ban.permanent = True
             else:
-                ban.banned_until = timezone.now() + timedelta(hours=24)
+                ban.banned_until = timezone.now() + BAN_DURATION
             ban.save()
         else:
-            ProviderBan.objects.create(provider=provider, banned_until=timezone.now() + timedelta(hours=24))
+            ProviderBan.objects.create(provider=provider, banned_until=timezone.now() + BAN_DURATION)
+
+
+@transaction.atomic
+def rebuild_one_star_counters():
+    """Recompute every provider's counters from the Feedback table."""
+    ProviderOneStarCounter.objects.all().delete()
+    ProviderOneStarBucket.objects.all().delete()
+
+    one_stars = Feedback.objects.filter(rating=1)
+    totals = (
+        one_stars.values('booking__service__provider')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    ProviderOneStarCounter.objects.bulk_create(
+        ProviderOneStarCounter(provider_id=row['booking__service__provider'], total=row['total'])
+        for row in totals
+    )
+
+    buckets = (
+        one_stars.filter(created_at__gte=bucket_start(timezone.now() - RECENT_WINDOW))
+        .annotate(hour=TruncHour('created_at'))
+        .values('booking__service__provider', 'hour')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    ProviderOneStarBucket.objects.bulk_create(
+        ProviderOneStarBucket(provider_id=row['booking__service__provider'], bucket_start=row['hour'], count=row['count'])
+        for row in buckets
+    )
+    return ProviderOneStarCounter.objects.aggregate(total=Sum('total'))['total'] or 0
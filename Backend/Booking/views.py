@@ -1,12 +1,25 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import Booking, Feedback 
-from services.models import ServiceProvider
+from services.models import Service, ServiceProvider
+from services import geo
 from .serializers import BookingSerializer , FeedbackSerializer , ProviderBookingSerializer
-from Booking.utils import evaluate_provider_ban
+from jobs.queue import enqueue, enqueue_many
 from rest_framework.exceptions import ValidationError
+from au.authentication import FirebaseAuthentication
+from Backend.async_views import AsyncAPIView
+from Backend.db_router import ReplicaReadMixin
+from Backend.pagination import KeysetPagination
+from Backend.projection import ProjectionListMixin
+from . import analytics, availability, export
+from .projections import BookingProjection
 
 class CreateBookingView(generics.CreateAPIView):
     serializer_class = BookingSerializer
@@ -30,16 +43,46 @@ class CreateBookingView(generics.CreateAPIView):
             return Response({'detail': 'Internal Server Error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        service = serializer.validated_data['service']
+        with transaction.atomic():
+            # Concurrent creates for the same provider run the conflict
+            # check one at a time.
+            availability.lock_providers([service.provider_id])
+            if availability.has_conflict(
+                service.provider_id,
+                serializer.validated_data['date'],
+                serializer.validated_data['time'],
+                service.duration_minutes,
+            ):
+                raise ValidationError({'time': ['The provider is already booked at this time.']})
+            booking = serializer.save(user=self.request.user)
+            enqueue('booking.notify_provider_of_booking', booking_id=booking.pk)
 
-class UserBookingsListView(generics.ListAPIView):
+class UserBookingsListView(ReplicaReadMixin, ProjectionListMixin, generics.ListAPIView):
     serializer_class = BookingSerializer
+    projection_class = BookingProjection
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         return Booking.objects.filter(user=self.request.user).order_by('-created_at')
 
 
+class AsyncUserBookingsListView(ReplicaReadMixin, AsyncAPIView):
+    """ASGI counterpart of UserBookingsListView."""
+    authentication_classes = [FirebaseAuthentication]
+    require_authentication = True
+    keyset_ordering = UserBookingsListView.keyset_ordering
+
+    async def aget(self, request):
+        paginator = KeysetPagination()
+        projection = BookingProjection({'request': request})
+        queryset = projection.values(Booking.objects.filter(user=request.user))
+        rows = await paginator.apaginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(await projection.arepresent(rows))
+
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -48,7 +91,7 @@ class SubmitFeedbackView(APIView):
 
     def post(self, request, booking_id):
         try:
-            booking = Booking.objects.get(id=booking_id, user=request.user)
+            booking = Booking.objects.select_related('service').get(id=booking_id, user=request.user)
         except Booking.DoesNotExist:
             return Response({'error': 'Booking not found.'}, status=404)
 
@@ -69,16 +112,14 @@ class SubmitFeedbackView(APIView):
         if not (1 <= rating <= 5):
             return Response({'rating': 'Must be between 1 and 5.'}, status=400)
 
-        Feedback.objects.create(booking=booking, rating=rating, comment=comment)
-        booking.status = 'completed'
-        booking.save()
-
-        provider = getattr(booking.service, 'provider', None)
-        if provider:
-            try:
-                evaluate_provider_ban(provider)
-            except Exception:
-                pass  # Log as needed
+        with transaction.atomic():
+            feedback = Feedback.objects.create(booking=booking, rating=rating, comment=comment)
+            booking.status = 'completed'
+            booking.save()
+            # Run after commit on the job worker; failures are retried and
+            # kept on the Job row instead of being swallowed here.
+            enqueue('booking.evaluate_provider_ban', provider_id=booking.service.provider_id)
+            enqueue('booking.notify_provider_of_feedback', feedback_id=feedback.pk)
 
         return Response({'message': 'Feedback submitted successfully.'}, status=201)
 
@@ -89,19 +130,23 @@ class CancelBookingView(APIView):
 
     def post(self, request, booking_id):
         try:
-            booking = Booking.objects.get(id=booking_id, user=request.user)
+            booking = Booking.objects.select_related('service').get(id=booking_id, user=request.user)
         except Booking.DoesNotExist:
             return Response({'error': 'Booking not found.'}, status=404)
 
         booking.status = 'cancelled'
-        booking.save()
+        with transaction.atomic():
+            # The rollup delta (Booking/signals.py) commits with the status.
+            booking.save()
         # Optionally: store `reason` separately if needed
         return Response({'message': 'Booking cancelled successfully.'}, status=200)
 
 
-class ProviderBookingsListView(generics.ListAPIView):
+class ProviderBookingsListView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = ProviderBookingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         # Get the service provider object linked to logged-in user
@@ -111,5 +156,208 @@ class ProviderBookingsListView(generics.ListAPIView):
             return Booking.objects.none()
 
         # Return bookings where the booking's service belongs to this provider
-        return Booking.objects.filter(service__provider=provider).order_by('-created_at')
+        return (
+            Booking.objects.filter(service__provider=provider)
+            .select_related('service', 'feedback')
+            .order_by('-created_at')
+        )
+
+
+class AsyncProviderBookingsListView(ReplicaReadMixin, AsyncAPIView):
+    """ASGI counterpart of ProviderBookingsListView."""
+    authentication_classes = [FirebaseAuthentication]
+    require_authentication = True
+    keyset_ordering = ProviderBookingsListView.keyset_ordering
+
+    async def aget(self, request):
+        paginator = KeysetPagination()
+        provider_id = await (
+            ServiceProvider.objects.filter(user=request.user).values_list('pk', flat=True).afirst()
+        )
+        if provider_id is None:
+            queryset = Booking.objects.none()
+        else:
+            queryset = Booking.objects.filter(service__provider_id=provider_id).select_related('service', 'feedback')
+        rows = await paginator.apaginate_queryset(queryset, request, view=self)
+        data = ProviderBookingSerializer(rows, many=True, context={'request': request}).data
+        return paginator.get_paginated_response(data)
+
+
+class ProviderBookingsExportView(ReplicaReadMixin, APIView):
+    """
+    The provider's whole booking history with feedback, as a streamed CSV
+    or NDJSON download (see Booking/export.py).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, fmt):
+        if fmt not in export.FORMATS:
+            raise Http404
+        try:
+            provider = request.user.serviceprovider
+        except ServiceProvider.DoesNotExist:
+            return Response({'error': 'Service provider profile does not exist.'}, status=404)
+
+        # The body is generated after the view returns, once the request's
+        # routing state is gone; pin the database it would read from now.
+        using = Booking.objects.all().db
+        stream, content_type = export.FORMATS[fmt]
+        response = StreamingHttpResponse(stream(provider, using), content_type=content_type)
+        filename = f'bookings-{timezone.localdate().isoformat()}.{fmt}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+
+class NearbyBookingsView(ReplicaReadMixin, APIView):
+    """
+    Open bookings for the provider's services within ``radius_km`` of
+    ``lat``/``lng`` (defaulting to the provider's own coordinates), nearest
+    first, a page at a time.
+    """
+    permission_classes = [IsAuthenticated]
+    keyset_ordering = ('distance_km', 'id')
+
+    def get(self, request):
+        try:
+            provider = request.user.serviceprovider
+        except ServiceProvider.DoesNotExist:
+            return Response({'error': 'Service provider profile does not exist.'}, status=404)
+
+        latitude, longitude, radius_km = geo.parse_point_query(
+            request.query_params, default_point=(provider.latitude, provider.longitude)
+        )
+        # Rank on coordinates alone, then load the page's rows in full.
+        queryset = Booking.objects.filter(service__provider=provider, status='booked').only('latitude', 'longitude')
+        paginator = KeysetPagination()
+        page = paginator.paginate_sorted(geo.within_radius(queryset, latitude, longitude, radius_km), request, view=self)
+        loaded = Booking.objects.select_related('service', 'feedback').in_bulk([booking.pk for booking in page])
+        bookings = [loaded[booking.pk] for booking in page if booking.pk in loaded]
+        data = ProviderBookingSerializer(bookings, many=True, context={'request': request}).data
+        distances = {booking.pk: booking.distance_km for booking in page}
+        for row, booking in zip(data, bookings):
+            row['distance_km'] = distances[booking.pk]
+        return paginator.get_paginated_response(data)
+
+
+class ProviderAnalyticsView(ReplicaReadMixin, APIView):
+    """
+    Booking counts, cancellation rate, revenue and ratings for the
+    provider's bookings dated ``start`` to ``end`` (YYYY-MM-DD, inclusive;
+    defaults to the last 30 days), in total, per day and per service.
+    Answered from the daily rollups (Booking/analytics.py).
+    """
+    permission_classes = [IsAuthenticated]
+    max_days = 731
+
+    def get(self, request):
+        try:
+            provider = request.user.serviceprovider
+        except ServiceProvider.DoesNotExist:
+            return Response({'error': 'Service provider profile does not exist.'}, status=404)
+
+        today = timezone.localdate()
+        try:
+            end = availability.parse_date(request.query_params.get('end'), today)
+            start = availability.parse_date(request.query_params.get('start'), end - timedelta(days=29))
+        except ValueError:
+            return Response({'error': 'Dates must be YYYY-MM-DD.'}, status=400)
+        if end < start or (end - start).days >= self.max_days:
+            return Response({'error': f'Range must be 1 to {self.max_days} days.'}, status=400)
+
+        return Response(analytics.report(provider.pk, start, end))
+
+
+class ServiceAvailabilityView(APIView):
+    """
+    Free start times for a service between ``start`` and ``end``
+    (YYYY-MM-DD, inclusive; defaults to the next 7 days).
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    max_days = 31
+
+    def get(self, request, pk):
+        try:
+            service = Service.objects.only('id', 'provider_id', 'duration_minutes').get(pk=pk)
+        except Service.DoesNotExist:
+            return Response({'error': 'Service not found.'}, status=404)
+
+        today = timezone.localdate()
+        try:
+            start = availability.parse_date(request.query_params.get('start'), today)
+            end = availability.parse_date(request.query_params.get('end'), start + timedelta(days=6))
+        except ValueError:
+            return Response({'error': 'Dates must be YYYY-MM-DD.'}, status=400)
+        if end < start or (end - start).days >= self.max_days:
+            return Response({'error': f'Range must be 1 to {self.max_days} days.'}, status=400)
+
+        days = availability.free_slots(service, start, end)
+        return Response({
+            'service': service.pk,
+            'duration_minutes': service.duration_minutes,
+            'days': [
+                {'date': day.isoformat(), 'slots': [availability.format_minutes(m) for m in slots]}
+                for day, slots in days
+            ],
+        })
+
+
+class BulkCreateBookingView(APIView):
+    """
+    Create up to ``max_items`` bookings in one transaction. Items are
+    validated independently; valid, conflict-free ones are inserted with a
+    single bulk INSERT and each item gets its own result entry.
+    """
+    permission_classes = [IsAuthenticated]
+    max_items = 500
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of bookings.'}, status=400)
+        if len(items) > self.max_items:
+            return Response({'error': f'At most {self.max_items} bookings per request.'}, status=400)
+
+        results = [None] * len(items)
+        valid = []
+        serializer = BookingSerializer(data=items, many=True, context={'request': request})
+        serializer.is_valid()
+        for index, (data, errors) in enumerate(serializer.outcomes):
+            if errors is None:
+                valid.append((index, data))
+            else:
+                results[index] = {'index': index, 'status': 'error', 'errors': errors}
+
+        created = []
+        with transaction.atomic():
+            provider_ids = {data['service'].provider_id for _, data in valid}
+            availability.lock_providers(provider_ids)
+            checker = availability.BatchChecker((data['service'].provider_id, data['date']) for _, data in valid)
+            for index, data in valid:
+                service = data['service']
+                if not checker.try_accept(service.provider_id, data['date'], data['time'], service.duration_minutes):
+                    results[index] = {
+                        'index': index, 'status': 'error',
+                        'errors': {'time': ['The provider is already booked at this time.']},
+                    }
+                    continue
+                booking = Booking(user=request.user, **data)
+                booking.geohash = geo.point_hash(booking.latitude, booking.longitude)
+                created.append((index, booking))
+
+            Booking.objects.bulk_create([booking for _, booking in created], batch_size=500)
+            analytics.record_bookings([booking for _, booking in created])
+            enqueue_many('booking.notify_provider_of_booking', [{'booking_id': b.pk} for _, b in created])
+
+        for index, booking in created:
+            results[index] = {'index': index, 'status': 'created', 'id': booking.pk}
 
+        failed = len(items) - len(created)
+        if not created:
+            code = status.HTTP_400_BAD_REQUEST
+        elif failed:
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_201_CREATED
+        return Response({'created': len(created), 'failed': failed, 'results': results}, status=code)
@@ -1,10 +1,104 @@
 # backend/your_app/authentication.py
 
+import copy
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from rest_framework import authentication, exceptions
-from firebase_admin import auth as firebase_auth
+
+from Backend import db_router, metrics, profiling
+from .cache import TTLCache
+from .tokens import InvalidToken, verify_id_token
+
+# sha256(token) -> (claims, user id). Entries never outlive the token's exp.
+token_cache = TTLCache(
+    maxsize=getattr(settings, 'FIREBASE_TOKEN_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'FIREBASE_TOKEN_CACHE_TTL', 300),
+)
+# firebase uid -> user, so repeat requests skip get_or_create entirely.
+# Invalidated from au.signals whenever the user row changes.
+user_cache = TTLCache(
+    maxsize=getattr(settings, 'FIREBASE_USER_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'FIREBASE_USER_CACHE_TTL', 300),
+)
+
+
+def clear_caches():
+    token_cache.clear()
+    user_cache.clear()
+
+
+def _token_key(id_token):
+    return hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+
 
 class FirebaseAuthentication(authentication.BaseAuthentication):
     def authenticate(self, request):
+        with profiling.phase('auth'):
+            result = self._authenticate(request)
+        if result is not None:
+            db_router.bind_user(result[0])
+        return result
+
+    async def aauthenticate(self, request):
+        """
+        ``authenticate`` for async views. Signature checks and key refreshes
+        run in a worker thread (not the shared sync thread) so they never
+        block the event loop or queue behind ORM calls.
+        """
+        with profiling.phase('auth'):
+            result = await self._aauthenticate(request)
+        if result is not None:
+            db_router.bind_user(result[0])
+        return result
+
+    def _authenticate(self, request):
+        id_token = self.get_token(request)
+        if id_token is None:
+            return None
+        key = _token_key(id_token)
+
+        cached = token_cache.get(key)
+        metrics.AUTH_CACHE.inc(cache='token', result='miss' if cached is None else 'hit')
+        if cached is not None:
+            decoded_token, user_id = cached
+            user = self.get_user(decoded_token, user_id=user_id)
+            return (user, None)
+
+        try:
+            decoded_token = verify_id_token(id_token)
+        except InvalidToken:
+            raise exceptions.AuthenticationFailed('Invalid Firebase ID token.')
+
+        user = self.get_user(decoded_token)
+        token_cache.set(key, (decoded_token, user.pk), ttl=decoded_token['exp'] - time.time())
+        return (user, None)
+
+    async def _aauthenticate(self, request):
+        id_token = self.get_token(request)
+        if id_token is None:
+            return None
+        key = _token_key(id_token)
+
+        cached = token_cache.get(key)
+        metrics.AUTH_CACHE.inc(cache='token', result='miss' if cached is None else 'hit')
+        if cached is not None:
+            decoded_token, user_id = cached
+            return (await self.aget_user(decoded_token, user_id=user_id), None)
+
+        try:
+            decoded_token = await sync_to_async(verify_id_token, thread_sensitive=False)(id_token)
+        except InvalidToken:
+            raise exceptions.AuthenticationFailed('Invalid Firebase ID token.')
+
+        user = await self.aget_user(decoded_token)
+        token_cache.set(key, (decoded_token, user.pk), ttl=decoded_token['exp'] - time.time())
+        return (user, None)
+
+    def get_token(self, request):
         auth_header = request.headers.get('Authorization')
 
         if not auth_header:
@@ -15,18 +109,41 @@ class FirebaseAuthentication(authentication.BaseAuthentication):
         if parts[0].lower() != 'bearer' or len(parts) != 2:
             raise exceptions.AuthenticationFailed('Invalid Authorization header.')
 
-        id_token = parts[1]
+        return parts[1]
 
-        try:
-            decoded_token = firebase_auth.verify_id_token(id_token)
-        except Exception:
-            raise exceptions.AuthenticationFailed('Invalid Firebase ID token.')
+    def get_user(self, decoded_token, user_id=None):
+        uid = decoded_token.get('uid')
+        user = user_cache.get(uid)
+        metrics.AUTH_CACHE.inc(cache='user', result='miss' if user is None else 'hit')
+        if user is None:
+            User = get_user_model()
+            if user_id is not None:
+                user = User.objects.filter(pk=user_id).first()
+            if user is None:
+                user = self.get_or_create_user(decoded_token)
+            user_cache.set(uid, user)
+        # Hand out a copy so one request mutating its user can't leak into
+        # another thread holding the cached instance.
+        return copy.copy(user)
 
+    async def aget_user(self, decoded_token, user_id=None):
+        uid = decoded_token.get('uid')
+        user = user_cache.get(uid)
+        metrics.AUTH_CACHE.inc(cache='user', result='miss' if user is None else 'hit')
+        if user is None:
+            User = get_user_model()
+            if user_id is not None:
+                user = await User.objects.filter(pk=user_id).afirst()
+            if user is None:
+                user = await sync_to_async(self.get_or_create_user)(decoded_token)
+            user_cache.set(uid, user)
+        return copy.copy(user)
+
+    def get_or_create_user(self, decoded_token):
         uid = decoded_token.get('uid')
         email = decoded_token.get('email', '')
         username = email.split('@')[0] if email else uid
 
-        from django.contrib.auth import get_user_model
         User = get_user_model()
 
         # Ensure consistent matching with firebase_uid
@@ -34,5 +151,4 @@ class FirebaseAuthentication(authentication.BaseAuthentication):
             'email': email,
             'username': username
         })
-
-        return (user, None)
+        return user
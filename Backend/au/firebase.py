@@ -0,0 +1,42 @@
+"""
+The Firebase Admin SDK app, initialised on first use.
+
+Importing ``firebase_admin`` and loading the service account key costs a
+few hundred milliseconds, which every ``manage.py`` command, test run and
+forked worker used to pay in settings. Token verification (``au.tokens``)
+only needs the app for its project id, so it's created the first time that
+is asked for. ``FIREBASE_CREDENTIALS`` is the service account JSON path.
+"""
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+_app = None
+_lock = threading.Lock()
+
+
+def get_app():
+    global _app
+    if _app is None:
+        with _lock:
+            if _app is None:
+                _app = _initialize()
+    return _app
+
+
+def _initialize():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    try:
+        # Already set up by the embedding process.
+        return firebase_admin.get_app()
+    except ValueError:
+        pass
+    path = getattr(settings, 'FIREBASE_CREDENTIALS', None)
+    try:
+        certificate = credentials.Certificate(path)
+    except (OSError, ValueError) as exc:
+        raise ImproperlyConfigured(f"Can't load Firebase credentials from {path!r}: {exc}")
+    return firebase_admin.initialize_app(certificate)
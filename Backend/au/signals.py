@@ -0,0 +1,14 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import token_cache, user_cache
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def drop_cached_user(sender, instance, **kwargs):
+    if instance.firebase_uid:
+        user_cache.delete(instance.firebase_uid)
+    if kwargs.get('signal') is post_delete:
+        # Cached tokens still point at the deleted user's id.
+        token_cache.clear()
@@ -1,3 +1,258 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from google.auth import crypt, jwt
+from rest_framework.test import APIClient
+
+from . import authentication, firebase, tokens
+from .cache import TTLCache
+
+User = get_user_model()
+
+PROJECT_ID = 'local-test'
+
+
+def _make_key_pair():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'local-test')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    return private_pem, cert.public_bytes(serialization.Encoding.PEM).decode('ascii')
+
+
+PRIVATE_KEY, CERTIFICATE = _make_key_pair()
+LOCAL_KEYS = {'local-kid': CERTIFICATE}
+
+
+def make_token(uid='uid-1', email='user@example.com', expires_in=3600, **claims):
+    now = int(time.time())
+    payload = {
+        'iss': tokens.ISSUER_PREFIX + PROJECT_ID,
+        'aud': PROJECT_ID,
+        'sub': uid,
+        'email': email,
+        'iat': now,
+        'exp': now + expires_in,
+    }
+    payload.update(claims)
+    signer = crypt.RSASigner.from_string(PRIVATE_KEY, key_id='local-kid')
+    return jwt.encode(signer, payload).decode('ascii')
+
+
+class TTLCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = TTLCache(maxsize=2, ttl=10, timer=lambda: self.now)
+
+    def test_entries_expire(self):
+        self.cache.set('a', 1)
+        self.now = 9.9
+        self.assertEqual(self.cache.get('a'), 1)
+        self.now = 10.0
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_per_entry_ttl_is_capped_by_default(self):
+        self.cache.set('short', 1, ttl=2)
+        self.cache.set('long', 2, ttl=60)
+        self.now = 5
+        self.assertIsNone(self.cache.get('short'))
+        self.now = 11
+        self.assertIsNone(self.cache.get('long'))
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+
+
+class FakeCertsResponse:
+    def __init__(self, keys):
+        self.body = json.dumps(keys).encode('utf-8')
+        self.headers = {'Cache-Control': 'public, max-age=3600'}
+
+    def read(self):
+        return self.body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@override_settings(FIREBASE_PUBLIC_KEYS=None, FIREBASE_PROJECT_ID=PROJECT_ID, FIREBASE_KEYS_MIN_REFRESH_INTERVAL=60)
+class PublicKeyCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.cache = tokens.PublicKeyCache(timer=lambda: self.now)
+        patcher = mock.patch.object(tokens, 'public_keys', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unknown_kid_refreshes_at_most_once_per_interval(self):
+        with mock.patch('urllib.request.urlopen', return_value=FakeCertsResponse(LOCAL_KEYS)) as urlopen:
+            tokens.verify_id_token(make_token())
+            signer = crypt.RSASigner.from_string(PRIVATE_KEY, key_id='made-up')
+            forged = jwt.encode(signer, {'sub': 'x', 'aud': PROJECT_ID}).decode('ascii')
+            for _ in range(5):
+                with self.assertRaises(tokens.InvalidToken):
+                    tokens.verify_id_token(forged)
+            self.assertEqual(urlopen.call_count, 1)
+            self.now += 61
+            with self.assertRaises(tokens.InvalidToken):
+                tokens.verify_id_token(forged)
+            self.assertEqual(urlopen.call_count, 2)
+
+    def test_fetch_failure_without_keys_is_an_invalid_token(self):
+        with mock.patch('urllib.request.urlopen', side_effect=OSError('unreachable')) as urlopen:
+            for _ in range(3):
+                with self.assertRaises(tokens.InvalidToken):
+                    tokens.verify_id_token(make_token())
+        self.assertEqual(urlopen.call_count, 1)
+
+    def test_fetch_failure_keeps_last_good_keys(self):
+        with mock.patch('urllib.request.urlopen', return_value=FakeCertsResponse(LOCAL_KEYS)):
+            self.cache.get()
+        self.now += 3601
+        with mock.patch('urllib.request.urlopen', side_effect=OSError('unreachable')):
+            self.assertEqual(tokens.verify_id_token(make_token(uid='abc'))['uid'], 'abc')
+
+
+@override_settings(FIREBASE_PUBLIC_KEYS=LOCAL_KEYS, FIREBASE_PROJECT_ID=PROJECT_ID)
+class VerifyIdTokenTests(SimpleTestCase):
+    def test_valid_token(self):
+        claims = tokens.verify_id_token(make_token(uid='abc'))
+        self.assertEqual(claims['uid'], 'abc')
+
+    def test_rejects_expired_token(self):
+        with self.assertRaises(tokens.InvalidToken):
+            tokens.verify_id_token(make_token(expires_in=-60))
+
+    def test_rejects_wrong_audience_and_issuer(self):
+        with self.assertRaises(tokens.InvalidToken):
+            tokens.verify_id_token(make_token(aud='other-project'))
+        with self.assertRaises(tokens.InvalidToken):
+            tokens.verify_id_token(make_token(iss='https://evil.example.com/local-test'))
+
+    def test_rejects_foreign_signature(self):
+        other_private, _ = _make_key_pair()
+        signer = crypt.RSASigner.from_string(other_private, key_id='local-kid')
+        token = jwt.encode(signer, {'sub': 'x', 'aud': PROJECT_ID}).decode('ascii')
+        with self.assertRaises(tokens.InvalidToken):
+            tokens.verify_id_token(token)
+
+
+class LazyFirebaseAppTests(SimpleTestCase):
+    def setUp(self):
+        import firebase_admin
+        self.firebase_admin = firebase_admin
+        firebase._app = None
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'service-account.json')
+        with open(self.path, 'w') as fh:
+            json.dump({
+                'type': 'service_account',
+                'project_id': PROJECT_ID,
+                'private_key': PRIVATE_KEY.decode('ascii'),
+                'client_email': f'admin@{PROJECT_ID}.iam.gserviceaccount.com',
+                'token_uri': 'https://oauth2.googleapis.com/token',
+            }, fh)
+
+    def tearDown(self):
+        if firebase._app is not None:
+            self.firebase_admin.delete_app(firebase._app)
+        firebase._app = None
+
+    @override_settings(FIREBASE_PUBLIC_KEYS=LOCAL_KEYS)
+    def test_initialised_once_on_first_verification(self):
+        with override_settings(FIREBASE_CREDENTIALS=self.path), \
+                mock.patch.object(self.firebase_admin, 'initialize_app',
+                                  wraps=self.firebase_admin.initialize_app) as initialize:
+            self.assertIsNone(firebase._app)
+            threads = [threading.Thread(target=firebase.get_app) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(tokens.verify_id_token(make_token())['uid'], 'uid-1')
+        self.assertEqual(initialize.call_count, 1)
+        self.assertEqual(firebase._app.project_id, PROJECT_ID)
+
+    def test_missing_credentials(self):
+        with override_settings(FIREBASE_CREDENTIALS=self.path + '.missing'):
+            with self.assertRaises(ImproperlyConfigured):
+                firebase.get_app()
+        self.assertIsNone(firebase._app)
+
+
+@override_settings(FIREBASE_PUBLIC_KEYS=LOCAL_KEYS, FIREBASE_PROJECT_ID=PROJECT_ID)
+class FirebaseAuthenticationCacheTests(TestCase):
+    def setUp(self):
+        authentication.clear_caches()
+        self.addCleanup(authentication.clear_caches)
+        self.client = APIClient()
+
+    def _get(self, token):
+        return self.client.get('/api/bookings/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_repeat_requests_skip_verification_and_user_lookup(self):
+        token = make_token(uid='repeat', email='repeat@example.com')
+        with mock.patch.object(authentication, 'verify_id_token', wraps=tokens.verify_id_token) as verify:
+            self.assertEqual(self._get(token).status_code, 200)
+            self.assertEqual(User.objects.get(firebase_uid='repeat').username, 'repeat')
+            # Only the bookings page query remains once the token is cached.
+            with self.assertNumQueries(1):
+                self.assertEqual(self._get(token).status_code, 200)
+        self.assertEqual(verify.call_count, 1)
+
+    def test_new_token_for_known_user_skips_db(self):
+        self._get(make_token(uid='known'))
+        with self.assertNumQueries(1):
+            self._get(make_token(uid='known', iat=int(time.time()) - 1))
+
+    def test_token_cache_expires_with_token(self):
+        token = make_token(uid='short', expires_in=2)
+        self._get(token)
+        cached = authentication.token_cache._data[authentication._token_key(token)]
+        self.assertLessEqual(cached[1] - time.monotonic(), 2)
+
+    def test_user_changes_invalidate_user_cache(self):
+        token = make_token(uid='changed')
+        self._get(token)
+        user = User.objects.get(firebase_uid='changed')
+        user.role = 'provider'
+        user.save()
+        self.assertIsNone(authentication.user_cache.get('changed'))
+
+    def test_invalid_token_is_rejected(self):
+        self.assertEqual(self._get('garbage').status_code, 403)
@@ -0,0 +1,136 @@
+"""
+Firebase ID token verification against a locally cached public key set.
+
+Google rotates the securetoken signing certificates and publishes them with a
+Cache-Control max-age, so the set is fetched at most once per max-age and the
+last good copy keeps being used if a refresh fails. A token naming an
+unknown key forces a refresh, but at most once per
+``FIREBASE_KEYS_MIN_REFRESH_INTERVAL`` seconds, so made-up key ids can't make
+every request wait on Google. Setting
+``FIREBASE_PUBLIC_KEYS`` (``{kid: x509 PEM}``) replaces the download entirely,
+which lets tests and offline environments verify tokens signed with a local
+stand-in key.
+"""
+import json
+import re
+import threading
+import time
+import urllib.request
+
+from django.conf import settings
+from google.auth import exceptions as google_exceptions
+
+from . import firebase
+
+CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+ISSUER_PREFIX = 'https://securetoken.google.com/'
+DEFAULT_MAX_AGE = 3600
+MIN_REFRESH_INTERVAL = 60
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class PublicKeyCache:
+    def __init__(self, url=CERTS_URL, timer=time.monotonic):
+        self.url = url
+        self.timer = timer
+        self._keys = {}
+        self._expires_at = 0.0
+        self._attempted_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def _min_interval(self):
+        return getattr(settings, 'FIREBASE_KEYS_MIN_REFRESH_INTERVAL', MIN_REFRESH_INTERVAL)
+
+    def _refresh_due(self, force_refresh):
+        if self.timer() - self._attempted_at < self._min_interval():
+            return False
+        return force_refresh or not self._keys or self._expires_at <= self.timer()
+
+    def get(self, force_refresh=False):
+        """
+        The current key set. Raises ``InvalidToken`` when there is none
+        because fetching it failed.
+        """
+        local = getattr(settings, 'FIREBASE_PUBLIC_KEYS', None)
+        if local:
+            return local
+        if self._refresh_due(force_refresh):
+            with self._lock:
+                # Another thread may have refreshed while we waited.
+                if self._refresh_due(force_refresh):
+                    self._refresh()
+        if not self._keys:
+            raise InvalidToken('Token signing keys are unavailable.')
+        return self._keys
+
+    def _refresh(self):
+        self._attempted_at = self.timer()
+        try:
+            with urllib.request.urlopen(self.url, timeout=10) as response:
+                keys = json.loads(response.read().decode('utf-8'))
+                match = _MAX_AGE_RE.search(response.headers.get('Cache-Control', ''))
+        except (OSError, ValueError):
+            # Keep serving the last good key set (if any) rather than failing
+            # every request while Google is unreachable.
+            return
+        self._keys = keys
+        self._expires_at = self.timer() + (int(match.group(1)) if match else DEFAULT_MAX_AGE)
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._expires_at = 0.0
+            self._attempted_at = float('-inf')
+
+
+public_keys = PublicKeyCache()
+
+
+def get_project_id():
+    project_id = getattr(settings, 'FIREBASE_PROJECT_ID', None)
+    if project_id:
+        return project_id
+    return firebase.get_app().project_id
+
+
+def verify_id_token(id_token):
+    """
+    Verify a Firebase ID token and return its claims, with ``uid`` set to the
+    subject like ``firebase_admin.auth.verify_id_token`` does.
+    """
+    # Imported here: google.auth.jwt pulls in the crypto backends, which
+    # commands that never verify a token shouldn't pay for at startup.
+    from google.auth import jwt
+
+    try:
+        header = jwt.decode_header(id_token)
+    except (ValueError, google_exceptions.GoogleAuthError) as exc:
+        raise InvalidToken(str(exc))
+    if header.get('alg') != 'RS256':
+        raise InvalidToken('Unexpected token algorithm.')
+
+    keys = public_keys.get()
+    if header.get('kid') not in keys:
+        # Signing keys may have rotated since the set was cached.
+        keys = public_keys.get(force_refresh=True)
+        if header.get('kid') not in keys:
+            raise InvalidToken('Unknown token signing key.')
+
+    project_id = get_project_id()
+    try:
+        claims = jwt.decode(id_token, certs=keys, audience=project_id, clock_skew_in_seconds=5)
+    except (ValueError, google_exceptions.GoogleAuthError) as exc:
+        raise InvalidToken(str(exc))
+
+    if claims.get('iss') != ISSUER_PREFIX + project_id:
+        raise InvalidToken('Unexpected token issuer.')
+    subject = claims.get('sub')
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        raise InvalidToken('Invalid token subject.')
+    claims['uid'] = subject
+    return claims
@@ -2,7 +2,7 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from firebase_admin import auth as firebase_auth
+from .tokens import verify_id_token
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -14,7 +14,7 @@ class FirebaseTokenVerifyView(APIView):
             return Response({'error': 'Token missing'}, status=400)
 
         try:
-            decoded_token = firebase_auth.verify_id_token(token)
+            decoded_token = verify_id_token(token)
             uid = decoded_token['uid']
             email = decoded_token.get('email', '')
             role = 'customer'
@@ -0,0 +1,23 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from jobs.queue import Worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        worker = Worker(concurrency=options['concurrency'], poll_interval=options['poll_interval'])
+        signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+        self.stdout.write(f"Worker started with {worker.concurrency} threads.")
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            worker.stop()
+        self.stdout.write("Worker stopped.")
@@ -0,0 +1,184 @@
+"""
+Database-backed job queue for side effects that shouldn't hold up a request.
+
+Handlers register under a name with ``@register``; ``enqueue`` writes a Job
+row once the surrounding transaction commits. ``manage.py worker`` claims due
+jobs and runs them in a thread pool. A failing job is retried with
+exponential backoff and ends up ``dead`` (with its traceback in
+``last_error``) after ``max_attempts`` tries.
+"""
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def register(name):
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def get_handler(name):
+    return _registry[name]
+
+
+def enqueue(name, max_attempts=None, **payload):
+    """Queue ``name(**payload)`` to run after the current transaction commits."""
+    if name not in _registry:
+        raise KeyError(f"No job handler registered as {name!r}")
+    job = Job(
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts or getattr(settings, 'JOBS_MAX_ATTEMPTS', 5),
+    )
+
+    def _commit():
+        job.save()
+        if getattr(settings, 'JOBS_ALWAYS_EAGER', False):
+            if claim(job.pk):
+                run_job(Job.objects.get(pk=job.pk))
+
+    transaction.on_commit(_commit)
+    return job
+
+
+def enqueue_many(name, payloads, max_attempts=None):
+    """Queue one job per payload dict with a single INSERT after commit."""
+    if name not in _registry:
+        raise KeyError(f"No job handler registered as {name!r}")
+    jobs = [
+        Job(name=name, payload=payload, max_attempts=max_attempts or getattr(settings, 'JOBS_MAX_ATTEMPTS', 5))
+        for payload in payloads
+    ]
+    def _commit():
+        Job.objects.bulk_create(jobs, batch_size=500)
+        if getattr(settings, 'JOBS_ALWAYS_EAGER', False):
+            for job in jobs:
+                if claim(job.pk):
+                    run_job(Job.objects.get(pk=job.pk))
+
+    transaction.on_commit(_commit)
+    return jobs
+
+
+def backoff(attempts):
+    base = getattr(settings, 'JOBS_RETRY_BASE_SECONDS', 2)
+    return timedelta(seconds=min(base ** attempts, 3600))
+
+
+def claim(pk):
+    """Atomically move one queued job to running; False if another worker won."""
+    return Job.objects.filter(pk=pk, status='queued').update(
+        status='running',
+        locked_at=timezone.now(),
+        attempts=F('attempts') + 1,
+    ) == 1
+
+
+def claim_due(limit):
+    now = timezone.now()
+    # Jobs whose worker died mid-run go back on the queue.
+    stale = now - timedelta(seconds=getattr(settings, 'JOBS_LOCK_TIMEOUT', 600))
+    Job.objects.filter(status='running', locked_at__lt=stale).update(status='queued')
+
+    due = (
+        Job.objects.filter(status='queued', run_at__lte=now)
+        .order_by('run_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    return [pk for pk in list(due) if claim(pk)]
+
+
+@contextmanager
+def absorb(name, limit=500):
+    """
+    Claim up to ``limit`` other due ``name`` jobs so a running handler can
+    do their work in the same pass; yields their payloads. They're marked
+    done if the block succeeds and go back on the queue if it raises.
+    """
+    due = (
+        Job.objects.filter(name=name, status='queued', run_at__lte=timezone.now())
+        .order_by('run_at', 'id')
+        .values_list('id', 'payload')[:limit]
+    )
+    claimed = [(pk, payload) for pk, payload in list(due) if claim(pk)]
+    pks = [pk for pk, _ in claimed]
+    try:
+        yield [payload for _, payload in claimed]
+    except BaseException:
+        # Not their failure: don't count the attempt against them.
+        Job.objects.filter(pk__in=pks).update(status='queued', locked_at=None, attempts=F('attempts') - 1)
+        raise
+    Job.objects.filter(pk__in=pks).update(status='done', locked_at=None)
+
+
+def run_job(job):
+    try:
+        get_handler(job.name)(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s dead after %s attempts", job, job.attempts)
+            Job.objects.filter(pk=job.pk).update(status='dead', last_error=error, locked_at=None)
+        else:
+            logger.warning("Job %s failed, retrying", job)
+            Job.objects.filter(pk=job.pk).update(
+                status='queued',
+                last_error=error,
+                locked_at=None,
+                run_at=timezone.now() + backoff(job.attempts),
+            )
+        return False
+    Job.objects.filter(pk=job.pk).update(status='done', locked_at=None)
+    return True
+
+
+def _run_claimed(pk):
+    try:
+        return run_job(Job.objects.get(pk=pk))
+    finally:
+        close_old_connections()
+
+
+def run_pending(limit=100):
+    """Run due jobs inline; returns the number processed."""
+    claimed = claim_due(limit)
+    for pk in claimed:
+        run_job(Job.objects.get(pk=pk))
+    return len(claimed)
+
+
+class Worker:
+    def __init__(self, concurrency=4, poll_interval=1.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job') as pool:
+            while not self._stop.is_set():
+                claimed = claim_due(self.concurrency)
+                if not claimed:
+                    close_old_connections()
+                    self._stop.wait(self.poll_interval)
+                    continue
+                # Wait for the batch so at most `concurrency` jobs are held.
+                list(pool.map(_run_claimed, claimed))
@@ -0,0 +1,106 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import Worker, absorb, claim, enqueue, register, run_job, run_pending
+
+calls = []
+
+
+@register('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@register('tests.explode')
+def explode():
+    raise RuntimeError('boom')
+
+
+@register('tests.batch')
+def batch(value, fail=False):
+    with absorb('tests.batch') as payloads:
+        if fail:
+            raise RuntimeError('boom')
+        calls.append(sorted([value] + [payload['value'] for payload in payloads]))
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_job_is_written_on_commit_and_run(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('tests.record', value=3)
+            self.assertFalse(Job.objects.exists())
+        job = Job.objects.get()
+        self.assertEqual(job.status, 'queued')
+
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(calls, [3])
+
+    def test_failures_retry_with_backoff_then_dead_letter(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('tests.explode', max_attempts=2)
+
+        run_pending()
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertEqual(run_pending(), 0)
+
+        Job.objects.update(run_at=timezone.now())
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('dead', 2))
+
+    def test_handler_absorbs_queued_jobs_of_its_name(self):
+        first = Job.objects.create(name='tests.batch', payload={'value': 1})
+        for value in (2, 3):
+            Job.objects.create(name='tests.batch', payload={'value': value})
+        later = Job.objects.create(name='tests.batch', payload={'value': 4}, run_at=timezone.now() + timedelta(hours=1))
+        Job.objects.create(name='tests.record', payload={'value': 5})
+
+        self.assertEqual(run_pending(limit=1), 1)
+        self.assertEqual(calls, [[1, 2, 3]])
+        self.assertEqual(Job.objects.filter(name='tests.batch', status='done').count(), 3)
+        self.assertEqual(Job.objects.get(pk=later.pk).status, 'queued')
+        self.assertEqual(Job.objects.get(pk=first.pk).attempts, 1)
+
+    def test_absorbed_jobs_are_requeued_when_the_handler_fails(self):
+        failing = Job.objects.create(name='tests.batch', payload={'value': 1, 'fail': True})
+        other = Job.objects.create(name='tests.batch', payload={'value': 2})
+        self.assertTrue(claim(failing.pk))
+        self.assertFalse(run_job(Job.objects.get(pk=failing.pk)))
+        other.refresh_from_db()
+        self.assertEqual((other.status, other.attempts), ('queued', 0))
+
+    def test_stale_running_jobs_are_reclaimed(self):
+        job = Job.objects.create(
+            name='tests.record', payload={'value': 1}, status='running',
+            locked_at=timezone.now() - timedelta(hours=1),
+        )
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+
+    @override_settings(JOBS_ALWAYS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('tests.record', value='now')
+        self.assertEqual(calls, ['now'])
+        self.assertEqual(Job.objects.get().status, 'done')
+
+    def test_unknown_job_name(self):
+        with self.assertRaises(KeyError):
+            enqueue('tests.missing')
+
+    def test_worker_stops(self):
+        worker = Worker(concurrency=1, poll_interval=0.01)
+        worker.stop()
+        worker.run()
@@ -0,0 +1,491 @@
+"""
+Endpoint benchmark suite.
+
+Every route in ``services/urls.py`` and ``Booking/urls.py`` has a scenario
+that builds one request against the seeded data set (see ``perf.seed``).
+Requests go through the Django test client and the real
+``FirebaseAuthentication``; only the signature check is replaced, by a
+verifier that accepts a user's firebase uid as its token. The whole run
+happens in one transaction that is rolled back, so write scenarios leave
+the data set as they found it and runs are repeatable.
+
+Per scenario we record latency percentiles, the worst query count and the
+peak traced memory of one request, and ``compare`` checks them against a
+stored baseline. ``startup`` separately times a worker's cold start in a
+fresh interpreter under ``-X importtime``, and ``bulk_throughput`` compares
+one bulk booking request with the same bookings made one call at a time.
+"""
+import contextlib
+import io
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from au import authentication
+from Booking.models import Booking
+from services import cache
+from services.models import Service, ServiceProvider
+
+from .seed import UID_PREFIX
+
+# What a worker process does before serving its first request.
+STARTUP_CODE = (
+    'import django; django.setup(); '
+    'from django.urls import get_resolver; get_resolver().url_patterns'
+)
+
+Request = namedtuple('Request', 'method path data user', defaults=(None, None))
+Scenario = namedtuple('Scenario', 'name build expect')
+
+SCENARIOS = []
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def scenario(name, expect=200):
+    def decorator(build):
+        SCENARIOS.append(Scenario(name, build, expect))
+        return build
+    return decorator
+
+
+class Context:
+    """The seeded rows the scenarios point at, chosen deterministically."""
+
+    def __init__(self):
+        providers = ServiceProvider.objects.filter(user__firebase_uid__startswith=UID_PREFIX)
+        self.provider = providers.select_related('user').order_by('pk').first()
+        booking = (
+            Booking.objects.filter(user__firebase_uid__startswith=UID_PREFIX)
+            .select_related('user').order_by('pk').first()
+        )
+        if self.provider is None or booking is None:
+            raise BenchmarkError("No seeded data found; run `manage.py seed_perf_data` first.")
+        self.customer = booking.user
+        self.service = Service.objects.filter(provider=self.provider).order_by('pk').first()
+        self.today = timezone.localdate()
+
+    def dataset(self):
+        return {
+            'providers': ServiceProvider.objects.count(),
+            'services': Service.objects.count(),
+            'bookings': Booking.objects.count(),
+        }
+
+    def booking(self, days_ahead, **extra):
+        return Booking.objects.create(
+            user=self.customer, service=self.service, date=self.today + timedelta(days=days_ahead),
+            time='10:00', name='Bench', contact='0300', location='Home', **extra,
+        )
+
+
+def _service_payload(i):
+    return {
+        'name': f'Bench service {i}', 'category': 'Repair', 'description': 'Benchmark',
+        'price': '1200.00', 'duration_minutes': 60,
+    }
+
+
+def _booking_payload(ctx, days_ahead):
+    return {
+        'service': ctx.service.pk, 'date': (ctx.today + timedelta(days=days_ahead)).isoformat(),
+        'time': '10:00', 'name': 'Bench', 'contact': '0300', 'location': 'Home',
+    }
+
+
+# Reads first, so write scenarios can't change what the reads see.
+
+@scenario('list-all-services')
+def _list_all_services(ctx, i):
+    return Request('get', '/api/services/')
+
+
+@scenario('list-all-services:uncached')
+def _list_all_services_uncached(ctx, i):
+    cache.get_cache().clear()
+    return Request('get', '/api/services/?ordering=rating')
+
+
+@scenario('public-retrieve-service')
+def _public_retrieve_service(ctx, i):
+    return Request('get', f'/api/services/{ctx.service.pk}/')
+
+
+@scenario('similar-services')
+def _similar_services(ctx, i):
+    return Request('get', f'/api/services/{ctx.service.pk}/similar/')
+
+
+@scenario('search-services')
+def _search_services(ctx, i):
+    return Request('get', '/api/services/search/?q=clean&category=Cleaning')
+
+
+@scenario('nearby-providers')
+def _nearby_providers(ctx, i):
+    return Request('get', f'/api/providers/nearby/?lat={ctx.provider.latitude}&lng={ctx.provider.longitude}&radius_km=5')
+
+
+@scenario('service-availability')
+def _service_availability(ctx, i):
+    return Request('get', f'/api/services/{ctx.service.pk}/availability/')
+
+
+@scenario('get-provider-profile')
+def _get_provider_profile(ctx, i):
+    return Request('get', '/api/profile/', user=ctx.provider.user)
+
+
+@scenario('list-provider-services')
+def _list_provider_services(ctx, i):
+    return Request('get', '/api/provider/services/', user=ctx.provider.user)
+
+
+@scenario('retrieve-service')
+def _retrieve_service(ctx, i):
+    return Request('get', f'/api/provider/services/{ctx.service.pk}/', user=ctx.provider.user)
+
+
+@scenario('user-bookings')
+def _user_bookings(ctx, i):
+    return Request('get', '/api/bookings/', user=ctx.customer)
+
+
+@scenario('provider-bookings')
+def _provider_bookings(ctx, i):
+    return Request('get', '/api/provider/bookings/', user=ctx.provider.user)
+
+
+@scenario('nearby-bookings')
+def _nearby_bookings(ctx, i):
+    return Request('get', '/api/provider/bookings/nearby/?radius_km=20', user=ctx.provider.user)
+
+
+@scenario('provider-bookings-export')
+def _provider_bookings_export(ctx, i):
+    return Request('get', '/api/provider/bookings/export/csv/', user=ctx.provider.user)
+
+
+@scenario('provider-analytics')
+def _provider_analytics(ctx, i):
+    start = timezone.localdate() - timedelta(days=180)
+    return Request('get', f'/api/provider/analytics/?start={start}', user=ctx.provider.user)
+
+
+@scenario('create-provider-profile', expect=201)
+def _create_provider_profile(ctx, i):
+    uid = f'{UID_PREFIX}bench-{i}'
+    user = get_user_model().objects.create(username=uid, firebase_uid=uid, email=f'{uid}@perf.example.com')
+    data = {'full_name': 'Bench Provider', 'phone': '0300', 'location': 'Lahore', 'latitude': 31.5, 'longitude': 74.3}
+    return Request('post', '/api/create-profile/', data, user)
+
+
+@scenario('update-provider-profile')
+def _update_provider_profile(ctx, i):
+    return Request('patch', '/api/update-profile/', {'bio': f'Updated {i}'}, ctx.provider.user)
+
+
+@scenario('add-service', expect=201)
+def _add_service(ctx, i):
+    return Request('post', '/api/add-service/', _service_payload(i), ctx.provider.user)
+
+
+@scenario('bulk-add-service', expect=201)
+def _bulk_add_service(ctx, i):
+    return Request('post', '/api/add-service/bulk/', [_service_payload(i * 20 + k) for k in range(20)], ctx.provider.user)
+
+
+@scenario('update-service')
+def _update_service(ctx, i):
+    return Request('patch', f'/api/update-service/{ctx.service.pk}/', {'price': f'{1000 + i}.00'}, ctx.provider.user)
+
+
+@scenario('delete-service', expect=204)
+def _delete_service(ctx, i):
+    service = Service.objects.create(provider=ctx.provider, **_service_payload(i))
+    return Request('delete', f'/api/delete-service/{service.pk}/', user=ctx.provider.user)
+
+
+@scenario('create-booking', expect=201)
+def _create_booking(ctx, i):
+    # Days past the seeded range, one per iteration, so there's no clash.
+    return Request('post', '/api/bookings/create/', _booking_payload(ctx, 400 + i), ctx.customer)
+
+
+@scenario('bulk-create-booking', expect=201)
+def _bulk_create_booking(ctx, i):
+    return Request('post', '/api/bookings/bulk/', [_booking_payload(ctx, 2000 + i * 10 + k) for k in range(10)], ctx.customer)
+
+
+@scenario('submit-feedback', expect=201)
+def _submit_feedback(ctx, i):
+    booking = ctx.booking(5000 + i)
+    return Request('post', f'/api/bookings/{booking.pk}/feedback/', {'rating': 5, 'comment': 'Great'}, ctx.customer)
+
+
+@scenario('cancel-booking')
+def _cancel_booking(ctx, i):
+    booking = ctx.booking(6000 + i)
+    return Request('post', f'/api/bookings/{booking.pk}/cancel/', {}, ctx.customer)
+
+
+def _verify(id_token):
+    # Tokens are the user's firebase uid; see the module docstring.
+    return {'uid': id_token, 'exp': time.time() + 3600}
+
+
+def _host():
+    # With DEBUG and an empty ALLOWED_HOSTS only localhost passes the check.
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+    return hosts[0] if hosts else 'localhost'
+
+
+def send(client, request):
+    headers = {}
+    if request.user is not None:
+        headers['HTTP_AUTHORIZATION'] = f'Bearer {request.user.firebase_uid}'
+    # Some views print request bodies; keep them out of the report.
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = getattr(client, request.method)(request.path, request.data, format='json', **headers)
+        if response.streaming:
+            # The body, and the queries behind it, are produced as it's read.
+            for _ in response.streaming_content:
+                pass
+        return response
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def measure(client, ctx, item, iterations, warmup):
+    counter = itertools.count()
+
+    def build():
+        # Fixture rows a scenario creates for itself are not part of what it
+        # measures, so requests are built outside the timer and the capture.
+        return item.build(ctx, next(counter))
+
+    def call(request):
+        started = time.perf_counter()
+        response = send(client, request)
+        elapsed = time.perf_counter() - started
+        if response.status_code != item.expect:
+            raise BenchmarkError(
+                f"{item.name}: expected {item.expect}, got {response.status_code}: {response.content[:200]!r}"
+            )
+        return elapsed
+
+    for _ in range(warmup):
+        call(build())
+
+    latencies = []
+    queries = 0
+    for _ in range(iterations):
+        request = build()
+        with CaptureQueriesContext(connection) as captured:
+            latencies.append(call(request))
+        queries = max(queries, len(captured))
+
+    request = build()
+    tracemalloc.start()
+    try:
+        call(request)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+        'queries': queries,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+@contextlib.contextmanager
+def session():
+    """
+    ``(client, ctx)`` for sending scenario requests, inside a transaction
+    that is rolled back on exit.
+    """
+    ctx = Context()
+    client = APIClient(HTTP_HOST=_host())
+    authentication.clear_caches()
+    try:
+        with mock.patch.object(authentication, 'verify_id_token', _verify), transaction.atomic():
+            yield client, ctx
+            transaction.set_rollback(True)
+    finally:
+        # Cached users, tokens and pages may describe rolled-back rows.
+        authentication.clear_caches()
+        cache.invalidate_services()
+
+
+def select(names=None):
+    selected = [item for item in SCENARIOS if not names or item.name in names]
+    unknown = set(names or ()) - {item.name for item in SCENARIOS}
+    if unknown:
+        raise BenchmarkError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return selected
+
+
+def run(iterations=30, warmup=3, names=None, log=None):
+    """Run the selected scenarios and return ``{'dataset': ..., 'scenarios': ...}``."""
+    selected = select(names)
+    results = {}
+    with session() as (client, ctx):
+        dataset = ctx.dataset()
+        for item in selected:
+            results[item.name] = measure(client, ctx, item, iterations, warmup)
+            if log:
+                log(item.name, results[item.name])
+    return {'dataset': dataset, 'iterations': iterations, 'scenarios': results}
+
+
+def bulk_throughput(batch=500, rounds=3):
+    """
+    Bookings per second when ``batch`` bookings go through one
+    ``/api/bookings/bulk/`` request versus ``batch`` single
+    ``/api/bookings/create/`` calls, best of ``rounds``, and their ratio.
+    """
+    singles, bulk = [], []
+    with session() as (client, ctx):
+        for round_ in range(rounds):
+            first = 10000 + round_ * 2 * batch
+            requests = [
+                Request('post', '/api/bookings/create/', _booking_payload(ctx, first + k), ctx.customer)
+                for k in range(batch)
+            ]
+            started = time.perf_counter()
+            for request in requests:
+                if send(client, request).status_code != 201:
+                    raise BenchmarkError("bulk-throughput: a single booking was rejected")
+            singles.append(time.perf_counter() - started)
+
+            request = Request(
+                'post', '/api/bookings/bulk/',
+                [_booking_payload(ctx, first + batch + k) for k in range(batch)], ctx.customer,
+            )
+            started = time.perf_counter()
+            response = send(client, request)
+            bulk.append(time.perf_counter() - started)
+            if response.status_code != 201:
+                raise BenchmarkError(f"bulk-throughput: expected 201, got {response.status_code}")
+
+    singles_per_s, bulk_per_s = batch / min(singles), batch / min(bulk)
+    return {
+        'batch': batch,
+        'singles_per_s': round(singles_per_s, 1),
+        'bulk_per_s': round(bulk_per_s, 1),
+        'ratio': round(bulk_per_s / singles_per_s, 1),
+    }
+
+
+def _import_times(stderr):
+    """``[(module, self us, cumulative us, depth)]`` from ``-X importtime`` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        if not own.strip().isdigit():
+            continue  # the header
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), int(own), int(cumulative), depth))
+    return rows
+
+
+def startup(runs=5, code=STARTUP_CODE):
+    """
+    Cold start of a worker: ``code`` in a fresh interpreter, ``runs`` times.
+    Returns the median wall time and total import time, and the slowest
+    top-level imports of the median run.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if completed.returncode:
+            raise BenchmarkError(f"Startup failed: {completed.stderr.strip().splitlines()[-1:]}")
+        imports = _import_times(completed.stderr)
+        samples.append((elapsed, sum(row[1] for row in imports), imports))
+
+    elapsed, total_us, imports = sorted(samples, key=lambda sample: sample[0])[len(samples) // 2]
+    top_level = sorted((row for row in imports if row[3] == 0), key=lambda row: -row[2])
+    return {
+        'wall_ms': round(elapsed * 1000, 1),
+        'import_ms': round(total_us / 1000, 1),
+        'slowest_imports': {name: round(cumulative / 1000, 1) for name, _, cumulative, _ in top_level[:5]},
+    }
+
+
+def compare(results, baseline, latency_tolerance=0.5, memory_tolerance=0.25, latency_slack_ms=2.0):
+    """
+    Regressions of ``results`` against ``baseline``, as messages. Query
+    counts must not grow at all. Median latency and peak memory may grow by
+    the given fractions, p95 by twice the latency fraction since the tail is
+    noisier; a small absolute slack keeps sub-millisecond endpoints from
+    tripping on timer jitter. Startup times, when both sides have them,
+    get the median latency fraction, and so does a drop in the bulk booking
+    throughput ratio.
+    """
+    regressions = []
+    for name, current in results['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        if current['queries'] > base['queries']:
+            regressions.append(f"{name}: {current['queries']} queries, baseline {base['queries']}")
+        for key, tolerance in (('p50_ms', latency_tolerance), ('p95_ms', 2 * latency_tolerance)):
+            if current[key] > base[key] * (1 + tolerance) + latency_slack_ms:
+                regressions.append(f"{name}: {key[:3]} {current[key]:.1f} ms, baseline {base[key]:.1f} ms")
+        if current['peak_kib'] > base['peak_kib'] * (1 + memory_tolerance) + 64:
+            regressions.append(f"{name}: peak {current['peak_kib']:.0f} KiB, baseline {base['peak_kib']:.0f} KiB")
+
+    current, base = results.get('startup'), baseline.get('startup')
+    if current and base:
+        for key in ('wall_ms', 'import_ms'):
+            if current[key] > base[key] * (1 + latency_tolerance) + latency_slack_ms:
+                regressions.append(f"startup: {key[:-3]} {current[key]:.0f} ms, baseline {base[key]:.0f} ms")
+
+    current, base = results.get('bulk_throughput'), baseline.get('bulk_throughput')
+    if current and base and current['batch'] == base['batch']:
+        if current['ratio'] < base['ratio'] * (1 - latency_tolerance):
+            regressions.append(f"bulk-throughput: {current['ratio']:.1f}x, baseline {base['ratio']:.1f}x")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+        fh.write('\n')
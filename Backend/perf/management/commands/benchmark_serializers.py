@@ -0,0 +1,67 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from Booking.models import Booking
+from Booking.projections import BookingProjection
+from Booking.serializers import BookingSerializer
+from perf.benchmarks import _host
+from services.models import Service
+from services.projections import ServiceProjection
+from services.serializers import ServiceSerializer
+
+
+def _serializer_path(queryset, serializer_class, context):
+    return JSONRenderer().render(serializer_class(list(queryset), many=True, context=context).data)
+
+
+def _projection_path(queryset, projection_class, context):
+    projection = projection_class(context)
+    return JSONRenderer().render(projection.represent(list(projection.values(queryset))))
+
+
+class Command(BaseCommand):
+    help = (
+        "Time rendering N rows of services and bookings through their DRF "
+        "serializers and through the .values() projections used by the list "
+        "endpoints, query included, and check the JSON is byte-identical. "
+        "Run against a seeded database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        context = {'request': APIRequestFactory().get('/api/', HTTP_HOST=_host())}
+        cases = [
+            ('services', Service.objects.select_related('provider__user').prefetch_related('gallery_images').order_by('id'),
+             ServiceSerializer, ServiceProjection),
+            ('bookings', Booking.objects.select_related('service__provider').order_by('id'),
+             BookingSerializer, BookingProjection),
+        ]
+        for name, queryset, serializer_class, projection_class in cases:
+            queryset = queryset[:rows]
+            expected = _serializer_path(queryset, serializer_class, context)
+            if _projection_path(queryset, projection_class, context) != expected:
+                raise CommandError(f"{name}: projection output differs from {serializer_class.__name__}.")
+            timings = {}
+            for label, run, renderer in (
+                ('serializer', _serializer_path, serializer_class),
+                ('projection', _projection_path, projection_class),
+            ):
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    run(queryset, renderer, context)
+                    samples.append(time.perf_counter() - started)
+                timings[label] = statistics.median(samples) * 1000
+            self.stdout.write(
+                f"{name}: {rows} rows, serializer {timings['serializer']:.0f} ms, "
+                f"projection {timings['projection']:.0f} ms "
+                f"({timings['serializer'] / timings['projection']:.1f}x), output identical"
+            )
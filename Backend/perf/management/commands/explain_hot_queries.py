@@ -0,0 +1,116 @@
+import contextlib
+import re
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from perf import benchmarks
+
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def shape(sql):
+    """``sql`` with its literals replaced, so N+1 repeats group together."""
+    return re.sub(r'\?(?:, \?)+', '?, ...', LITERAL.sub('?', sql))
+
+
+def problems(sql, plan):
+    """
+    Plan lines that mean an ORDER BY sorted outside any index, or a full
+    table scan that a LIMIT doesn't cut short. Full-text ranking and
+    catalog lookups sort by design and aren't flagged.
+    """
+    if 'VIRTUAL TABLE' in ' '.join(plan) or 'sqlite_master' in sql:
+        return []
+    sorts = [line for line in plan if 'USE TEMP B-TREE FOR ORDER BY' in line.strip()]
+    # "SCAN t USING [COVERING] INDEX i" walks an index; a bare "SCAN t"
+    # reads the table in rowid order, which is fine if LIMIT stops it early.
+    scans = [
+        line for line in plan
+        if line.strip().startswith('SCAN ') and ' USING ' not in line
+        and (sorts or ' LIMIT ' not in sql)
+    ]
+    return [line.strip() for line in scans + sorts]
+
+
+def explain(connection, sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            # Rows are (id, parent, notused, detail); indent by depth.
+            depth = {0: -1}
+            lines = []
+            for node, parent, _, detail in cursor.fetchall():
+                depth[node] = depth.get(parent, -1) + 1
+                lines.append('  ' * depth[node] + detail)
+            return lines
+        cursor.execute('EXPLAIN ' + sql)
+        return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Send one request per benchmark scenario (see perf.benchmarks) against "
+        "the seeded data set and print the query plan of every statement it "
+        "runs, flagging full table scans and temp B-tree sorts. Nothing is "
+        "written: the run is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Only explain this scenario (repeatable).')
+        parser.add_argument('--sql', action='store_true', help='Print each statement in full.')
+        parser.add_argument('--fail-on-problems', action='store_true',
+                            help='Exit non-zero if any plan is flagged.')
+
+    def handle(self, *args, **options):
+        flagged = 0
+        try:
+            selected = benchmarks.select(options['scenarios'])
+            with benchmarks.session() as (client, ctx):
+                for item in selected:
+                    flagged += self.explain_scenario(client, ctx, item, options['sql'])
+        except benchmarks.BenchmarkError as exc:
+            raise CommandError(str(exc))
+
+        if flagged:
+            message = f"{flagged} statement(s) scan a table or sort without an index."
+            if options['fail_on_problems']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("Every statement is served by an index."))
+
+    def explain_scenario(self, client, ctx, item, show_sql):
+        request = item.build(ctx, 0)
+        with contextlib.ExitStack() as stack:
+            captures = [
+                (connection, stack.enter_context(CaptureQueriesContext(connection)))
+                for connection in connections.all()
+            ]
+            response = benchmarks.send(client, request)
+        if response.status_code != item.expect:
+            raise benchmarks.BenchmarkError(f"{item.name}: expected {item.expect}, got {response.status_code}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{item.name}  {request.method.upper()} {request.path}"))
+        flagged = 0
+        for connection, captured in captures:
+            statements = [query['sql'] for query in captured if query['sql'].lstrip().upper().startswith(EXPLAINABLE)]
+            counts = Counter(shape(sql) for sql in statements)
+            seen = set()
+            for sql in statements:
+                if shape(sql) in seen:
+                    continue
+                seen.add(shape(sql))
+                plan = explain(connection, sql)
+                bad = problems(sql, plan)
+                flagged += bool(bad)
+                repeat = f" (x{counts[shape(sql)]})" if counts[shape(sql)] > 1 else ''
+                self.stdout.write(f"  [{connection.alias}]{repeat} {sql if show_sql else sql[:120]}")
+                for line in plan:
+                    style = self.style.WARNING if line.strip() in bad else str
+                    self.stdout.write(style(f"      {line}"))
+        return flagged
@@ -0,0 +1,101 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from perf import benchmarks
+
+DEFAULT_BASELINE = Path(benchmarks.__file__).resolve().parent / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every API endpoint against the seeded data set and compare "
+        "latency percentiles, query counts and peak memory with a baseline, "
+        "along with the cold start time of a fresh worker process and bulk "
+        "booking throughput. Exits non-zero on any regression."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Only run this scenario (repeatable).')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Write the results as the new baseline instead of comparing.')
+        parser.add_argument('--latency-tolerance', type=float, default=0.5,
+                            help='Allowed median latency growth as a fraction of the baseline (p95 gets twice this).')
+        parser.add_argument('--memory-tolerance', type=float, default=0.25)
+        parser.add_argument('--output', help='Also write the results as JSON here.')
+        parser.add_argument('--startup-runs', type=int, default=5,
+                            help='Cold starts to time; 0 skips the startup measurement.')
+        parser.add_argument('--bulk-batch', type=int, default=500,
+                            help='Bookings per bulk-throughput comparison; 0 skips it.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'scenario':<28} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'peak KiB':>9}")
+        try:
+            results = benchmarks.run(
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                names=options['scenarios'],
+                log=self._row,
+            )
+            if options['startup_runs']:
+                results['startup'] = benchmarks.startup(runs=options['startup_runs'])
+                self._startup(results['startup'])
+            if options['bulk_batch']:
+                results['bulk_throughput'] = benchmarks.bulk_throughput(batch=options['bulk_batch'])
+                self._bulk(results['bulk_throughput'])
+        except benchmarks.BenchmarkError as exc:
+            raise CommandError(str(exc))
+
+        if options['output']:
+            benchmarks.save_baseline(options['output'], results)
+
+        path = options['baseline']
+        if options['update_baseline']:
+            benchmarks.save_baseline(path, results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {path}."))
+            return
+
+        try:
+            baseline = benchmarks.load_baseline(path)
+        except (OSError, json.JSONDecodeError) as exc:
+            raise CommandError(f"Can't read baseline {path}: {exc}. Use --update-baseline to create it.")
+        if baseline.get('dataset') != results['dataset']:
+            self.stdout.write(self.style.WARNING(
+                f"Data set differs from the baseline's ({baseline.get('dataset')} vs {results['dataset']}); "
+                "timings may not be comparable."
+            ))
+
+        regressions = benchmarks.compare(
+            results, baseline,
+            latency_tolerance=options['latency_tolerance'],
+            memory_tolerance=options['memory_tolerance'],
+        )
+        if regressions:
+            for message in regressions:
+                self.stderr.write(self.style.ERROR(message))
+            raise CommandError(f"{len(regressions)} regression(s) against {path}.")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def _row(self, name, result):
+        self.stdout.write(
+            f"{name:<28} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+            f"{result['queries']:>8} {result['peak_kib']:>9.1f}"
+        )
+
+    def _startup(self, result):
+        slowest = ', '.join(f"{name} {ms:.0f}" for name, ms in result['slowest_imports'].items())
+        self.stdout.write(
+            f"{'startup':<28} {result['wall_ms']:>9.1f} ms wall, {result['import_ms']:.1f} ms importing "
+            f"(slowest: {slowest})"
+        )
+
+    def _bulk(self, result):
+        self.stdout.write(
+            f"{'bulk-throughput':<28} {result['batch']} bookings: {result['bulk_per_s']:.0f}/s in one request, "
+            f"{result['singles_per_s']:.0f}/s one at a time ({result['ratio']:.1f}x)"
+        )
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from perf import seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a deterministic synthetic data set for benchmarking: providers, "
+        "services, customers, bookings and feedback. Writes into the default "
+        "database; use --flush to remove a previous run first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=10_000)
+        parser.add_argument('--services', type=int, default=100_000)
+        parser.add_argument('--customers', type=int, default=50_000)
+        parser.add_argument('--bookings', type=int, default=1_000_000)
+        parser.add_argument('--feedback-ratio', type=float, default=0.3,
+                            help='Share of completed bookings that get feedback.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--flush', action='store_true', help='Delete previously seeded rows first.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        log = None
+        if options['verbosity'] > 1:
+            log = lambda message: self.stdout.write(f"  {message}")
+        if options['flush']:
+            self.stdout.write(f"Flushed {seed.flush():,} rows.")
+        counts = seed.seed(
+            providers=options['providers'],
+            services=options['services'],
+            customers=options['customers'],
+            bookings=options['bookings'],
+            feedback_ratio=options['feedback_ratio'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=log,
+        )
+        summary = ', '.join(f'{value:,} {name}' for name, value in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary} in {time.perf_counter() - started:.1f}s."))
@@ -0,0 +1,199 @@
+"""
+Deterministic synthetic data for performance work.
+
+Rows are written with bulk_create in batches, which skips save() and the
+post_save signals, so everything those would maintain is rebuilt here:
+geohashes, the search index, rating aggregates, the ban-engine counters and
+the catalogue cache version. Every seeded user has a ``perf-`` firebase uid,
+which is how ``flush`` finds them again.
+"""
+import random
+from datetime import time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from Booking import analytics
+from Booking.models import Booking, Feedback
+from Booking.utils import rebuild_one_star_counters
+from services import cache, geo, search, similarity
+from services.models import ALLOWED_SERVICES, Service, ServiceProvider
+from services.ratings import reconcile_ratings
+
+UID_PREFIX = 'perf-'
+
+CITIES = [
+    ('Lahore', 31.5204, 74.3587),
+    ('Karachi', 24.8607, 67.0011),
+    ('Islamabad', 33.6844, 73.0479),
+    ('Rawalpindi', 33.5651, 73.0169),
+    ('Faisalabad', 31.4504, 73.1350),
+    ('Multan', 30.1575, 71.5249),
+    ('Peshawar', 34.0151, 71.5249),
+    ('Quetta', 30.1798, 66.9750),
+]
+SERVICE_NAMES = {
+    'Cleaning': ['Deep clean', 'Sofa cleaning', 'Kitchen degrease', 'Carpet shampoo', 'Move-out clean'],
+    'Repair': ['AC repair', 'Washing machine repair', 'Fridge service', 'Door lock repair', 'Geyser repair'],
+    'Painting': ['Room painting', 'Exterior paint', 'Wood polish', 'Wall texture', 'Ceiling touch-up'],
+    'Shifting': ['House shifting', 'Office move', 'Furniture moving', 'Packing service', 'Loading crew'],
+    'Plumbing': ['Leak fixing', 'Pipe replacement', 'Drain unblocking', 'Tap installation', 'Water tank cleaning'],
+    'Electric': ['Wiring check', 'Fan installation', 'Breaker repair', 'UPS installation', 'Light fitting'],
+}
+DESCRIPTIONS = [
+    'Experienced team with all tools and materials included.',
+    'Same-day visits across the city, satisfaction guaranteed.',
+    'Certified technician; parts billed separately at cost.',
+    'Careful work, clean-up afterwards and a 30-day warranty.',
+]
+COMMENTS = ['Great work', 'On time and tidy', 'Okay', 'Could be better', 'Very professional', '']
+RATING_WEIGHTS = [(1, 5), (2, 5), (3, 15), (4, 35), (5, 40)]
+DURATIONS = [30, 45, 60, 90, 120]
+SLOTS = [time(hour, minute) for hour in range(9, 18) for minute in (0, 30)]
+
+
+def _chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def _jitter(rng, lat, lng, spread=0.15):
+    return round(lat + rng.uniform(-spread, spread), 6), round(lng + rng.uniform(-spread, spread), 6)
+
+
+def _users(prefix, count, role, batch_size):
+    User = get_user_model()
+    ids = []
+    for start, size in _chunks(count, batch_size):
+        users = [
+            User(
+                username=f'{UID_PREFIX}{prefix}{i}',
+                email=f'{prefix}{i}@perf.example.com',
+                firebase_uid=f'{UID_PREFIX}{prefix}{i}',
+                role=role,
+                password='!',
+            )
+            for i in range(start, start + size)
+        ]
+        ids.extend(user.pk for user in User.objects.bulk_create(users))
+    return ids
+
+
+def seed(providers=10_000, services=100_000, customers=50_000, bookings=1_000_000,
+         feedback_ratio=0.3, seed=42, batch_size=5_000, log=None):
+    """Write the data set and return the row counts."""
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    today = timezone.localdate()
+    ratings, weights = zip(*RATING_WEIGHTS)
+
+    with transaction.atomic():
+        provider_user_ids = _users('p', providers, 'provider', batch_size)
+        customer_ids = _users('c', customers, 'customer', batch_size)
+        log(f'{len(provider_user_ids) + len(customer_ids):,} users')
+
+        provider_points = []
+        for start, size in _chunks(providers, batch_size):
+            rows = []
+            for i in range(start, start + size):
+                city, lat, lng = CITIES[i % len(CITIES)]
+                lat, lng = _jitter(rng, lat, lng)
+                rows.append(ServiceProvider(
+                    user_id=provider_user_ids[i],
+                    full_name=f'Provider {i}',
+                    email=f'p{i}@perf.example.com',
+                    phone=f'03{i:09d}'[:11],
+                    bio='Serving customers since 2015.',
+                    location=city,
+                    latitude=lat,
+                    longitude=lng,
+                    geohash=geo.point_hash(lat, lng),
+                ))
+            for provider in ServiceProvider.objects.bulk_create(rows):
+                provider_points.append((provider.pk, provider.latitude, provider.longitude))
+        log(f'{len(provider_points):,} providers')
+
+        service_points = []
+        for start, size in _chunks(services, batch_size):
+            rows = []
+            for i in range(start, start + size):
+                provider_id, lat, lng = provider_points[i % len(provider_points)]
+                category = ALLOWED_SERVICES[rng.randrange(len(ALLOWED_SERVICES))]
+                rows.append(Service(
+                    provider_id=provider_id,
+                    name=rng.choice(SERVICE_NAMES[category]),
+                    category=category,
+                    description=rng.choice(DESCRIPTIONS),
+                    price=f'{rng.randrange(500, 15000, 50)}.00',
+                    duration_minutes=rng.choice(DURATIONS),
+                    thumbnail='service_thumbnails/perf.jpg',
+                ))
+            created = Service.objects.bulk_create(rows)
+            search.index_services(created)
+            service_points.extend((service.pk, lat, lng) for service in created)
+        log(f'{len(service_points):,} services')
+
+        booking_total = feedback_total = 0
+        for start, size in _chunks(bookings, batch_size):
+            rows = []
+            for _ in range(size):
+                service_id, lat, lng = service_points[rng.randrange(len(service_points))]
+                day = today + timedelta(days=rng.randint(-180, 30))
+                if day >= today:
+                    status = 'booked'
+                else:
+                    status = 'cancelled' if rng.random() < 0.1 else 'completed'
+                lat, lng = _jitter(rng, lat, lng, spread=0.05)
+                rows.append(Booking(
+                    user_id=customer_ids[rng.randrange(len(customer_ids))],
+                    service_id=service_id,
+                    date=day,
+                    time=rng.choice(SLOTS),
+                    name='Perf Customer',
+                    contact='03001234567',
+                    description='',
+                    location='Home',
+                    latitude=lat,
+                    longitude=lng,
+                    geohash=geo.point_hash(lat, lng),
+                    status=status,
+                ))
+            created = Booking.objects.bulk_create(rows)
+            feedback = [
+                Feedback(
+                    booking_id=booking.pk,
+                    rating=rng.choices(ratings, weights)[0],
+                    comment=rng.choice(COMMENTS),
+                )
+                for booking in created
+                if booking.status == 'completed' and rng.random() < feedback_ratio
+            ]
+            Feedback.objects.bulk_create(feedback)
+            booking_total += len(created)
+            feedback_total += len(feedback)
+            log(f'{booking_total:,} bookings, {feedback_total:,} feedback')
+
+        reconcile_ratings()
+        rebuild_one_star_counters()
+        analytics.compact()
+    # After the commit: the rebuild writes the index in a transaction of its own.
+    similarity.rebuild()
+    cache.invalidate_services()
+
+    return {
+        'providers': len(provider_points),
+        'services': len(service_points),
+        'customers': len(customer_ids),
+        'bookings': booking_total,
+        'feedback': feedback_total,
+    }
+
+
+def flush():
+    """Delete every seeded row (the perf users and everything hanging off them)."""
+    User = get_user_model()
+    with transaction.atomic():
+        deleted, _ = User.objects.filter(firebase_uid__startswith=UID_PREFIX).delete()
+    cache.invalidate_services()
+    return deleted
@@ -0,0 +1,119 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from Booking.models import Booking, Feedback
+from services import search
+from services.models import Service, ServiceProvider
+from . import benchmarks, seed
+from .management.commands.explain_hot_queries import problems, shape
+
+
+class SeedTests(TestCase):
+    def test_seeds_consistent_derived_data(self):
+        counts = seed.seed(providers=4, services=20, customers=5, bookings=200, batch_size=64)
+        self.assertEqual(counts['bookings'], Booking.objects.count())
+        self.assertEqual(counts['feedback'], Feedback.objects.count())
+        self.assertFalse(ServiceProvider.objects.filter(geohash='').exists())
+        self.assertFalse(Booking.objects.filter(geohash='').exists())
+        matches = Service.objects.filter(Q(name__icontains='clean') | Q(description__icontains='clean'))
+        page, ranked, scale = search.ranked_matches('clean', Service.objects.all(), 0, 1000)
+        self.assertEqual(scale, 1)
+        self.assertEqual(set(page), set(matches.values_list('id', flat=True)))
+        self.assertEqual({row[0] for row in ranked}, set(page))
+        rated = Service.objects.filter(rating_count__gt=0)
+        self.assertEqual(sum(s.rating_count for s in rated), counts['feedback'])
+
+        self.assertGreater(seed.flush(), 0)
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(ServiceProvider.objects.exists())
+
+
+class BenchmarkSuiteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed.seed(providers=3, services=12, customers=4, bookings=60, batch_size=50)
+
+    def test_runs_every_scenario_and_rolls_back(self):
+        before = (Service.objects.count(), Booking.objects.count())
+        results = benchmarks.run(iterations=2, warmup=1)
+        self.assertEqual(set(results['scenarios']), {item.name for item in benchmarks.SCENARIOS})
+        for result in results['scenarios'].values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual((Service.objects.count(), Booking.objects.count()), before)
+
+    def test_compare_flags_regressions(self):
+        results = benchmarks.run(iterations=2, warmup=1, names=['provider-bookings'])
+        current = results['scenarios']['provider-bookings']
+        self.assertEqual(benchmarks.compare(results, results), [])
+
+        baseline = {'scenarios': {'provider-bookings': dict(current, queries=current['queries'] - 1, p50_ms=0.0)}}
+        regressions = benchmarks.compare(results, baseline, latency_slack_ms=0)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('queries', regressions[0])
+
+    def test_query_counts_exclude_request_setup(self):
+        results = benchmarks.run(iterations=1, warmup=0, names=['cancel-booking'])
+        with benchmarks.session() as (client, ctx):
+            request = benchmarks.select(['cancel-booking'])[0].build(ctx, 0)
+            with CaptureQueriesContext(connection) as captured:
+                benchmarks.send(client, request)
+        self.assertEqual(results['scenarios']['cancel-booking']['queries'], len(captured))
+
+    def test_startup_is_timed_in_a_fresh_interpreter(self):
+        result = benchmarks.startup(runs=1)
+        self.assertGreater(result['wall_ms'], result['import_ms'] / 2)
+        self.assertIn('django.urls', result['slowest_imports'])
+        self.assertNotIn('firebase_admin', result['slowest_imports'])
+
+        slower = {'scenarios': {}, 'startup': dict(result, import_ms=result['import_ms'] * 3)}
+        regressions = benchmarks.compare(slower, {'scenarios': {}, 'startup': result})
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('startup: import', regressions[0])
+
+    def test_bulk_throughput_rolls_back(self):
+        before = Booking.objects.count()
+        result = benchmarks.bulk_throughput(batch=5, rounds=1)
+        self.assertEqual(result['batch'], 5)
+        self.assertGreater(result['ratio'], 0)
+        self.assertEqual(Booking.objects.count(), before)
+
+        worse = {'scenarios': {}, 'bulk_throughput': dict(result, ratio=result['ratio'] / 3)}
+        self.assertEqual(len(benchmarks.compare(worse, {'scenarios': {}, 'bulk_throughput': result})), 1)
+
+    def test_unknown_scenario(self):
+        with self.assertRaises(benchmarks.BenchmarkError):
+            benchmarks.run(names=['nope'])
+
+
+class ExplainHotQueriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed.seed(providers=3, services=12, customers=4, bookings=60, batch_size=50)
+
+    def explain(self, *scenarios):
+        out = StringIO()
+        args = [arg for name in scenarios for arg in ('--scenario', name)]
+        call_command('explain_hot_queries', *args, stdout=out)
+        return out.getvalue()
+
+    def test_hot_lists_use_their_indexes(self):
+        output = self.explain('user-bookings', 'list-all-services:uncached', 'service-availability')
+        self.assertIn('USING INDEX booking_user_created_idx', output)
+        self.assertIn('USING INDEX service_rating_idx', output)
+        self.assertIn('USING COVERING INDEX booking_service_status_idx', output)
+        self.assertIn('Every statement is served by an index.', output)
+
+    def test_flags_sorts_and_unbounded_scans(self):
+        self.assertEqual(problems('SELECT 1 FROM t ORDER BY x', ['SCAN t', 'USE TEMP B-TREE FOR ORDER BY']),
+                         ['SCAN t', 'USE TEMP B-TREE FOR ORDER BY'])
+        self.assertEqual(problems('SELECT 1 FROM t ORDER BY id LIMIT 21', ['SCAN t']), [])
+        self.assertEqual(problems('SELECT 1 FROM t', ['SCAN t USING COVERING INDEX t_idx']), [])
+
+    def test_groups_repeated_statements(self):
+        self.assertEqual(shape("SELECT * FROM t WHERE id = 12 AND name = 'x'"), shape("SELECT * FROM t WHERE id = 7 AND name = 'y'"))
+        self.assertEqual(shape('SELECT * FROM t WHERE id IN (1, 2, 3)'), 'SELECT * FROM t WHERE id IN (?, ...)')
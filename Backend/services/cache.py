@@ -0,0 +1,188 @@
+"""
+Versioned response cache for the public catalogue endpoints.
+
+Rendered JSON is cached under keys that embed a version counter: one for the
+whole catalogue (list pages) and one per service (detail pages). Signals bump
+the counters whenever a Service, its gallery or its provider changes (after
+the write commits), so stale entries are never read again and simply age out. Each entry carries a strong
+ETag so clients revalidating with If-None-Match get a bodiless 304.
+
+The cache alias is ``SERVICES_CACHE_ALIAS`` (default ``'default'``), so any
+Django cache backend works: local memory per process, or a shared backend
+such as Redis or Memcached across workers.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+CATALOGUE_VERSION_KEY = 'services:catalogue:version'
+
+
+def get_cache():
+    return caches[getattr(settings, 'SERVICES_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'SERVICES_CACHE_TIMEOUT', 3600)
+
+
+def _service_version_key(pk):
+    return f'services:service:{pk}:version'
+
+
+def _get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock rather than 1 so a counter that was evicted
+        # can't restart at a value that older cached entries were built with.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def _acache(cache, method, *args, **kwargs):
+    # The base a* methods hop to the sync thread. Local memory is a dict
+    # behind a lock, so it is called on the event loop instead.
+    if isinstance(cache, LocMemCache):
+        return getattr(cache, method)(*args, **kwargs)
+    return await getattr(cache, f'a{method}')(*args, **kwargs)
+
+
+async def _aget_version(key):
+    cache = get_cache()
+    version = await _acache(cache, 'get', key)
+    if version is None:
+        await _acache(cache, 'add', key, time.time_ns(), timeout=None)
+        version = await _acache(cache, 'get', key)
+    return version
+
+
+def _bump(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def catalogue_version():
+    return _get_version(CATALOGUE_VERSION_KEY)
+
+
+def service_version(pk):
+    return _get_version(_service_version_key(pk))
+
+
+async def acatalogue_version():
+    return await _aget_version(CATALOGUE_VERSION_KEY)
+
+
+async def aservice_version(pk):
+    return await _aget_version(_service_version_key(pk))
+
+
+def invalidate_services(pks=()):
+    """Drop cached list pages and the detail pages of ``pks``."""
+    _bump(CATALOGUE_VERSION_KEY)
+    for pk in pks:
+        _bump(_service_version_key(pk))
+
+
+def invalidate_services_on_commit(pks=(), using=None):
+    """
+    ``invalidate_services`` once the current transaction on ``using`` commits
+    (at once outside one). Bumping earlier would let a concurrent read cache
+    the pre-commit rows under the new version, where nothing evicts them.
+    """
+    pks = list(pks)
+    transaction.on_commit(lambda: invalidate_services(pks), using=using)
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:32]
+
+
+def _list_key(request, version):
+    # Host and scheme are part of the key because the body holds absolute
+    # media URLs and next links; the query string covers category and cursor.
+    query = sorted(request.GET.lists())
+    return f'services:list:{version}:{_digest(repr((request.build_absolute_uri("/"), request.path, query)))}'
+
+
+def _detail_key(request, pk, version):
+    return f'services:detail:{pk}:{version}:{_digest(request.build_absolute_uri("/"))}'
+
+
+def list_cache_key(request):
+    return _list_key(request, catalogue_version())
+
+
+def detail_cache_key(request, pk):
+    return _detail_key(request, pk, service_version(pk))
+
+
+async def alist_cache_key(request):
+    return _list_key(request, await acatalogue_version())
+
+
+async def adetail_cache_key(request, pk):
+    return _detail_key(request, pk, await aservice_version(pk))
+
+
+def _make_entry(response):
+    content = JSONRenderer().render(response.data)
+    return ('"%s"' % hashlib.sha256(content).hexdigest()[:40], content)
+
+
+def cached_response(request, key, render):
+    """
+    Serve ``key`` from the cache, calling ``render()`` (a DRF view response)
+    on a miss. Only 200 responses are cached.
+    """
+    cache = get_cache()
+    entry = cache.get(key)
+    if entry is None:
+        response = render()
+        if response.status_code != 200:
+            return response
+        entry = _make_entry(response)
+        cache.set(key, entry, _timeout())
+    return _entry_response(request, entry)
+
+
+async def acached_response(request, key, render):
+    """``cached_response`` for async views; ``render`` is a coroutine function."""
+    cache = get_cache()
+    entry = await _acache(cache, 'get', key)
+    if entry is None:
+        response = await render()
+        if response.status_code != 200:
+            return response
+        entry = _make_entry(response)
+        await _acache(cache, 'set', key, entry, _timeout())
+    return _entry_response(request, entry)
+
+
+def _entry_response(request, entry):
+    etag, content = entry
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        candidates = parse_etags(if_none_match)
+        if '*' in candidates or etag in candidates:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+    response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    # Clients may keep the body but must revalidate before reusing it.
+    response['Cache-Control'] = 'public, no-cache'
+    return response
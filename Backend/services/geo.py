@@ -0,0 +1,161 @@
+"""
+Geohash cell index helpers.
+
+Points are stored with a geohash column under a plain B-tree index. A radius
+query picks the geohash precision whose cells are at least as large as the
+radius, pre-filters on the 3x3 block of cells around the centre with prefix
+range scans, then refines the candidates with the exact haversine distance.
+"""
+import math
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_LENGTH = 12
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+DEFAULT_RADIUS_KM = 10.0
+MAX_RADIUS_KM = 100.0
+
+
+def encode(latitude, longitude, precision=GEOHASH_LENGTH):
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lng_lo = mid
+            else:
+                value <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def point_hash(latitude, longitude):
+    """Full-precision geohash for a possibly missing point ('' if missing)."""
+    if latitude is None or longitude is None:
+        return ''
+    return encode(latitude, longitude)
+
+
+def cell_size(precision):
+    """(lat_degrees, lng_degrees) spanned by a cell of the given precision."""
+    lng_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def precision_for_radius(latitude, radius_km):
+    """Longest geohash precision whose cells are no smaller than the radius."""
+    # Cells get narrower towards the poles, so size them for the circle's
+    # most poleward latitude rather than its centre.
+    extreme = min(90.0, abs(latitude) + radius_km / KM_PER_DEGREE)
+    shrink = max(math.cos(math.radians(extreme)), 1e-6)
+    for precision in range(GEOHASH_LENGTH, 0, -1):
+        lat_span, lng_span = cell_size(precision)
+        if min(lat_span * KM_PER_DEGREE, lng_span * KM_PER_DEGREE * shrink) >= radius_km:
+            return precision
+    return 0
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose union contains the circle, or ``None`` when the
+    radius is so large that no pre-filter would help.
+    """
+    precision = precision_for_radius(latitude, radius_km)
+    if precision == 0:
+        return None
+    lat_span, lng_span = cell_size(precision)
+    cells = set()
+    for dlat in (-lat_span, 0.0, lat_span):
+        lat = latitude + dlat
+        if not -90.0 <= lat <= 90.0:
+            continue
+        for dlng in (-lng_span, 0.0, lng_span):
+            lng = (longitude + dlng + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lng, precision))
+    return sorted(cells)
+
+
+def prefix_range_q(field, prefix):
+    # A half-open range is always an index range scan, unlike LIKE 'x%'
+    # which SQLite only optimises under specific collation settings.
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '~'})
+
+
+def cells_q(field, cells):
+    return reduce(or_, (prefix_range_q(field, cell) for cell in cells))
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def within_radius(queryset, latitude, longitude, radius_km, field='geohash'):
+    """
+    Objects of ``queryset`` within ``radius_km`` of the point, nearest first
+    (then by pk). Each object gets a ``distance_km`` attribute.
+    """
+    cells = covering_cells(latitude, longitude, radius_km)
+    queryset = queryset.exclude(latitude=None).exclude(longitude=None)
+    if cells is not None:
+        queryset = queryset.filter(cells_q(field, cells))
+    results = []
+    for obj in queryset:
+        distance = haversine_km(latitude, longitude, obj.latitude, obj.longitude)
+        if distance <= radius_km:
+            obj.distance_km = round(distance, 3)
+            results.append(obj)
+    results.sort(key=lambda obj: (obj.distance_km, obj.pk))
+    return results
+
+
+def parse_point_query(params, default_point=None):
+    """
+    Read ``lat``, ``lng`` and ``radius_km`` from query params. ``default_point``
+    is used when the caller omits the coordinates.
+    """
+    try:
+        if 'lat' in params or 'lng' in params:
+            latitude, longitude = float(params['lat']), float(params['lng'])
+        elif default_point is not None and None not in default_point:
+            latitude, longitude = default_point
+        else:
+            raise ValidationError("lat and lng are required.")
+        radius_km = float(params.get('radius_km', DEFAULT_RADIUS_KM))
+    except (KeyError, ValueError):
+        raise ValidationError("lat, lng and radius_km must be numbers.")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValidationError("lat/lng out of range.")
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValidationError(f"radius_km must be between 0 and {MAX_RADIUS_KM:g}.")
+    return latitude, longitude, radius_km
@@ -0,0 +1,169 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import posixpath
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Longest-edge sizes produced for every uploaded image.
+VARIANT_SIZES = (128, 512, 1024)
+VARIANT_FORMAT = 'WEBP'
+VARIANT_EXTENSION = 'webp'
+VARIANT_QUALITY = 80
+VARIANT_DIR = 'derivatives'
+# Keys of a variants dict that aren't sizes.
+METADATA_KEYS = ('source', 'digests')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def normalize_orientation(field_file):
+    """
+    Rotate an uploaded image according to its EXIF orientation tag and
+    rewrite it in place. Phone cameras store pictures sideways and rely on the
+    tag, which browsers ignore in some contexts. Returns True if rewritten.
+    """
+    if not field_file or not field_file.storage.exists(field_file.name):
+        return False
+    storage = field_file.storage
+    with storage.open(field_file.name, 'rb') as fh:
+        image = Image.open(fh)
+        image.load()
+    if image.getexif().get(0x0112, 1) == 1:
+        return False
+    fmt = image.format
+    rotated = ImageOps.exif_transpose(image)
+    with storage.open(field_file.name, 'wb') as fh:
+        rotated.save(fh, format=fmt)
+    return True
+
+
+def render_variants(data, sizes=VARIANT_SIZES):
+    """
+    Encode downscaled copies of the image in ``data``. Returns
+    ``{size: bytes}``; sizes at or above the original are skipped rather
+    than upscaled. Pure bytes in/out so it can run in a worker process.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        longest = max(image.size)
+        variants = {}
+        for size in sizes:
+            if size >= longest:
+                continue
+            copy = image.copy()
+            copy.thumbnail((size, size), Image.Resampling.LANCZOS)
+            out = io.BytesIO()
+            copy.save(out, format=VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+            variants[size] = out.getvalue()
+    return variants
+
+
+def variant_name(name, size):
+    # The original's extension stays in the name: foo.jpg and foo.png must
+    # not share (and overwrite) each other's derivatives.
+    return posixpath.join(VARIANT_DIR, f'{name}_{size}.{VARIANT_EXTENSION}')
+
+
+def content_digest(data):
+    """Short content hash used to version media URLs (services/media.py)."""
+    return hashlib.md5(data, usedforsecurity=False).hexdigest()[:12]
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', None) or os.cpu_count() or 1
+            # Not fork: the job worker is threaded, and a forked encoder would
+            # inherit whatever locks the other threads held at that moment.
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _render_in_pool(payloads):
+    """``render_variants`` for each payload in the pool, on a fresh pool once if it broke."""
+    for attempt in range(2):
+        pool = _get_pool()
+        try:
+            return list(pool.map(render_variants, payloads))
+        except BrokenProcessPool:
+            # An encoder died (crash, OOM kill): the pool refuses all work
+            # from now on, so replace it.
+            _discard_pool(pool)
+            if attempt:
+                raise
+
+
+def generate_variants(field_files):
+    """
+    Build derivatives for each file and store them next to the originals
+    under ``derivatives/``. Several files are encoded in parallel in a process
+    pool. Returns one variants dict per input, in order, shaped like
+    ``{'source': original name, '128': name, ..., 'digests': {name: digest}}``
+    with a digest for the original and each derivative, or ``{}`` for files
+    that are missing.
+    """
+    sources = []
+    for field_file in field_files:
+        if field_file and field_file.storage.exists(field_file.name):
+            with field_file.storage.open(field_file.name, 'rb') as fh:
+                sources.append((field_file, fh.read()))
+        else:
+            sources.append((field_file, None))
+
+    payloads = [data for _, data in sources if data is not None]
+    if len(payloads) > 1:
+        rendered = iter(_render_in_pool(payloads))
+    else:
+        rendered = iter([render_variants(data) for data in payloads])
+
+    results = []
+    for field_file, data in sources:
+        if data is None:
+            results.append({})
+            continue
+        storage = field_file.storage
+        variants = {'source': field_file.name}
+        digests = {field_file.name: content_digest(data)}
+        for size, content in next(rendered).items():
+            name = variant_name(field_file.name, size)
+            if storage.exists(name):
+                storage.delete(name)
+            variants[str(size)] = storage.save(name, ContentFile(content))
+            digests[variants[str(size)]] = content_digest(content)
+        variants['digests'] = digests
+        results.append(variants)
+    return results
+
+
+def variant_names(field_file, variants):
+    """Stored ``{size: name}`` for ``field_file``, ignoring stale entries."""
+    if not field_file or not variants or variants.get('source') != field_file.name:
+        return {}
+    return {size: name for size, name in variants.items() if size not in METADATA_KEYS}
+
+
+def variant_digests(field_file, variants):
+    """Stored ``{name: digest}`` for ``field_file`` and its derivatives."""
+    if not field_file or not variants or variants.get('source') != field_file.name:
+        return {}
+    return variants.get('digests', {})
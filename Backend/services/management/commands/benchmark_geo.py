@@ -0,0 +1,75 @@
+import bisect
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from services import geo
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark geohash-cell radius queries against a full haversine scan "
+        "over a synthetic point set. The sorted geohash list stands in for the "
+        "B-tree index: each covering cell is a bisect range scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--radius-km', type=float, default=5.0)
+        parser.add_argument('--seed', type=int, default=42)
+        # Roughly Pakistan; dense enough that a city-sized radius has hits.
+        parser.add_argument('--bbox', type=float, nargs=4, default=[24.0, 61.0, 37.0, 77.0],
+                            metavar=('MIN_LAT', 'MIN_LNG', 'MAX_LAT', 'MAX_LNG'))
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        min_lat, min_lng, max_lat, max_lng = options['bbox']
+        radius_km = options['radius_km']
+
+        started = time.perf_counter()
+        points = [
+            (rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng))
+            for _ in range(options['points'])
+        ]
+        index = sorted((geo.encode(lat, lng), lat, lng) for lat, lng in points)
+        keys = [row[0] for row in index]
+        self.stdout.write(f"Built index of {len(index):,} points in {time.perf_counter() - started:.1f}s")
+
+        centres = [
+            (rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng))
+            for _ in range(options['queries'])
+        ]
+
+        indexed_time = 0.0
+        candidates = 0
+        indexed_hits = []
+        for lat, lng in centres:
+            t0 = time.perf_counter()
+            hits = 0
+            for cell in geo.covering_cells(lat, lng, radius_km) or ['']:
+                lo = bisect.bisect_left(keys, cell)
+                hi = bisect.bisect_left(keys, cell + '~')
+                candidates += hi - lo
+                for _, plat, plng in index[lo:hi]:
+                    if geo.haversine_km(lat, lng, plat, plng) <= radius_km:
+                        hits += 1
+            indexed_time += time.perf_counter() - t0
+            indexed_hits.append(hits)
+
+        scan_queries = min(len(centres), 5)
+        scan_time = 0.0
+        for (lat, lng), expected in zip(centres[:scan_queries], indexed_hits):
+            t0 = time.perf_counter()
+            hits = sum(1 for plat, plng in points if geo.haversine_km(lat, lng, plat, plng) <= radius_km)
+            scan_time += time.perf_counter() - t0
+            if hits != expected:
+                self.stderr.write(self.style.ERROR(f"Mismatch at ({lat:.4f}, {lng:.4f}): {hits} != {expected}"))
+
+        queries = len(centres)
+        self.stdout.write(
+            f"cell index: {indexed_time / queries * 1000:.3f} ms/query, "
+            f"{candidates / queries:,.0f} candidates, {sum(indexed_hits) / queries:,.1f} hits"
+        )
+        self.stdout.write(f"full scan:  {scan_time / scan_queries * 1000:.3f} ms/query ({scan_queries} queries)")
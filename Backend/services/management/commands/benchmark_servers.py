@@ -0,0 +1,184 @@
+import asyncio
+import io
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+DEFAULT_PATHS = ['/api/services/', '/api/services/?ordering=price']
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Held:
+    """Connections the server is holding open right now, and the most at once."""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.current -= 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/sec of the WSGI and ASGI applications in-process. "
+        "WSGI requests run on a fixed thread pool, as in a threaded worker; "
+        "ASGI requests run as tasks on one event loop. --client-delay-ms holds "
+        "each connection open that long before the request arrives, standing "
+        "in for slow clients: a WSGI thread is blocked for it, an ASGI task "
+        "just awaits. Each run reports how many connections the server held "
+        "open at once and its requests/sec. Run against a seeded database, "
+        "e.g. --concurrency 5000 --client-delay-ms 1000 for thousands of slow "
+        "clients."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=200,
+                            help='Open connections at once.')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='WSGI worker threads.')
+        parser.add_argument('--client-delay-ms', type=float, default=0.0)
+        parser.add_argument('--path', action='append', dest='paths',
+                            help=f'Path to request (repeatable). Default: {" ".join(DEFAULT_PATHS)}')
+        parser.add_argument('--token', help='Firebase ID token sent as a Bearer header.')
+        parser.add_argument('--server', action='append', dest='servers', choices=['wsgi', 'asgi'],
+                            help='Only run this server (repeatable); WSGI is slow with a long client delay.')
+
+    def handle(self, *args, **options):
+        from Backend.asgi import application as asgi_app
+        from Backend.wsgi import application as wsgi_app
+
+        paths = options['paths'] or DEFAULT_PATHS
+        targets = [paths[i % len(paths)] for i in range(options['requests'])]
+        headers = []
+        if options['token']:
+            headers.append((b'authorization', f"Bearer {options['token']}".encode()))
+        delay = options['client_delay_ms'] / 1000
+
+        # Warm up caches and connections so neither run pays for them.
+        for path in paths:
+            self._wsgi_request(wsgi_app, path, headers, 0)
+        asyncio.run(self._asgi_run(asgi_app, paths, headers, 0, len(paths)))
+
+        runs = {
+            'wsgi': lambda held: self._wsgi_run(wsgi_app, targets, headers, delay, options['threads'], held),
+            'asgi': lambda held: asyncio.run(
+                self._asgi_run(asgi_app, targets, headers, delay, options['concurrency'], held)
+            ),
+        }
+        for label in options['servers'] or runs:
+            held = Held()
+            started = time.perf_counter()
+            results = runs[label](held)
+            elapsed = time.perf_counter() - started
+            latencies = [latency for _, latency in results]
+            errors = sum(1 for status, _ in results if status >= 400)
+            self.stdout.write(
+                f"{label}: {held.peak:,} connections held at once, "
+                f"{len(results) / elapsed:,.0f} req/s, "
+                f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+                f"p99 {_percentile(latencies, 99) * 1000:.1f} ms, "
+                f"{errors} errors"
+            )
+
+    def _wsgi_run(self, app, targets, headers, delay, threads, held):
+        # Connections beyond the pool wait in the listen backlog, unserved.
+        queued_at = time.perf_counter()
+
+        def request(path):
+            with held:
+                return self._wsgi_request(app, path, headers, delay, queued_at)
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            return list(pool.map(request, targets))
+
+    def _wsgi_request(self, app, path, headers, delay, queued_at=None):
+        queued_at = queued_at or time.perf_counter()
+        time.sleep(delay)
+        url = urlsplit(path)
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': io.StringIO(),
+        }
+        for name, value in headers:
+            environ['HTTP_' + name.decode().upper().replace('-', '_')] = value.decode()
+        status = []
+        body = app(environ, lambda s, h, exc_info=None: status.append(int(s.split()[0])))
+        try:
+            for _ in body:
+                pass
+        finally:
+            body.close()
+            close_old_connections()
+        return status[0], time.perf_counter() - queued_at
+
+    async def _asgi_run(self, app, targets, headers, delay, concurrency, held=None):
+        queued_at = time.perf_counter()
+        semaphore = asyncio.Semaphore(concurrency)
+        held = held or Held()
+
+        async def request(path):
+            async with semaphore:
+                with held:
+                    return await self._asgi_request(app, path, headers, delay, queued_at)
+
+        return await asyncio.gather(*(request(path) for path in targets))
+
+    async def _asgi_request(self, app, path, headers, delay, queued_at):
+        url = urlsplit(path)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': url.path,
+            'raw_path': url.path.encode(),
+            'query_string': url.query.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'localhost')] + headers,
+            'server': ('localhost', 80),
+            'client': ('127.0.0.1', 0),
+        }
+        status = []
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                await asyncio.sleep(delay)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Nothing more arrives; wait like a client keeping the socket open.
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await app(scope, receive, send)
+        return status[0], time.perf_counter() - queued_at
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from services.similarity import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the similar-services index from every service and booking. "
+        "Service changes update it as they happen; run this nightly so "
+        "co-booking scores follow new bookings."
+    )
+
+    def handle(self, *args, **options):
+        services = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed the most similar services of {services} services."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from services.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = "Rebuild rating aggregates on services and providers from all feedback."
+
+    def handle(self, *args, **options):
+        services, providers = reconcile_ratings()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {services} rated services and {providers} rated providers."))
@@ -0,0 +1,46 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the replica file with SQLite's "
+        "online backup, standing in for replication when running with two "
+        "local SQLite files (DATABASE_REPLICA_PATH). --every keeps copying, "
+        "which gives the replica a realistic lag."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, metavar='SECONDS',
+                            help='Keep syncing at this interval until interrupted.')
+
+    def handle(self, *args, **options):
+        alias = getattr(settings, 'DATABASE_REPLICA', None)
+        if not alias:
+            raise CommandError("No replica configured; set DATABASE_REPLICA_PATH.")
+        source, target = connections['default'].settings_dict, connections[alias].settings_dict
+        for settings_dict in (source, target):
+            if settings_dict['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError("sync_replica only copies SQLite databases; use the server's replication.")
+
+        while True:
+            started = time.perf_counter()
+            self.sync(str(source['NAME']), str(target['NAME']))
+            self.stdout.write(f"Synced {source['NAME']} -> {target['NAME']} in {time.perf_counter() - started:.2f}s")
+            if not options['every']:
+                return
+            time.sleep(options['every'])
+
+    def sync(self, source_path, target_path):
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target)
+            target.execute('PRAGMA journal_mode=WAL')
+        finally:
+            target.close()
+            source.close()
@@ -0,0 +1,77 @@
+"""
+Absolute URLs for uploaded media.
+
+Every image in a list response used to go through
+``request.build_absolute_uri``, which re-splits and re-quotes the URL each
+time. The builder works out the ``scheme://host`` prefix once per request
+(or uses ``MEDIA_CDN_ORIGIN`` for every request) and joins it onto the
+storage URL. With ``MEDIA_URL_VERSIONING`` it appends ``?v=<digest>`` from
+the content digests recorded when derivatives are generated
+(services/images.py), so a CDN can cache files that get rewritten under the
+same name. Without a request or CDN origin, URLs stay relative, as
+``FieldFile.url`` is.
+
+``MEDIA_URL_BUILDER`` names the builder class, for storages or CDNs that
+sign or rewrite URLs.
+"""
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .images import variant_digests
+
+_builder = None
+
+
+class MediaURLBuilder:
+    def __init__(self):
+        origin = getattr(settings, 'MEDIA_CDN_ORIGIN', None)
+        self.origin = origin.rstrip('/') if origin else None
+        self.versioning = getattr(settings, 'MEDIA_URL_VERSIONING', True)
+
+    def prefix(self, request):
+        """What a root-relative storage URL is joined onto."""
+        if self.origin:
+            return self.origin
+        if request is None:
+            return ''
+        request = getattr(request, '_request', request)
+        try:
+            return request._media_url_prefix
+        except AttributeError:
+            prefix = request._media_url_prefix = f'{request.scheme}://{request.get_host()}'
+            return prefix
+
+    def url(self, storage, name, request=None, digest=None):
+        url = storage.url(name)
+        if url.startswith('/') and not url.startswith('//'):
+            url = self.prefix(request) + url
+        if digest and self.versioning:
+            url = f"{url}{'&' if '?' in url else '?'}v={digest}"
+        return url
+
+
+def get_builder():
+    global _builder
+    if _builder is None:
+        _builder = import_string(getattr(settings, 'MEDIA_URL_BUILDER', 'services.media.MediaURLBuilder'))()
+    return _builder
+
+
+@receiver(setting_changed)
+def _reset_builder(setting, **kwargs):
+    global _builder
+    if setting.startswith('MEDIA_'):
+        _builder = None
+
+
+def media_url(field_file, request=None, variants=None):
+    """
+    URL for ``field_file``, or None if empty. ``variants`` is the model's
+    variants dict, which carries the file's digest once processed.
+    """
+    if not field_file:
+        return None
+    digest = variant_digests(field_file, variants).get(field_file.name)
+    return get_builder().url(field_file.storage, field_file.name, request, digest)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0007_catalogue_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarService',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_services', to='services.service')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='services.service')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('service', 'rank'), name='unique_similar_service_rank')],
+            },
+        ),
+    ]
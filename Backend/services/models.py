@@ -1,24 +1,72 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from . import geo
+
 ALLOWED_SERVICES = ['Cleaning', 'Repair', 'Painting', 'Shifting', 'Plumbing', 'Electric']
 
 User = get_user_model()
 
-class ServiceProvider(models.Model):
+
+class RatingAggregate(models.Model):
+    """
+    Denormalised feedback stats, bumped by services.ratings when feedback is
+    created and rebuilt by `manage.py reconcile_ratings`.
+    """
+    rating_avg = models.FloatField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+
+    RATING_FIELDS = (
+        'rating_avg', 'rating_count', 'rating_sum',
+        'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    )
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # A plain save() of a loaded row must not write back rating counters
+        # read before a concurrent feedback bumped them.
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.RATING_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def rating_histogram(self):
+        return {str(star): getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
+
+class ServiceProvider(RatingAggregate):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     full_name = models.CharField(max_length=100)
     email = models.EmailField()
     phone = models.CharField(max_length=15)
     bio = models.TextField(blank=True)
     location = models.CharField(max_length=255)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=geo.GEOHASH_LENGTH, blank=True, db_index=True, editable=False)
     profile_picture = models.ImageField(upload_to='provider_profiles/', null=True, blank=True)
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.geohash = geo.point_hash(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.full_name
 
 
-class Service(models.Model):
+class Service(RatingAggregate):
     provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='services')
     name = models.CharField(max_length=100)  # The name of the service (free text)
     category = models.CharField(max_length=50, choices=[(s, s) for s in ALLOWED_SERVICES] , default='Cleaning')  # From allowed types
@@ -26,11 +74,61 @@ class Service(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2)
     duration_minutes = models.IntegerField()
     thumbnail = models.ImageField(upload_to='service_thumbnails/')
+    thumbnail_variants = models.JSONField(default=dict, blank=True, editable=False)
     gallery_images = models.ManyToManyField('ServiceImage')
 
+    # What services.similarity compares services on.
+    SIMILARITY_FIELDS = ('name', 'category', 'description', 'price')
+
+    class Meta:
+        # One per catalogue ordering (CatalogueQueryMixin.orderings), with
+        # and without the category filter; descending price pages walk the
+        # price indexes backwards.
+        indexes = [
+            models.Index(fields=['-rating_avg', '-rating_count', '-id'], name='service_rating_idx'),
+            models.Index(fields=['price', 'id'], name='service_price_idx'),
+            models.Index(fields=['category', 'id'], name='service_category_idx'),
+            models.Index(fields=['category', '-rating_avg', '-rating_count', '-id'], name='service_category_rating_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='service_category_price_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the similar-services index (services/similarity.py) last saw,
+        # so a save that doesn't change it can skip the update.
+        instance._indexed_as = instance.similarity_state()
+        return instance
+
+    def similarity_state(self):
+        fields = self.__dict__
+        if any(name not in fields for name in self.SIMILARITY_FIELDS):
+            return None  # deferred
+        return tuple(fields[name] for name in self.SIMILARITY_FIELDS)
+
     def __str__(self):
         return f"{self.name} ({self.category}) by {self.provider.full_name}"
 
 
 class ServiceImage(models.Model):
     image = models.ImageField(upload_to='service_galleries/')
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+
+
+class SimilarService(models.Model):
+    """
+    One entry of a service's precomputed list of most similar services,
+    ranked from 0, maintained by services.similarity.
+    """
+    # Entries kept per service.
+    NEIGHBOURS = 10
+
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='similar_services')
+    similar = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'rank'], name='unique_similar_service_rank'),
+        ]
@@ -0,0 +1,94 @@
+from collections import defaultdict
+
+from django.db.models.fields.files import FieldFile
+
+from Backend.projection import Projection
+from .images import variant_digests
+from .media import media_url
+from .models import Service, ServiceImage, ServiceProvider
+from .serializers import ServiceSerializer, variant_urls
+
+RATING_COLUMNS = tuple(f'rating_{star}_count' for star in range(1, 6))
+
+
+class ServiceProjection(Projection):
+    """``ServiceSerializer`` output for catalogue and provider service lists."""
+    serializer_class = ServiceSerializer
+    columns = (
+        'id', 'name', 'category', 'description', 'price', 'duration_minutes',
+        'thumbnail', 'thumbnail_variants',
+        'provider__full_name', 'provider__profile_picture', 'provider__profile_picture_variants',
+        'provider__user__email', 'provider__phone', 'provider__bio',
+        'rating_avg', 'rating_count', *RATING_COLUMNS,
+    )
+
+    def gallery(self, rows):
+        return (
+            Service.gallery_images.through.objects
+            .filter(service_id__in=[row['id'] for row in rows])
+            .order_by('service_id', 'serviceimage_id')
+            .values_list('service_id', 'serviceimage_id', 'serviceimage__image', 'serviceimage__variants')
+        )
+
+    def represent(self, rows):
+        return self.build(rows, self.gallery(rows))
+
+    async def arepresent(self, rows):
+        return self.build(rows, [image async for image in self.gallery(rows)])
+
+    def build(self, rows, gallery):
+        request = self.request
+        thumbnail_field = Service._meta.get_field('thumbnail')
+        picture_field = ServiceProvider._meta.get_field('profile_picture')
+        image_field = ServiceImage._meta.get_field('image')
+        price = self.fields['price'].to_representation
+        histogram = self.fields['rating_histogram'].to_representation
+
+        def digest(field_file, variants):
+            return variant_digests(field_file, variants).get(field_file.name)
+
+        images = defaultdict(list)
+        for service_id, image_id, name, variants in gallery:
+            image = FieldFile(None, image_field, name)
+            images[service_id].append({
+                'id': image_id,
+                'image': media_url(image, request, variants),
+                'variants': variant_urls(image, variants, request),
+            })
+
+        # A provider's picture repeats on each of their services; URLs are
+        # built once per file name and digest.
+        thumbnail_urls, picture_urls = {}, {}
+        data = []
+        for row in rows:
+            thumbnail_file = FieldFile(None, thumbnail_field, row['thumbnail'])
+            thumbnail_key = (thumbnail_file.name, digest(thumbnail_file, row['thumbnail_variants']))
+            if thumbnail_key not in thumbnail_urls:
+                thumbnail_urls[thumbnail_key] = media_url(thumbnail_file, request, row['thumbnail_variants'])
+            picture = FieldFile(None, picture_field, row['provider__profile_picture'])
+            picture_key = (picture.name, digest(picture, row['provider__profile_picture_variants']))
+            if picture_key not in picture_urls:
+                picture_urls[picture_key] = media_url(picture, request, row['provider__profile_picture_variants'])
+            data.append({
+                'id': row['id'],
+                'name': row['name'],
+                'category': row['category'],
+                'description': row['description'],
+                'price': price(row['price']),
+                'duration_minutes': row['duration_minutes'],
+                'thumbnail': thumbnail_urls[thumbnail_key],
+                'thumbnail_variants': variant_urls(thumbnail_file, row['thumbnail_variants'], request),
+                'gallery_images': images.get(row['id'], []),
+                'provider_name': row['provider__full_name'],
+                'provider_image': picture_urls[picture_key],
+                'provider_image_variants': variant_urls(picture, row['provider__profile_picture_variants'], request),
+                'provider_email': row['provider__user__email'],
+                'provider_phone': row['provider__phone'],
+                'provider_bio': row['provider__bio'],
+                'rating_avg': row['rating_avg'],
+                'rating_count': row['rating_count'],
+                'rating_histogram': histogram({
+                    str(star): row[column] for star, column in enumerate(RATING_COLUMNS, start=1)
+                }),
+            })
+        return data
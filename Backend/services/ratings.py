@@ -0,0 +1,63 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast
+
+from .cache import invalidate_services_on_commit
+from .models import Service, ServiceProvider
+
+STARS = range(1, 6)
+COUNTER_FIELDS = list(Service.RATING_FIELDS)
+
+
+def _increment(model, pk, rating):
+    # One UPDATE; the right-hand sides see the pre-update row, so the new
+    # average is (sum + rating) / (count + 1) without a read.
+    model.objects.filter(pk=pk).update(
+        rating_avg=Cast(F('rating_sum') + rating, FloatField()) / (F('rating_count') + 1),
+        rating_count=F('rating_count') + 1,
+        rating_sum=F('rating_sum') + rating,
+        **{f'rating_{rating}_count': F(f'rating_{rating}_count') + 1},
+    )
+
+
+def record_rating(service_id, provider_id, rating):
+    if rating not in STARS:
+        return
+    with transaction.atomic():
+        _increment(Service, service_id, rating)
+        _increment(ServiceProvider, provider_id, rating)
+    invalidate_services_on_commit([service_id])
+
+
+def _rebuild(model, group_by):
+    Feedback = apps.get_model('Booking', 'Feedback')
+    rows = (
+        Feedback.objects.values(group_by)
+        .annotate(
+            total=Count('id'),
+            score=Sum('rating'),
+            **{f'stars_{star}': Count('id', filter=Q(rating=star)) for star in STARS},
+        )
+        .order_by()
+    )
+    objs = []
+    for row in rows:
+        obj = model(pk=row[group_by], rating_count=row['total'], rating_sum=row['score'] or 0)
+        obj.rating_avg = obj.rating_sum / obj.rating_count if obj.rating_count else 0
+        for star in STARS:
+            setattr(obj, f'rating_{star}_count', row[f'stars_{star}'])
+        objs.append(obj)
+
+    model.objects.update(**dict.fromkeys(COUNTER_FIELDS, 0))
+    model.objects.bulk_update(objs, COUNTER_FIELDS, batch_size=500)
+    return len(objs)
+
+
+@transaction.atomic
+def reconcile_ratings():
+    """Rebuild every service and provider aggregate from the Feedback table."""
+    services = _rebuild(Service, 'booking__service')
+    providers = _rebuild(ServiceProvider, 'booking__service__provider')
+    invalidate_services_on_commit()
+    return services, providers
@@ -0,0 +1,241 @@
+import json
+import re
+from bisect import bisect_right
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from . import cache
+from .models import ALLOWED_SERVICES, Service
+
+FTS_TABLE = 'services_service_fts'
+
+# Broad searches are ranked, counted and faceted over their newest
+# CANDIDATE_LIMIT matches only; counts are then scaled up by how much of
+# the id range those matches cover.
+CANDIDATE_LIMIT = 500
+
+# What facets are counted from: one row per service.
+FACET_COLUMNS = ('id', 'category', 'price', 'duration_minutes')
+
+# (label, lower bound inclusive, upper bound exclusive or None)
+PRICE_BUCKETS = [
+    ('0-1000', 0, 1000),
+    ('1000-2500', 1000, 2500),
+    ('2500-5000', 2500, 5000),
+    ('5000+', 5000, None),
+]
+DURATION_BUCKETS = [
+    ('0-30', 0, 30),
+    ('30-60', 30, 60),
+    ('60-120', 60, 120),
+    ('120+', 120, None),
+]
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_fts_available = None
+
+
+def fts_available():
+    """True when the FTS5 index table exists on the current database."""
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall(query.lower())
+
+
+def index_service(service):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [service.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+            [service.pk, service.name, service.description],
+        )
+
+
+def index_services(services):
+    if not fts_available():
+        return
+    rows = [(service.pk, service.name, service.description) for service in services]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)', rows)
+
+
+def remove_service(pk):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+
+def ranked_matches(query, queryset, offset, limit):
+    """
+    Services in ``queryset`` matching every token of ``query``, as ``(ids
+    of the offset/limit page best match first, FACET_COLUMNS rows of the
+    matches, scale)``, or None when ``query`` has no tokens. Filters on
+    ``queryset`` apply before ranking. Past ``CANDIDATE_LIMIT`` matches only
+    the newest ones are ranked and returned, and ``scale`` (otherwise 1)
+    estimates how many matches there are per returned row.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    if fts_available():
+        # Every token must match; the last one is treated as a prefix so
+        # results show up while the user is still typing.
+        match = ' '.join(f'"{t}"' for t in tokens[:-1])
+        match = f'{match} "{tokens[-1]}"*'.strip()
+        try:
+            return _fts_matches(match, queryset, offset, limit)
+        except DatabaseError:
+            pass
+    page, matches = _fallback_matches(tokens, queryset, offset, limit)
+    return (page, *sample(matches))
+
+
+def _fts_matches(match, queryset, offset, limit):
+    # One pass over the index scores the newest candidates; the filters and
+    # the facet columns then come from their rows by primary key.
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY rowid DESC LIMIT %s',
+            [match, CANDIDATE_LIMIT + 1],
+        )
+        scores = dict(cursor.fetchall())
+    scale = 1
+    if len(scores) > CANDIDATE_LIMIT:
+        scores.pop(min(scores))
+        scale = _scale(queryset.db, min(scores))
+
+    # One JSON parameter instead of a placeholder per id keeps the SQL short.
+    candidates = RawSQL('SELECT value FROM json_each(%s)', [json.dumps(list(scores))])
+    rows = list(queryset.filter(id__in=candidates).values_list(*FACET_COLUMNS)) if scores else []
+    ranked = sorted((scores[row[0]], row[0]) for row in rows)
+    return [pk for _, pk in ranked[offset:offset + limit]], rows, scale
+
+
+def _scale(using, lowest):
+    # Matches per sampled row, assuming matches are spread evenly over ids:
+    # the whole id range over the part of it from ``lowest`` up.
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT (SELECT MIN(id) FROM services_service), (SELECT MAX(id) FROM services_service)'
+        )
+        low, high = cursor.fetchone()
+    return (high - low + 1) / (high - lowest + 1)
+
+
+def sample(queryset):
+    """
+    ``(rows, scale)``: ``FACET_COLUMNS`` rows of the newest
+    ``CANDIDATE_LIMIT`` services in ``queryset``, with ``scale`` as in
+    ``ranked_matches``.
+    """
+    rows = list(queryset.order_by('-id').values_list(*FACET_COLUMNS)[:CANDIDATE_LIMIT + 1])
+    if len(rows) <= CANDIDATE_LIMIT:
+        return rows, 1
+    rows = rows[:CANDIDATE_LIMIT]
+    return rows, _scale(queryset.db, rows[-1][0])
+
+
+def _fallback_matches(tokens, queryset, offset, limit):
+    condition = Q()
+    score = Value(0)
+    for token in tokens:
+        condition &= Q(name__icontains=token) | Q(description__icontains=token)
+        score = score + Case(
+            When(name__icontains=token, then=Value(10)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    matches = queryset.filter(condition)
+    page = matches.annotate(score=score).order_by('-score', 'id').values_list('id', flat=True)
+    return list(page[offset:offset + limit]), matches
+
+
+def _bucket_lows(buckets):
+    return [low for _, low, _ in buckets]
+
+
+def facets(rows, scale=1):
+    """
+    Counts of ``rows`` (``FACET_COLUMNS`` tuples) per category, price bucket
+    and duration bucket, each multiplied by ``scale``.
+    """
+    # Buckets are contiguous, so a bisect on their lower bounds finds each
+    # value's bucket; values below the first one have none.
+    price_lows, duration_lows = _bucket_lows(PRICE_BUCKETS), _bucket_lows(DURATION_BUCKETS)
+    categories = dict.fromkeys(ALLOWED_SERVICES, 0)
+    price = [0] * len(PRICE_BUCKETS)
+    duration = [0] * len(DURATION_BUCKETS)
+    for _, category, amount, minutes in rows:
+        categories[category] = categories.get(category, 0) + 1
+        for counts, lows, value in ((price, price_lows, amount), (duration, duration_lows, minutes)):
+            i = bisect_right(lows, value) - 1
+            if i >= 0:
+                counts[i] += 1
+    return _facets(categories, price, duration, scale)
+
+
+def _bucket_q(field, low, high):
+    q = Q(**{f'{field}__gte': low})
+    if high is not None:
+        q &= Q(**{f'{field}__lt': high})
+    return q
+
+
+def catalogue_facets(category=None):
+    """
+    ``facets`` of every service, or of one category, from a breakdown
+    grouped by category that is cached until the catalogue version changes.
+    """
+    store = cache.get_cache()
+    key = f'services:facets:{cache.catalogue_version()}'
+    grouped = store.get(key)
+    if grouped is None:
+        aggregates = {'total': Count('id')}
+        for prefix, field, buckets in (('price', 'price', PRICE_BUCKETS), ('duration', 'duration_minutes', DURATION_BUCKETS)):
+            for i, (_, low, high) in enumerate(buckets):
+                aggregates[f'{prefix}_{i}'] = Count('id', filter=_bucket_q(field, low, high))
+        grouped = list(Service.objects.order_by().values('category').annotate(**aggregates))
+        store.set(key, grouped, getattr(settings, 'SERVICES_CACHE_TIMEOUT', 3600))
+
+    categories = dict.fromkeys(ALLOWED_SERVICES, 0)
+    price = [0] * len(PRICE_BUCKETS)
+    duration = [0] * len(DURATION_BUCKETS)
+    for row in grouped:
+        if category is not None and row['category'] != category:
+            continue
+        categories[row['category']] = row['total']
+        for i in range(len(PRICE_BUCKETS)):
+            price[i] += row[f'price_{i}']
+        for i in range(len(DURATION_BUCKETS)):
+            duration[i] += row[f'duration_{i}']
+    return _facets(categories, price, duration)
+
+
+def _facets(categories, price, duration, scale=1):
+    return {
+        'category': {name: round(count * scale) for name, count in categories.items()},
+        'price': [
+            {'range': label, 'count': round(count * scale)}
+            for (label, _, _), count in zip(PRICE_BUCKETS, price)
+        ],
+        'duration': [
+            {'range': label, 'count': round(count * scale)}
+            for (label, _, _), count in zip(DURATION_BUCKETS, duration)
+        ],
+    }
@@ -1,30 +1,66 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from .images import variant_digests, variant_names
+from .media import get_builder, media_url
 from .models import ServiceProvider, Service, ServiceImage
 
 User = get_user_model()
 
+
+def variant_urls(field_file, variants, request):
+    """{size: url} for the stored derivatives of ``field_file``."""
+    names = variant_names(field_file, variants)
+    digests = variant_digests(field_file, variants)
+    url = get_builder().url
+    return {size: url(field_file.storage, name, request, digests.get(name)) for size, name in names.items()}
+
+
+class MediaImageField(serializers.ImageField):
+    """
+    ``ImageField`` whose URL comes from the media URL builder. ``variants``
+    names the attribute holding the file's variants dict on the model
+    instance, for the content digest.
+    """
+    def __init__(self, variants=None, **kwargs):
+        self.variants = variants
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        variants = getattr(value.instance, self.variants, None) if value and self.variants else None
+        return media_url(value, self.context.get('request'), variants)
+
 class ServiceImageSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
 
     class Meta:
         model = ServiceImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'variants']
 
     def get_image(self, obj):
-        request = self.context.get('request')
-        if obj.image and hasattr(obj.image, 'url') and request:
-            return request.build_absolute_uri(obj.image.url)
-        return None
+        return media_url(obj.image, self.context.get('request'), obj.variants)
+
+    def get_variants(self, obj):
+        return variant_urls(obj.image, obj.variants, self.context.get('request'))
 
 class ServiceProviderSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
     email = serializers.EmailField(source='user.email', required=False)
     password = serializers.CharField(source='user.password', write_only=True, required=False, min_length=8)
+    profile_picture = MediaImageField(variants='profile_picture_variants', required=False, allow_null=True)
+    profile_picture_variants = serializers.SerializerMethodField()
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
 
     class Meta:
         model = ServiceProvider
-        fields = ['full_name', 'email', 'phone', 'bio', 'location', 'profile_picture', 'password', 'id']
+        fields = [
+            'full_name', 'email', 'phone', 'bio', 'location', 'latitude', 'longitude',
+            'profile_picture', 'profile_picture_variants', 'password', 'id',
+            'rating_avg', 'rating_count', 'rating_histogram',
+        ]
+
+    def get_profile_picture_variants(self, obj):
+        return variant_urls(obj.profile_picture, obj.profile_picture_variants, self.context.get('request'))
 
     def update(self, instance, validated_data):
         # Update user email and password if provided
@@ -52,27 +88,38 @@ class ServiceProviderSerializer(serializers.ModelSerializer):
 class ServiceSerializer(serializers.ModelSerializer):
     gallery_images = ServiceImageSerializer(many=True, read_only=True)
     gallery = serializers.ListField(write_only=True, required=False)
-    thumbnail = serializers.ImageField(required=False, allow_null=True)
+    thumbnail = MediaImageField(variants='thumbnail_variants', required=False, allow_null=True)
+    thumbnail_variants = serializers.SerializerMethodField()
     provider_name = serializers.CharField(source='provider.full_name', read_only=True)
     provider_image = serializers.SerializerMethodField()
+    provider_image_variants = serializers.SerializerMethodField()
     provider_email = serializers.EmailField(source='provider.user.email', read_only=True)
     provider_phone = serializers.CharField(source='provider.phone', read_only=True)
     provider_bio = serializers.CharField(source='provider.bio', read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
 
     class Meta:
         model = Service
         fields = [
             'id', 'name', 'category', 'description',
-            'price', 'duration_minutes', 'thumbnail',
+            'price', 'duration_minutes', 'thumbnail', 'thumbnail_variants',
             'gallery_images', 'gallery',
-            'provider_name', 'provider_image','provider_email', 'provider_phone', 'provider_bio',
+            'provider_name', 'provider_image', 'provider_image_variants', 'provider_email', 'provider_phone', 'provider_bio',
+            'rating_avg', 'rating_count', 'rating_histogram',
         ]
 
+    def get_thumbnail_variants(self, obj):
+        return variant_urls(obj.thumbnail, obj.thumbnail_variants, self.context.get('request'))
+
+    def get_provider_image_variants(self, obj):
+        if not obj.provider:
+            return {}
+        return variant_urls(obj.provider.profile_picture, obj.provider.profile_picture_variants, self.context.get('request'))
+
     def get_provider_image(self, obj):
-        request = self.context.get('request')
-        if obj.provider and obj.provider.profile_picture:
-            return request.build_absolute_uri(obj.provider.profile_picture.url)
-        return None
+        if not obj.provider:
+            return None
+        return media_url(obj.provider.profile_picture, self.context.get('request'), obj.provider.profile_picture_variants)
 
     def create(self, validated_data):
         gallery_data = validated_data.pop('gallery', [])
@@ -0,0 +1,65 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from jobs.queue import enqueue
+from . import search
+from .cache import invalidate_services_on_commit
+from .models import Service, ServiceImage, ServiceProvider, SimilarService
+
+
+@receiver(post_save, sender=Service)
+def index_saved_service(sender, instance, **kwargs):
+    search.index_service(instance)
+
+
+@receiver(post_delete, sender=Service)
+def unindex_deleted_service(sender, instance, **kwargs):
+    search.remove_service(instance.pk)
+
+
+@receiver(post_save, sender=Service)
+def update_similar_services(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    indexed_as, instance._indexed_as = getattr(instance, '_indexed_as', None), instance.similarity_state()
+    if update_fields is not None and not set(update_fields) & set(Service.SIMILARITY_FIELDS):
+        return
+    if created or indexed_as is None or indexed_as != instance._indexed_as:
+        enqueue('services.update_similar_services', service_ids=[instance.pk])
+
+
+@receiver(pre_delete, sender=Service)
+def unlist_deleted_service(sender, instance, **kwargs):
+    # The rows listing this service cascade away with it; refill those lists,
+    # and pass the service itself so a kept catalogue drops it.
+    listed_by = list(SimilarService.objects.filter(similar=instance).values_list('service_id', flat=True))
+    enqueue('services.update_similar_services', service_ids=[instance.pk] + listed_by)
+
+
+@receiver([post_save, post_delete], sender=Service)
+def invalidate_service(sender, instance, using=None, **kwargs):
+    invalidate_services_on_commit([instance.pk], using=using)
+
+
+@receiver(m2m_changed, sender=Service.gallery_images.through)
+def invalidate_gallery_change(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # instance is a ServiceImage; pk_set holds services (None on clear).
+        invalidate_services_on_commit(pk_set or [], using=using)
+    else:
+        invalidate_services_on_commit([instance.pk], using=using)
+
+
+@receiver(post_save, sender=ServiceImage)
+@receiver(pre_delete, sender=ServiceImage)
+def invalidate_image(sender, instance, using=None, **kwargs):
+    # pre_delete: the gallery links are gone by post_delete.
+    if instance.pk:
+        invalidate_services_on_commit(instance.service_set.values_list('id', flat=True), using=using)
+
+
+@receiver([post_save, pre_delete], sender=ServiceProvider)
+def invalidate_provider(sender, instance, using=None, **kwargs):
+    invalidate_services_on_commit(instance.services.values_list('id', flat=True), using=using)
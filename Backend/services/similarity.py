@@ -0,0 +1,390 @@
+"""
+Precomputed "similar services" index.
+
+Each service's ``NEIGHBOURS`` most similar services are stored best first as
+``SimilarService`` rows, so the similar-services endpoint reads k rows by
+(service, rank) instead of comparing the service with the whole catalogue.
+
+Similarity is a weighted sum (``WEIGHTS``) of four symmetric scores in [0, 1]:
+
+- ``category``: 1 for two services in the same category;
+- ``text``: cosine of the TF-IDF vectors of name and description, name
+  terms counting ``NAME_WEIGHT`` times;
+- ``price``: the lower price over the higher one;
+- ``co_booking``: cosine of the sets of customers who booked each service
+  (cancelled bookings aside).
+
+``rebuild()`` scores every service against the whole catalogue with NumPy,
+``BLOCK_ROWS`` services at a time. When services change, ``update()`` (the
+``services.update_similar_services`` job) rescores those services and the
+ones whose lists they may enter or leave: the services listing them now and
+the ``REVERSE_CANDIDATES`` services they score highest against. Updates keep
+the loaded catalogue, document frequencies included, for up to
+``CATALOGUE_MAX_AGE`` seconds and only re-read the services they are given,
+so the other services' text weights drift until the next load. Bookings
+don't trigger updates either, so co-booking scores catch up when
+``manage.py build_similar_services`` rebuilds the index, e.g. nightly.
+"""
+import math
+import threading
+from collections import Counter
+
+import numpy as np
+from django.db import connections, router, transaction
+from django.db.models import Count, Max, Min
+
+from au.cache import TTLCache
+from Booking.models import Booking
+from .models import Service, SimilarService
+from .search import tokenize
+
+NEIGHBOURS = SimilarService.NEIGHBOURS
+WEIGHTS = {'category': 0.25, 'text': 0.45, 'price': 0.15, 'co_booking': 0.15}
+NAME_WEIGHT = 2
+# Columns of the term matrix: terms in at least two services (no other term
+# can make two services alike), most common first. Rarer terms beyond the
+# cap still count towards each vector's length.
+MAX_TERMS = 512
+BLOCK_ROWS = 128
+REVERSE_CANDIDATES = 100
+# Seconds an update keeps reusing a loaded catalogue (see _catalogue).
+CATALOGUE_MAX_AGE = 600
+
+_catalogues = TTLCache(maxsize=4, ttl=CATALOGUE_MAX_AGE)
+_update_lock = threading.Lock()
+
+
+def _csr(keys, values, size):
+    """``(ptr, values)`` with the values of key ``k`` at ``values[ptr[k]:ptr[k + 1]]``."""
+    ptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=ptr[1:])
+    return ptr, values[np.argsort(keys, kind='stable')]
+
+
+def _gather(ptr, values, rows):
+    """``(positions, values)``: every value of every key in ``rows``, with its position in ``rows``."""
+    starts = ptr[rows]
+    lengths = ptr[rows + 1] - starts
+    positions = np.repeat(np.arange(len(rows)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return positions, values[np.repeat(starts, lengths) + offsets]
+
+
+class Terms:
+    """
+    Document frequencies and matrix columns of the catalogue's text. They're
+    kept with the catalogue between updates, so a changed service is weighed
+    against them instead of re-reading every description.
+    """
+
+    def __init__(self, documents):
+        self.total = len(documents)
+        self.frequency = Counter()
+        for counts in documents:
+            self.frequency.update(counts.keys())
+        shared = sorted((term for term, df in self.frequency.items() if df > 1), key=lambda term: (-self.frequency[term], term))
+        self.columns = {term: column for column, term in enumerate(shared[:MAX_TERMS])}
+
+    @staticmethod
+    def count(name, description):
+        counts = Counter(tokenize(description or ''))
+        for term in tokenize(name or ''):
+            counts[term] += NAME_WEIGHT
+        return counts
+
+    def vectors(self, documents):
+        vectors = np.zeros((len(documents), len(self.columns)), dtype=np.float32)
+        for row, counts in enumerate(documents):
+            length = 0.0
+            for term, count in counts.items():
+                weight = (1 + math.log(count)) * (math.log((1 + self.total) / (1 + self.frequency[term])) + 1)
+                length += weight * weight
+                if term in self.columns:
+                    vectors[row, self.columns[term]] = weight
+            if length:
+                vectors[row] /= math.sqrt(length)
+        return vectors
+
+
+class Catalogue:
+    """The features of every service; row ``i`` describes ``ids[i]``."""
+
+    FIELDS = ('id', 'category', 'price', 'name', 'description')
+
+    def __init__(self, services):
+        services = list(services)
+        self._category_codes = {}
+        self.terms = Terms([Terms.count(name, description) for *_, name, description in services])
+        self.ids = np.array([row[0] for row in services], dtype=np.int64)
+        self.categories, self.prices, self.vectors = self._features(services)
+        self._reindex()
+
+    @classmethod
+    def load(cls, using=None):
+        services = Service.objects.using(using).order_by('id').values_list(*cls.FIELDS)
+        return cls(services.iterator(chunk_size=5000))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _reindex(self):
+        self.index = {pk: i for i, pk in enumerate(self.ids.tolist())}
+
+    def _features(self, services):
+        categories = [self._category_codes.setdefault(row[1], len(self._category_codes)) for row in services]
+        return (
+            np.array(categories, dtype=np.int32),
+            np.array([row[2] for row in services], dtype=np.float32),
+            self.terms.vectors([Terms.count(name, description) for *_, name, description in services]),
+        )
+
+    def extent(self):
+        """``(count, highest id)``, to compare with the Service table."""
+        return len(self), int(self.ids.max()) if len(self) else None
+
+    def refresh(self, service_ids, using=None):
+        """
+        Re-read ``service_ids``: changed services get new features (against
+        the kept ``terms``), new ones are appended and deleted ones dropped.
+        """
+        services = list(Service.objects.using(using).filter(pk__in=service_ids).values_list(*self.FIELDS))
+        found = {row[0] for row in services}
+        changed = [row for row in services if row[0] in self.index]
+        if changed:
+            rows = np.array([self.index[row[0]] for row in changed], dtype=np.int64)
+            self.categories[rows], self.prices[rows], self.vectors[rows] = self._features(changed)
+
+        added = [row for row in services if row[0] not in self.index]
+        deleted = [self.index[pk] for pk in set(service_ids) - found if pk in self.index]
+        if added or deleted:
+            keep = np.ones(len(self), dtype=bool)
+            keep[deleted] = False
+            categories, prices, vectors = self._features(added)
+            self.ids = np.concatenate([self.ids[keep], np.array([row[0] for row in added], dtype=np.int64)])
+            self.categories = np.concatenate([self.categories[keep], categories])
+            self.prices = np.concatenate([self.prices[keep], prices])
+            self.vectors = np.concatenate([self.vectors[keep], vectors])
+            self._reindex()
+
+    def scores(self, rows, co_bookings, columns=None):
+        """
+        Similarity of each service in ``rows`` (row numbers) to each one in
+        ``columns`` (sorted row numbers, default all), itself at -inf.
+        """
+        if columns is None:
+            columns = np.arange(len(self))
+        scores = np.matmul(self.vectors[rows], self.vectors[columns].T)
+        scores *= WEIGHTS['text']
+        np.add(scores, WEIGHTS['category'], out=scores, where=self.categories[rows, None] == self.categories[columns])
+        # +1 so free services compare as equal rather than dividing by zero.
+        prices, others = self.prices[rows, None] + 1, self.prices[columns] + 1
+        ratio = np.minimum(prices, others)
+        ratio /= np.maximum(prices, others)
+        ratio *= WEIGHTS['price']
+        scores += ratio
+
+        positions, partners, shared = co_bookings.cosines(rows)
+        at = np.minimum(np.searchsorted(columns, partners), len(columns) - 1)
+        listed = columns[at] == partners
+        scores[positions[listed], at[listed]] += WEIGHTS['co_booking'] * shared[listed]
+        at = np.minimum(np.searchsorted(columns, rows), len(columns) - 1)
+        listed = columns[at] == rows
+        scores[np.flatnonzero(listed), at[listed]] = -np.inf
+        return scores
+
+    def _top(self, scores, columns, k):
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        top = columns[top]
+        # Best first; equal scores by id so rebuilds are repeatable.
+        order = np.lexsort((self.ids[top], -top_scores), axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def rank(self, rows, co_bookings, k=None):
+        """
+        ``(neighbour rows, scores)``, best first, of the ``k`` (default
+        ``NEIGHBOURS``) services most like each of ``rows``.
+
+        Each service is first ranked against its own category. A service
+        from another category can score at most ``1 - WEIGHTS['category']``,
+        so only the rows whose k-th score doesn't beat that are ranked again
+        against the whole catalogue.
+        """
+        k = min(k or NEIGHBOURS, len(self) - 1)
+        neighbours = np.empty((len(rows), max(k, 0)), dtype=np.int64)
+        best = np.empty(neighbours.shape, dtype=np.float32)
+        if k <= 0:
+            return neighbours, best
+        everything = np.arange(len(self))
+        recheck = []
+        for category in np.unique(self.categories[rows]):
+            members = np.flatnonzero(self.categories == category)
+            positions = np.flatnonzero(self.categories[rows] == category)
+            if len(members) <= k:
+                recheck.append(positions)
+                continue
+            for start in range(0, len(positions), BLOCK_ROWS):
+                block = positions[start:start + BLOCK_ROWS]
+                neighbours[block], best[block] = self._top(self.scores(rows[block], co_bookings, members), members, k)
+            recheck.append(positions[best[positions, -1] <= 1 - WEIGHTS['category']])
+        recheck = np.concatenate(recheck) if recheck else recheck
+        for start in range(0, len(recheck), BLOCK_ROWS):
+            block = recheck[start:start + BLOCK_ROWS]
+            neighbours[block], best[block] = self._top(self.scores(rows[block], co_bookings), everything, k)
+        return neighbours, best
+
+
+class CoBookings:
+    """Which customers booked which services, for co-booking cosines."""
+
+    def __init__(self, catalogue, pairs, customers_per_service):
+        services, customers = [], []
+        for service_id, customer_id in pairs:
+            if service_id in catalogue.index:
+                services.append(catalogue.index[service_id])
+                customers.append(customer_id)
+        services = np.array(services, dtype=np.int64)
+        customer_ids, customers = np.unique(np.array(customers, dtype=np.int64), return_inverse=True)
+        self.service_customers = _csr(services, customers, len(catalogue))
+        self.customer_services = _csr(customers, services, len(customer_ids))
+        self.customer_counts = customers_per_service
+
+    @classmethod
+    def load(cls, catalogue, rows=None, using=None):
+        """The bookings of every customer who booked a service in ``rows`` (all customers if None)."""
+        bookings = Booking.objects.using(using).exclude(status='cancelled')
+        counts = np.zeros(len(catalogue), dtype=np.float32)
+        if rows is None:
+            pairs = list(bookings.values_list('service_id', 'user_id').distinct().iterator(chunk_size=10000))
+            for service_id, _ in pairs:
+                if service_id in catalogue.index:
+                    counts[catalogue.index[service_id]] += 1
+            return cls(catalogue, pairs, counts)
+
+        customers = bookings.filter(service_id__in=catalogue.ids[rows].tolist()).values('user_id')
+        booked = bookings.filter(user_id__in=customers)
+        per_service = (
+            bookings.filter(service_id__in=booked.values('service_id'))
+            .values('service_id').annotate(customers=Count('user_id', distinct=True)).order_by()
+        )
+        for row in per_service:
+            if row['service_id'] in catalogue.index:
+                counts[catalogue.index[row['service_id']]] = row['customers']
+        return cls(catalogue, booked.values_list('service_id', 'user_id').distinct(), counts)
+
+    def cosines(self, rows):
+        """``(positions in rows, partner rows, cosines)`` for every service co-booked with one of ``rows``."""
+        positions, customers = _gather(*self.service_customers, rows)
+        owners, partners = _gather(*self.customer_services, customers)
+        pairs, shared = np.unique(positions[owners] * len(self.customer_counts) + partners, return_counts=True)
+        positions, partners = np.divmod(pairs, len(self.customer_counts))
+        keep = partners != rows[positions]
+        positions, partners, shared = positions[keep], partners[keep], shared[keep]
+        cosines = shared / np.sqrt(self.customer_counts[rows[positions]] * self.customer_counts[partners])
+        return positions, partners, cosines.astype(np.float32)
+
+
+def _store(catalogue, rows, neighbours, scores, using, replace_all=False):
+    """Replace the stored lists of ``rows`` with ``neighbours``."""
+    service_ids = catalogue.ids[rows].tolist()
+    entries = [
+        (service_id, similar_id, rank, score)
+        for service_id, similar_ids, row_scores in zip(service_ids, catalogue.ids[neighbours].tolist(), scores.tolist())
+        for rank, (similar_id, score) in enumerate(zip(similar_ids, row_scores))
+    ]
+    connection = connections[using]
+    table = connection.ops.quote_name(SimilarService._meta.db_table)
+    columns = ', '.join(
+        connection.ops.quote_name(SimilarService._meta.get_field(name).column)
+        for name in ('service', 'similar', 'rank', 'score')
+    )
+    with transaction.atomic(using=using):
+        stale = SimilarService.objects.using(using)
+        if not replace_all:
+            stale = stale.filter(service_id__in=service_ids)
+        stale.delete()
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES (%s, %s, %s, %s)', entries)
+    return len(entries)
+
+
+def clear_cache():
+    _catalogues.clear()
+
+
+def _catalogue(service_ids, using):
+    """
+    The kept catalogue of ``using`` with ``service_ids`` re-read, or a fresh
+    one if there's none, it's older than ``CATALOGUE_MAX_AGE``, or services
+    were created or deleted without an update here (another process's).
+    Edits made elsewhere are picked up when it ages out.
+    """
+    catalogue = _catalogues.get(using)
+    if catalogue is not None:
+        try:
+            catalogue.refresh(service_ids, using)
+        except BaseException:
+            _catalogues.delete(using)
+            raise
+        stored = Service.objects.using(using).aggregate(count=Count('id'), last=Max('id'))
+        if catalogue.extent() != (stored['count'], stored['last']):
+            catalogue = None
+    if catalogue is None:
+        catalogue = Catalogue.load(using)
+        _catalogues.set(using, catalogue)
+    return catalogue
+
+
+def rebuild():
+    """Recompute every service's list. Returns the number of services indexed."""
+    using = router.db_for_write(SimilarService)
+    with _update_lock:
+        catalogue = Catalogue.load(using)
+        rows = np.arange(len(catalogue))
+        neighbours, scores = catalogue.rank(rows, CoBookings.load(catalogue, using=using))
+        _store(catalogue, rows, neighbours, scores, using, replace_all=True)
+        _catalogues.set(using, catalogue)
+    return len(catalogue)
+
+
+def update(service_ids):
+    """
+    Bring the index up to date after ``service_ids`` were created, changed
+    or deleted. Returns the number of services whose lists were recomputed.
+    """
+    # One update at a time per process: they share the kept catalogue.
+    with _update_lock:
+        return _update(service_ids, router.db_for_write(SimilarService))
+
+
+def _update(service_ids, using):
+    catalogue = _catalogue(service_ids, using)
+    stored = SimilarService.objects.using(using)
+    targets = np.array(sorted({catalogue.index[pk] for pk in service_ids if pk in catalogue.index}), dtype=np.int64)
+    affected = set(stored.filter(similar_id__in=service_ids).values_list('service_id', flat=True))
+
+    if len(targets):
+        neighbours, scores = catalogue.rank(targets, CoBookings.load(catalogue, targets, using), REVERSE_CANDIDATES)
+        _store(catalogue, targets, neighbours[:, :NEIGHBOURS], scores[:, :NEIGHBOURS], using)
+
+        # Scores are symmetric, so a target enters another service's list
+        # when it beats the lowest score that list holds now.
+        candidates = {}
+        for pk, score in zip(catalogue.ids[neighbours].ravel().tolist(), scores.ravel().tolist()):
+            candidates[pk] = max(score, candidates.get(pk, score))
+        floors = {
+            row['service_id']: row
+            for row in stored.filter(service_id__in=list(candidates))
+            .values('service_id').annotate(floor=Min('score'), entries=Count('id')).order_by()
+        }
+        for pk, score in candidates.items():
+            row = floors.get(pk)
+            if row is None or row['entries'] < min(NEIGHBOURS, len(catalogue) - 1) or score > row['floor']:
+                affected.add(pk)
+        affected.difference_update(catalogue.ids[targets].tolist())
+
+    rows = np.array(sorted(catalogue.index[pk] for pk in affected if pk in catalogue.index), dtype=np.int64)
+    if len(rows):
+        neighbours, scores = catalogue.rank(rows, CoBookings.load(catalogue, rows, using))
+        _store(catalogue, rows, neighbours, scores, using)
+    return len(targets) + len(rows)
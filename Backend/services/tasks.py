@@ -0,0 +1,42 @@
+from jobs.queue import absorb, register
+from .images import generate_variants, normalize_orientation
+from .models import Service, ServiceProvider
+
+
+@register('services.process_service_images')
+def process_service_images(service_id):
+    service = Service.objects.prefetch_related('gallery_images').get(pk=service_id)
+    gallery = list(service.gallery_images.all())
+
+    normalize_orientation(service.thumbnail)
+    for image in gallery:
+        normalize_orientation(image.image)
+
+    # Thumbnail and gallery are encoded together so the pool works on all of
+    # them at once.
+    variants = generate_variants([service.thumbnail] + [image.image for image in gallery])
+    service.thumbnail_variants = variants[0]
+    service.save(update_fields=['thumbnail_variants'])
+    for image, image_variants in zip(gallery, variants[1:]):
+        image.variants = image_variants
+        image.save(update_fields=['variants'])
+
+
+@register('services.process_profile_picture')
+def process_profile_picture(provider_id):
+    provider = ServiceProvider.objects.get(pk=provider_id)
+    normalize_orientation(provider.profile_picture)
+    provider.profile_picture_variants = generate_variants([provider.profile_picture])[0]
+    provider.save(update_fields=['profile_picture_variants'])
+
+
+@register('services.update_similar_services')
+def update_similar_services(service_ids):
+    # Imported here so web processes, which only enqueue, don't load NumPy.
+    from . import similarity
+
+    # Jobs queued meanwhile (e.g. a burst of edits) share this run's load.
+    with absorb('services.update_similar_services') as payloads:
+        for payload in payloads:
+            service_ids = service_ids + payload['service_ids']
+        similarity.update(sorted(set(service_ids)))
@@ -1,3 +1,771 @@
-from django.test import TestCase
+import io
+import math
+import random
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from Backend.async_views import AsyncAPIView
+from Backend.projection import Projection
+from jobs.models import Job
+from . import geo, images, similarity
+from .cache import get_cache, service_version
+from .images import generate_variants
+from .models import ServiceProvider, Service, ServiceImage, SimilarService
+from .projections import ServiceProjection
+from .serializers import ServiceSerializer
+from .tasks import process_service_images
+
+User = get_user_model()
+
+
+def make_provider(username, **extra):
+    user = User.objects.create(username=username, email=f'{username}@example.com', firebase_uid=username)
+    defaults = {
+        'full_name': username.title(),
+        'email': user.email,
+        'phone': '0300000000',
+        'location': 'Lahore',
+        'profile_picture': f'provider_profiles/{username}.jpg',
+    }
+    defaults.update(extra)
+    return ServiceProvider.objects.create(user=user, **defaults)
+
+
+def async_get(path, **extra):
+    """GET ``path`` through the ASGI URLconf and its async views."""
+    with override_settings(ROOT_URLCONF='Backend.urls_async'):
+        return async_to_sync(AsyncClient().get)(path, **extra)
+
+
+def make_service(provider, gallery=2, **extra):
+    defaults = {
+        'name': 'Deep clean',
+        'category': 'Cleaning',
+        'description': 'Full house cleaning',
+        'price': '1500.00',
+        'duration_minutes': 60,
+        'thumbnail': 'service_thumbnails/thumb.jpg',
+    }
+    defaults.update(extra)
+    service = Service.objects.create(provider=provider, **defaults)
+    for i in range(gallery):
+        service.gallery_images.add(ServiceImage.objects.create(image=f'service_galleries/{service.pk}_{i}.jpg'))
+    return service
+
+
+class PublicCatalogueQueryCountTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def _seed(self, prefix, providers, services_per_provider):
+        for p in range(providers):
+            provider = make_provider(f'{prefix}{p}')
+            for _ in range(services_per_provider):
+                make_service(provider)
+
+    def test_list_query_count_is_independent_of_size(self):
+        self._seed('small', 2, 2)
+        with self.assertNumQueries(2):
+            small = self.client.get('/api/services/')
+        self.assertEqual(small.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._seed('large', 5, 4)
+        with self.assertNumQueries(2):
+            large = self.client.get('/api/services/')
+        self.assertEqual(large.status_code, 200)
+
+    def test_list_exposes_provider_and_gallery(self):
+        provider = make_provider('alice')
+        make_service(provider, gallery=3)
+
+        data = self.client.get('/api/services/').json()
+        row = data['results'][0]
+        self.assertEqual(row['provider_name'], 'Alice')
+        self.assertEqual(row['provider_email'], 'alice@example.com')
+        self.assertEqual(len(row['gallery_images']), 3)
+        self.assertTrue(row['provider_image'].startswith('http://testserver/'))
+
+    def test_public_detail_query_count(self):
+        service = make_service(make_provider('bob'), gallery=4)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/services/{service.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['gallery_images']), 4)
+
+
+class CatalogueKeysetPaginationTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        provider = make_provider('carol')
+        self.services = [make_service(provider, gallery=0, category='Repair' if i % 2 else 'Cleaning') for i in range(7)]
+
+    def test_walks_every_page_in_id_order(self):
+        seen = []
+        url = '/api/services/?page_size=3'
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(row['id'] for row in data['results'])
+            url = data['next']
+        self.assertEqual(seen, [s.pk for s in self.services])
+
+    def test_default_page_is_bounded(self):
+        provider = make_provider('dave')
+        for _ in range(25):
+            make_service(provider, gallery=0)
+        data = self.client.get('/api/services/').json()
+        self.assertEqual(len(data['results']), 20)
+        self.assertIsNotNone(data['next'])
+
+    def test_category_filter(self):
+        data = self.client.get('/api/services/?category=Repair').json()
+        self.assertEqual([row['id'] for row in data['results']], [s.pk for s in self.services if s.category == 'Repair'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/services/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class ServiceSearchTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        provider = make_provider('grace')
+        self.sofa = make_service(provider, gallery=0, name='Sofa cleaning', description='Steam clean for sofas', price='800.00', duration_minutes=45)
+        self.kitchen = make_service(provider, gallery=0, name='Kitchen deep clean', description='Degrease and polish', price='3000.00', duration_minutes=120)
+        self.pipe = make_service(provider, gallery=0, name='Pipe repair', category='Plumbing', description='Fix leaking sofa-side pipes', price='1200.00', duration_minutes=30)
+
+    def test_ranks_name_matches_first(self):
+        data = self.client.get('/api/services/search/?q=sofa').json()
+        self.assertEqual([row['id'] for row in data['results']], [self.sofa.pk, self.pipe.pk])
+        self.assertEqual(data['count'], 2)
+
+    def test_prefix_match_and_filters(self):
+        data = self.client.get('/api/services/search/?q=clea&max_price=1000').json()
+        self.assertEqual([row['id'] for row in data['results']], [self.sofa.pk])
+
+    def test_facets(self):
+        facets = self.client.get('/api/services/search/').json()['facets']
+        self.assertEqual(facets['category']['Cleaning'], 2)
+        self.assertEqual(facets['category']['Plumbing'], 1)
+        self.assertEqual(facets['category']['Painting'], 0)
+        self.assertEqual([b['count'] for b in facets['price']], [1, 1, 1, 0])
+        self.assertEqual([b['count'] for b in facets['duration']], [0, 2, 0, 1])
+
+    def test_catalogue_facets_are_cached_until_a_write(self):
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/services/search/?limit=0').json()
+        self.assertEqual((data['count'], data['approximate']), (3, False))
+        with self.assertNumQueries(0):
+            facets = self.client.get('/api/services/search/?category=Cleaning&limit=0').json()['facets']
+        self.assertEqual(facets['category']['Cleaning'], 2)
+        self.assertEqual(facets['category']['Plumbing'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_service(self.sofa.provider, gallery=0, category='Painting', price='6000.00')
+        facets = self.client.get('/api/services/search/').json()['facets']
+        self.assertEqual(facets['category']['Painting'], 1)
+        self.assertEqual([b['count'] for b in facets['price']], [1, 1, 1, 1])
+
+    def test_broad_queries_are_sampled(self):
+        from . import search
+        provider = self.sofa.provider
+        for i in range(6):
+            make_service(provider, gallery=0, name=f'Window cleaning {i}', price='500.00')
+        with mock.patch.object(search, 'CANDIDATE_LIMIT', 4):
+            data = self.client.get('/api/services/search/?q=clean&limit=10').json()
+            self.assertTrue(data['approximate'])
+            self.assertEqual(len(data['results']), 4)
+            self.assertGreater(data['count'], 4)
+            data = self.client.get('/api/services/search/?max_price=1000').json()
+            self.assertTrue(data['approximate'])
+            self.assertGreater(data['count'], 4)
+            data = self.client.get('/api/services/search/?q=sofa').json()
+            self.assertEqual((data['count'], data['approximate']), (2, False))
+
+    def test_index_follows_save_and_delete(self):
+        self.pipe.name = 'Geyser installation'
+        self.pipe.save()
+        self.assertEqual(self.client.get('/api/services/search/?q=geyser').json()['count'], 1)
+        self.pipe.delete()
+        self.assertEqual(self.client.get('/api/services/search/?q=geyser').json()['count'], 0)
+
+    def test_filters_apply_before_ranking(self):
+        from . import search
+        for fts in (True, False):
+            with mock.patch.object(search, 'fts_available', return_value=fts):
+                data = self.client.get('/api/services/search/?q=sofa&category=Plumbing&limit=0').json()
+            self.assertEqual(data['count'], 1)
+            self.assertEqual(data['facets']['category'], {**data['facets']['category'], 'Plumbing': 1, 'Cleaning': 0})
+            with mock.patch.object(search, 'fts_available', return_value=fts):
+                data = self.client.get('/api/services/search/?q=sofa&offset=1').json()
+            self.assertEqual([row['id'] for row in data['results']], [self.pipe.pk])
+            self.assertEqual(data['count'], 2)
+
+    def test_rejects_non_finite_filters(self):
+        for query in ('min_price=nan', 'max_price=inf', 'max_price=-Infinity', 'min_duration=1.5', 'max_price=abc'):
+            self.assertEqual(self.client.get(f'/api/services/search/?q=sofa&{query}').status_code, 400, query)
+        self.assertEqual(self.client.get('/api/services/search/?q=sofa&max_price=900.50').json()['count'], 1)
+
+    def test_fallback_without_fts(self):
+        from . import search
+        with mock.patch.object(search, 'fts_available', return_value=False):
+            data = self.client.get('/api/services/search/?q=sofa').json()
+        self.assertEqual([row['id'] for row in data['results']], [self.sofa.pk, self.pipe.pk])
+
+
+class BulkServiceImportTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.provider = make_provider('zara')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=self.provider.user_id))
+
+    def item(self, name, **extra):
+        return {'name': name, 'category': 'Plumbing', 'description': 'Leak fixing', 'price': '900.00', 'duration_minutes': 30, **extra}
+
+    def test_imports_indexes_and_invalidates(self):
+        self.client.get('/api/services/')
+        response = self.client.post('/api/add-service/bulk/', [self.item('Tap repair'), self.item('Geyser service')], format='json')
+        self.assertEqual(response.status_code, 201)
+        ids = response.json()['ids']
+        self.assertEqual(list(Service.objects.filter(provider=self.provider).order_by('id').values_list('id', flat=True)), ids)
+        search = self.client.get('/api/services/search/?q=geyser').json()
+        self.assertEqual([row['id'] for row in search['results']], [ids[1]])
+        listed = self.client.get('/api/services/').json()['results']
+        self.assertEqual({row['id'] for row in listed}, set(ids))
+
+    def test_invalid_item_rejects_whole_batch(self):
+        response = self.client.post('/api/add-service/bulk/', [self.item('Tap repair'), self.item('', price='abc')], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Service.objects.exists())
+
+
+class GeoIndexTests(TestCase):
+    def test_covering_cells_contain_every_point_in_radius(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            lat, lng = rng.uniform(-60, 60), rng.uniform(-179, 179)
+            radius = rng.choice([0.5, 2, 10, 50])
+            cells = geo.covering_cells(lat, lng, radius)
+            # Points on the circle must fall into one of the covering cells.
+            for bearing in range(0, 360, 30):
+                angle = math.radians(bearing)
+                dlat = 0.999 * radius / geo.KM_PER_DEGREE * math.cos(angle)
+                dlng = 0.999 * radius / (geo.KM_PER_DEGREE * math.cos(math.radians(lat))) * math.sin(angle)
+                point_hash = geo.encode(lat + dlat, lng + dlng)
+                self.assertTrue(any(point_hash.startswith(c) for c in cells), (lat, lng, radius, bearing))
+
+    def test_nearby_providers(self):
+        near = make_provider('henry', latitude=31.5204, longitude=74.3587)
+        nearer = make_provider('ivy', latitude=31.5210, longitude=74.3590)
+        make_provider('jack', latitude=33.6844, longitude=73.0479)
+        make_provider('kate')
+
+        response = APIClient().get('/api/providers/nearby/?lat=31.5205&lng=74.3588&radius_km=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()], [near.pk, nearer.pk])
+        self.assertLess(response.json()[0]['distance_km'], 0.1)
+
+    def test_nearby_requires_valid_point(self):
+        response = APIClient().get('/api/providers/nearby/?lat=abc&lng=1')
+        self.assertEqual(response.status_code, 400)
+
+
+class ImageJobTests(TestCase):
+    def test_gallery_orientation_is_normalized(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            exif = Image.Exif()
+            exif[0x0112] = 6  # rotated 90 degrees clockwise
+            buffer = io.BytesIO()
+            Image.new('RGB', (40, 20)).save(buffer, format='JPEG', exif=exif)
+
+            service = make_service(make_provider('rose'), gallery=0)
+            image = ServiceImage()
+            image.image.save('sideways.jpg', ContentFile(buffer.getvalue()))
+            service.gallery_images.add(image)
+
+            process_service_images(service.pk)
+
+            with Image.open(image.image.path) as rotated:
+                self.assertEqual(rotated.size, (20, 40))
+                self.assertEqual(rotated.getexif().get(0x0112, 1), 1)
+
+
+def jpeg_bytes(size):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'orange').save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class ImageDerivativeTests(TestCase):
+    def test_thumbnail_and_gallery_variants(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            service = make_service(make_provider('sam'), gallery=0)
+            service.thumbnail.save('big.jpg', ContentFile(jpeg_bytes((1600, 900))))
+            for name, size in (('a.jpg', (800, 600)), ('b.jpg', (100, 80))):
+                image = ServiceImage()
+                image.image.save(name, ContentFile(jpeg_bytes(size)))
+                service.gallery_images.add(image)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                process_service_images(service.pk)
+            service.refresh_from_db()
+
+            self.assertEqual(sorted(service.thumbnail_variants), ['1024', '128', '512', 'digests', 'source'])
+            with Image.open(service.thumbnail.storage.path(service.thumbnail_variants['512'])) as variant:
+                self.assertEqual((variant.format, variant.size), ('WEBP', (512, 288)))
+
+            row = APIClient().get(f'/api/services/{service.pk}/').json()
+            digests = service.thumbnail_variants['digests']
+            self.assertTrue(row['thumbnail_variants']['128'].endswith(
+                f"big.jpg_128.webp?v={digests[service.thumbnail_variants['128']]}"
+            ))
+            self.assertTrue(row['thumbnail'].endswith(f'big.jpg?v={digests[service.thumbnail.name]}'))
+            by_name = {g['image'].rsplit('/', 1)[-1].split('?')[0]: g['variants'] for g in row['gallery_images']}
+            self.assertEqual(sorted(by_name['a.jpg']), ['128', '512'])
+            self.assertEqual(by_name['b.jpg'], {})
+
+    def test_broken_pool_is_replaced(self):
+        broken = mock.Mock()
+        broken.map.side_effect = BrokenProcessPool('encoder killed')
+        with mock.patch.object(images, '_pool', broken):
+            rendered = images._render_in_pool([jpeg_bytes((300, 200)), jpeg_bytes((200, 300))])
+            fresh = images._pool
+        self.addCleanup(fresh.shutdown)
+        self.assertIsNot(fresh, broken)
+        self.assertNotEqual(fresh._mp_context.get_start_method(), 'fork')
+        broken.shutdown.assert_called_once()
+        self.assertEqual([sorted(variants) for variants in rendered], [[128], [128]])
+
+    def test_same_stem_with_other_extension_keeps_its_variants(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            images = []
+            for name, fmt in (('same.jpg', 'JPEG'), ('same.png', 'PNG')):
+                buffer = io.BytesIO()
+                Image.new('RGB', (300, 200), 'orange').save(buffer, format=fmt)
+                image = ServiceImage()
+                image.image.save(name, ContentFile(buffer.getvalue()))
+                images.append(image)
+
+            jpg, png = [variants['128'] for variants in generate_variants([image.image for image in images])]
+            self.assertNotEqual(jpg, png)
+            generate_variants([images[1].image])
+            self.assertTrue(images[0].image.storage.exists(jpg))
+
+    def test_replaced_image_hides_stale_variants(self):
+        service = make_service(make_provider('tara'), gallery=0)
+        service.thumbnail_variants = {'source': 'service_thumbnails/old.jpg', '128': 'derivatives/old_128.webp'}
+        service.save()
+        row = APIClient().get(f'/api/services/{service.pk}/').json()
+        self.assertEqual(row['thumbnail_variants'], {})
+
+
+class CatalogueResponseCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.provider = make_provider('uma')
+        self.service = make_service(self.provider, gallery=1)
+
+    def test_detail_is_cached_with_etag(self):
+        url = f'/api/services/{self.service.pk}/'
+        first = self.client.get(url)
+        etag = first['ETag']
+        self.assertTrue(etag.startswith('"'))
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+    def test_service_save_invalidates_detail_and_list(self):
+        detail = f'/api/services/{self.service.pk}/'
+        old_detail = self.client.get(detail)['ETag']
+        old_list = self.client.get('/api/services/')['ETag']
+
+        self.service.price = '999.00'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.save()
+
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=old_detail)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['price'], '999.00')
+        self.assertNotEqual(self.client.get('/api/services/')['ETag'], old_list)
+
+    def test_invalidation_waits_for_commit(self):
+        version = service_version(self.service.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.price = '999.00'
+            self.service.save()
+            # A read racing the open transaction must not cache its old rows
+            # under a version that outlives the commit.
+            self.assertEqual(service_version(self.service.pk), version)
+        self.assertNotEqual(service_version(self.service.pk), version)
+
+    def test_gallery_and_provider_changes_invalidate(self):
+        url = f'/api/services/{self.service.pk}/'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.gallery_images.add(ServiceImage.objects.create(image='service_galleries/new.jpg'))
+        etag2 = self.client.get(url)['ETag']
+        self.assertNotEqual(etag, etag2)
+
+        self.provider.full_name = 'Uma Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.save()
+        response = self.client.get(url)
+        self.assertNotEqual(response['ETag'], etag2)
+        self.assertEqual(response.json()['provider_name'], 'Uma Renamed')
+
+    def test_list_pages_are_cached_per_query(self):
+        make_service(self.provider, gallery=0, category='Repair')
+        everything = self.client.get('/api/services/').json()
+        repairs = self.client.get('/api/services/?category=Repair').json()
+        self.assertEqual(len(everything['results']), 2)
+        self.assertEqual(len(repairs['results']), 1)
+
+    def test_missing_service_is_not_cached(self):
+        self.assertEqual(self.client.get('/api/services/999999/').status_code, 404)
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.provider = make_provider('xena')
+        self.services = [make_service(self.provider, gallery=0, name=f'S{i}') for i in range(3)]
+        self.customer = make_provider('yuri').user
+
+    def _rate(self, service, rating):
+        from Booking.models import Booking, Feedback
+        booking = Booking.objects.create(
+            user=self.customer, service=service, date='2025-07-01', time='10:00',
+            name='Yuri', contact='0300', location='DHA',
+        )
+        Feedback.objects.create(booking=booking, rating=rating, comment='')
+
+    def test_feedback_updates_service_and_provider(self):
+        for rating in (5, 4, 4):
+            self._rate(self.services[0], rating)
+        self._rate(self.services[1], 1)
+
+        service = Service.objects.get(pk=self.services[0].pk)
+        self.assertEqual(service.rating_count, 3)
+        self.assertAlmostEqual(service.rating_avg, 13 / 3)
+        self.assertEqual(service.rating_histogram, {'1': 0, '2': 0, '3': 0, '4': 2, '5': 1})
+
+        provider = ServiceProvider.objects.get(pk=self.provider.pk)
+        self.assertEqual((provider.rating_count, provider.rating_sum), (4, 14))
+        self.assertEqual(provider.rating_1_count, 1)
+
+        row = APIClient().get(f'/api/services/{service.pk}/').json()
+        self.assertEqual(row['rating_count'], 3)
+        self.assertEqual(row['rating_histogram']['4'], 2)
+
+    def test_catalogue_sorted_by_rating(self):
+        self._rate(self.services[1], 5)
+        self._rate(self.services[2], 3)
+        ids = []
+        url = '/api/services/?ordering=rating&page_size=1'
+        while url:
+            data = APIClient().get(url).json()
+            ids.extend(row['id'] for row in data['results'])
+            url = data['next']
+        self.assertEqual(ids, [self.services[1].pk, self.services[2].pk, self.services[0].pk])
+        self.assertEqual(APIClient().get('/api/services/?ordering=bogus').status_code, 400)
+
+    def test_reconcile_rebuilds_from_feedback(self):
+        for rating in (2, 4):
+            self._rate(self.services[0], rating)
+        Service.objects.update(rating_avg=0, rating_count=99, rating_sum=0, rating_2_count=7)
+
+        call_command('reconcile_ratings', stdout=io.StringIO())
+
+        service = Service.objects.get(pk=self.services[0].pk)
+        self.assertEqual((service.rating_count, service.rating_sum, service.rating_avg), (2, 6, 3.0))
+        self.assertEqual(service.rating_2_count, 1)
+        self.assertEqual(Service.objects.get(pk=self.services[1].pk).rating_count, 0)
+        self.assertEqual(ServiceProvider.objects.get(pk=self.provider.pk).rating_count, 2)
+
+    def test_stale_instance_save_keeps_counters(self):
+        stale = Service.objects.get(pk=self.services[0].pk)
+        self._rate(self.services[0], 5)
+        stale.description = 'Updated'
+        stale.save()
+        service = Service.objects.get(pk=stale.pk)
+        self.assertEqual((service.description, service.rating_count), ('Updated', 1))
+
+
+@override_settings(JOBS_ALWAYS_EAGER=True)
+class SimilarServicesTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        similarity.clear_cache()
+        self.addCleanup(similarity.clear_cache)
+        provider = make_provider('quinn')
+        self.sofa = make_service(provider, gallery=0, name='Sofa cleaning', description='Steam clean for sofas and couches', price='800.00')
+        self.couch = make_service(provider, gallery=0, name='Sofa and couch cleaning', description='Steam clean for sofas', price='900.00')
+        self.kitchen = make_service(provider, gallery=0, name='Kitchen deep clean', description='Degrease and polish', price='3000.00')
+        self.pipe = make_service(provider, gallery=0, name='Pipe repair', category='Plumbing', description='Fix leaking pipes', price='1200.00')
+        self.geyser = make_service(provider, gallery=0, name='Geyser installation', category='Plumbing', description='Install water heaters', price='5000.00')
+        self.customer = make_provider('uma').user
+
+    def neighbours(self, service):
+        return list(SimilarService.objects.filter(service=service).order_by('rank').values_list('similar_id', flat=True))
+
+    def test_rebuild_combines_category_text_and_price(self):
+        call_command('build_similar_services', stdout=io.StringIO())
+        self.assertEqual(SimilarService.objects.count(), 5 * 4)
+        self.assertEqual(self.neighbours(self.sofa), [self.couch.pk, self.kitchen.pk, self.pipe.pk, self.geyser.pk])
+        self.assertEqual(self.neighbours(self.pipe)[0], self.geyser.pk)
+
+    def test_co_booking_raises_score(self):
+        from Booking.models import Booking
+        similarity.rebuild()
+        kitchen = self.neighbours(self.kitchen)
+        self.assertLess(kitchen.index(self.geyser.pk), kitchen.index(self.pipe.pk))
+
+        for service in (self.kitchen, self.pipe):
+            Booking.objects.create(
+                user=self.customer, service=service, date='2025-07-01', time='10:00',
+                name='Uma', contact='0300', location='DHA',
+            )
+        similarity.rebuild()
+        kitchen = self.neighbours(self.kitchen)
+        self.assertLess(kitchen.index(self.pipe.pk), kitchen.index(self.geyser.pk))
+
+    def test_service_changes_update_index(self):
+        similarity.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            Service.objects.get(pk=self.geyser.pk).save()
+            self.geyser.save(update_fields=['thumbnail_variants'])
+        self.assertFalse(Job.objects.filter(name='services.update_similar_services').exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.geyser.name = 'Sofa steam cleaning'
+            self.geyser.category = 'Cleaning'
+            self.geyser.description = 'Steam clean for sofas'
+            self.geyser.price = '850.00'
+            self.geyser.save()
+        self.assertIn(self.neighbours(self.geyser)[0], (self.sofa.pk, self.couch.pk))
+        self.assertCountEqual(self.neighbours(self.sofa)[:2], [self.couch.pk, self.geyser.pk])
+        self.assertNotEqual(self.neighbours(self.pipe)[0], self.geyser.pk)
+
+    def test_updates_reuse_the_loaded_catalogue(self):
+        similarity.rebuild()
+        with mock.patch.object(similarity.Catalogue, 'load', wraps=similarity.Catalogue.load) as load:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.geyser.name = 'Sofa steam cleaning'
+                self.geyser.save()
+            self.assertEqual(load.call_count, 0)
+            self.assertIn(self.sofa.pk, self.neighbours(self.geyser)[:2])
+
+            # Created without signals, as by another process: reload.
+            Service.objects.bulk_create([Service(
+                provider=self.sofa.provider, name='Couch shampoo', description='Shampoo for couches', price='700.00',
+                duration_minutes=60, thumbnail='service_thumbnails/x.jpg',
+            )])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.sofa.price = '750.00'
+                self.sofa.save()
+            self.assertEqual(load.call_count, 1)
+
+    def test_delete_refills_lists(self):
+        with mock.patch.object(similarity, 'NEIGHBOURS', 2):
+            similarity.rebuild()
+            self.assertEqual(self.neighbours(self.sofa), [self.couch.pk, self.kitchen.pk])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.couch.delete()
+        self.assertEqual(len(self.neighbours(self.sofa)), 2)
+        self.assertEqual(self.neighbours(self.sofa)[0], self.kitchen.pk)
+
+    def test_endpoint_reads_stored_neighbours(self):
+        similarity.rebuild()
+        with self.assertNumQueries(3):
+            response = APIClient().get(f'/api/services/{self.sofa.pk}/similar/?limit=2')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([row['id'] for row in data], [self.couch.pk, self.kitchen.pk])
+        self.assertEqual(data[0]['name'], 'Sofa and couch cleaning')
+        self.assertGreater(data[0]['score'], data[1]['score'])
+
+        self.assertEqual(APIClient().get(f'/api/services/{self.sofa.pk}/similar/?limit=0').status_code, 400)
+        self.assertEqual(APIClient().get('/api/services/999999/similar/').status_code, 404)
+        SimilarService.objects.all().delete()
+        self.assertEqual(APIClient().get(f'/api/services/{self.sofa.pk}/similar/').json(), [])
+
+
+class AsyncCatalogueViewTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.provider = make_provider('xavi', latitude=31.5, longitude=74.3)
+        self.services = [make_service(self.provider, gallery=2, name=f'Service {i}', price=f'{1000 + i}.00') for i in range(3)]
+
+    def test_list_matches_sync_view(self):
+        for query in ('?page_size=2', '?ordering=-price&category=Cleaning'):
+            sync = APIClient().get('/api/services/' + query)
+            get_cache().clear()
+            response = async_get('/api/services/' + query)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, sync.content)
+            self.assertEqual(response['ETag'], sync['ETag'])
+
+    def test_list_follows_cursor(self):
+        first = async_get('/api/services/?page_size=2').json()
+        second = async_get(first['next']).json()
+        self.assertEqual([row['id'] for row in second['results']], [self.services[2].pk])
+        self.assertIsNone(second['next'])
+
+    def test_detail_matches_sync_view(self):
+        url = f'/api/services/{self.services[0].pk}/'
+        sync = APIClient().get(url)
+        get_cache().clear()
+        response = async_get(url)
+        self.assertEqual(response.content, sync.content)
+        self.assertEqual(async_get(url, headers={'If-None-Match': sync['ETag']}).status_code, 304)
+
+    def test_errors(self):
+        self.assertEqual(async_get('/api/services/999999/').status_code, 404)
+        response = async_get('/api/services/?ordering=name')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.json())
+
+    def test_cached_list_stays_on_the_event_loop(self):
+        async_get('/api/services/')
+        # Where Django hands middleware hooks and cache calls to the sync thread.
+        with mock.patch('django.utils.deprecation.sync_to_async') as middleware_hop, \
+                mock.patch('django.core.handlers.base.sync_to_async') as handler_hop, \
+                mock.patch('django.core.cache.backends.base.sync_to_async') as cache_hop:
+            response = async_get('/api/services/')
+        self.assertEqual(response.status_code, 200)
+        middleware_hop.assert_not_called()
+        handler_hop.assert_not_called()
+        cache_hop.assert_not_called()
+
+    def test_session_responses_still_run_in_a_thread(self):
+        with mock.patch('Backend.middleware.sync_to_async', wraps=sync_to_async) as hop:
+            response = async_get('/admin/login/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(hop.called)
+
+
+class IncompleteBaseClassTests(SimpleTestCase):
+    def test_projection_without_represent_fails_to_instantiate(self):
+        class Partial(Projection):
+            serializer_class = ServiceSerializer
+
+        with self.assertRaises(TypeError):
+            Partial({})
+
+    def test_async_view_without_aget_fails_to_route(self):
+        class Partial(AsyncAPIView):
+            pass
+
+        with self.assertRaises(TypeError):
+            Partial.as_view()
+
+
+class ServiceProjectionParityTests(TestCase):
+    def setUp(self):
+        pictured = make_provider(
+            'wren', bio='Ten years of experience',
+            profile_picture_variants={
+                'source': 'provider_profiles/wren.jpg', 'small': 'provider_profiles/wren_small.jpg',
+                'digests': {'provider_profiles/wren.jpg': 'a1', 'provider_profiles/wren_small.jpg': 'b2'},
+            },
+        )
+        bare = make_provider('xavi', profile_picture=None)
+        make_service(
+            pictured, price='999.50',
+            thumbnail_variants={
+                'source': 'service_thumbnails/thumb.jpg', 'small': 'service_thumbnails/thumb_small.jpg',
+                'digests': {'service_thumbnails/thumb.jpg': 'c3'},
+            },
+        )
+        # Stale variants, left over from a replaced thumbnail.
+        make_service(pictured, gallery=0, thumbnail_variants={'source': 'service_thumbnails/old.jpg', 'small': 'x.jpg'})
+        make_service(bare, gallery=3, thumbnail='', category='Repair')
+        image = ServiceImage.objects.first()
+        image.variants = {
+            'source': image.image.name, 'medium': 'service_galleries/medium.jpg',
+            'digests': {image.image.name: 'd4', 'service_galleries/medium.jpg': 'e5'},
+        }
+        image.save()
+        Service.objects.filter(provider=pictured).update(
+            rating_avg=4.25, rating_count=4, rating_sum=17, rating_4_count=3, rating_5_count=1,
+        )
+        self.request = APIRequestFactory().get('/api/services/')
+
+    def test_renders_the_same_bytes_as_the_serializer(self):
+        queryset = Service.objects.select_related('provider__user').prefetch_related('gallery_images').order_by('id')
+        context = {'request': self.request}
+        expected = JSONRenderer().render(ServiceSerializer(queryset, many=True, context=context).data)
+        projection = ServiceProjection(context)
+        with self.assertNumQueries(2):
+            rows = list(projection.values(queryset))
+            actual = JSONRenderer().render(projection.represent(rows))
+        self.assertEqual(actual, expected)
+
+    def test_list_endpoint_pages_through_projection(self):
+        get_cache().clear()
+        first = APIClient().get('/api/services/?page_size=2&ordering=rating').json()
+        second = APIClient().get(first['next']).json()
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(ids, list(Service.objects.order_by('-rating_avg', '-rating_count', '-id').values_list('id', flat=True)))
+        self.assertEqual(async_get('/api/services/?page_size=2&ordering=rating').json(), first)
+
+
+class MediaURLTests(TestCase):
+    def setUp(self):
+        self.provider = make_provider('yara', profile_picture_variants={
+            'source': 'provider_profiles/yara.jpg', '128': 'derivatives/provider_profiles/yara_128.webp',
+            'digests': {'provider_profiles/yara.jpg': 'f00d', 'derivatives/provider_profiles/yara_128.webp': 'beef'},
+        })
+        self.service = make_service(self.provider, gallery=1)
+
+    def render(self, request=None):
+        context = {'request': request} if request else {}
+        return ServiceSerializer(self.service, context=context).data
+
+    def test_request_host_and_digest(self):
+        data = self.render(APIRequestFactory().get('/api/services/'))
+        self.assertEqual(data['provider_image'], 'http://testserver/provider_profiles/yara.jpg?v=f00d')
+        self.assertEqual(data['provider_image_variants'], {
+            '128': 'http://testserver/derivatives/provider_profiles/yara_128.webp?v=beef',
+        })
+        self.assertEqual(data['thumbnail'], 'http://testserver/service_thumbnails/thumb.jpg')
+
+    def test_without_request_urls_are_relative(self):
+        data = self.render()
+        self.assertEqual(data['provider_image'], '/provider_profiles/yara.jpg?v=f00d')
+        self.assertEqual(data['gallery_images'][0]['image'], f'/service_galleries/{self.service.pk}_0.jpg')
+
+    @override_settings(MEDIA_CDN_ORIGIN='https://cdn.example.com/', MEDIA_URL_VERSIONING=False)
+    def test_cdn_origin_replaces_host(self):
+        for request in (None, APIRequestFactory().get('/api/services/')):
+            data = self.render(request)
+            self.assertEqual(data['provider_image'], 'https://cdn.example.com/provider_profiles/yara.jpg')
+            self.assertEqual(data['thumbnail'], 'https://cdn.example.com/service_thumbnails/thumb.jpg')
+
+    def test_host_is_resolved_once_per_request(self):
+        request = APIRequestFactory().get('/api/services/')
+        with mock.patch.object(type(request), 'get_host', autospec=True, return_value='api.example.com') as get_host:
+            data = self.render(request)
+        self.assertEqual(get_host.call_count, 1)
+        self.assertEqual(data['provider_image'], 'http://api.example.com/provider_profiles/yara.jpg?v=f00d')
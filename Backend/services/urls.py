@@ -3,6 +3,7 @@ from .views import (
     CreateProviderProfileView,
     UpdateProviderProfileView,
     CreateServiceView,
+    BulkCreateServiceView,
     UpdateServiceView,
     RetrieveProviderProfileView,
     ListProviderServicesView,
@@ -10,17 +11,24 @@ from .views import (
     DeleteServiceView,
     ListAllServicesView,
     PublicRetrieveServiceView,
+    ServiceSearchView,
+    SimilarServicesView,
+    NearbyProvidersView,
 )
 
 urlpatterns = [
     path('create-profile/', CreateProviderProfileView.as_view(), name='create-provider-profile'),
     path('update-profile/', UpdateProviderProfileView.as_view(), name='update-provider-profile'),
     path('add-service/', CreateServiceView.as_view(), name='add-service'),
+    path('add-service/bulk/', BulkCreateServiceView.as_view(), name='bulk-add-service'),
     path('update-service/<int:pk>/', UpdateServiceView.as_view(), name='update-service'),
     path('profile/', RetrieveProviderProfileView.as_view(), name='get-provider-profile'),
     path('provider/services/', ListProviderServicesView.as_view(), name='list-provider-services'),
     path('provider/services/<int:pk>/', RetrieveServiceView.as_view(), name='retrieve-service'),
     path('services/<int:pk>/', PublicRetrieveServiceView.as_view(), name='public-retrieve-service'),
+    path('services/<int:pk>/similar/', SimilarServicesView.as_view(), name='similar-services'),
     path('delete-service/<int:id>/', DeleteServiceView.as_view(), name='delete-service'),
     path('services/', ListAllServicesView.as_view(), name='list-all-services'),
+    path('services/search/', ServiceSearchView.as_view(), name='search-services'),
+    path('providers/nearby/', NearbyProvidersView.as_view(), name='nearby-providers'),
 ]
@@ -1,14 +1,24 @@
+from decimal import Decimal
+
+from django.db import transaction
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.exceptions import NotFound, ValidationError
-from .models import ServiceProvider, Service
+from .models import ServiceProvider, Service, SimilarService
 from .serializers import ServiceProviderSerializer, ServiceSerializer
 from rest_framework.generics import DestroyAPIView
 from .models import ServiceImage
 from rest_framework.generics import ListAPIView
 from rest_framework.exceptions import NotFound
 from au.authentication import FirebaseAuthentication
+from jobs.queue import enqueue
+from Backend.async_views import AsyncAPIView
+from Backend.db_router import ReplicaReadMixin
+from Backend.pagination import KeysetPagination
+from Backend.projection import ProjectionListMixin
+from . import cache, geo, search
+from .projections import ServiceProjection
 
 
 class CreateProviderProfileView(generics.CreateAPIView):
@@ -19,7 +29,9 @@ class CreateProviderProfileView(generics.CreateAPIView):
     def perform_create(self, serializer):
         if ServiceProvider.objects.filter(user=self.request.user).exists():
             raise ValidationError("Profile already exists.")
-        serializer.save(user=self.request.user)
+        provider = serializer.save(user=self.request.user)
+        if provider.profile_picture:
+            enqueue('services.process_profile_picture', provider_id=provider.pk)
 
 
 class UpdateProviderProfileView(generics.UpdateAPIView):
@@ -33,6 +45,11 @@ class UpdateProviderProfileView(generics.UpdateAPIView):
         except ServiceProvider.DoesNotExist:
             raise NotFound("Service provider profile does not exist.")
 
+    def perform_update(self, serializer):
+        provider = serializer.save()
+        if 'profile_picture' in serializer.validated_data and provider.profile_picture:
+            enqueue('services.process_profile_picture', provider_id=provider.pk)
+
 
 class CreateServiceView(generics.CreateAPIView):
     serializer_class = ServiceSerializer
@@ -52,10 +69,50 @@ class CreateServiceView(generics.CreateAPIView):
             image = ServiceImage.objects.create(image=file)
             service.gallery_images.add(image)
 
+        enqueue('services.process_service_images', service_id=service.pk)
         return Response(self.get_serializer(service).data, status=status.HTTP_201_CREATED)
 
 
 
+class BulkCreateServiceView(APIView):
+    """
+    Import up to ``max_items`` services from a JSON list for the current
+    provider. The whole batch is validated first and nothing is written if
+    any item is invalid; otherwise it goes in with one bulk INSERT. Images
+    are not part of the import and can be uploaded per service afterwards.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [FirebaseAuthentication]
+    max_items = 500
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of services.'}, status=400)
+        if len(items) > self.max_items:
+            return Response({'error': f'At most {self.max_items} services per request.'}, status=400)
+        try:
+            provider = ServiceProvider.objects.get(user=request.user)
+        except ServiceProvider.DoesNotExist:
+            raise NotFound("Service provider profile does not exist.")
+
+        serializer = ServiceSerializer(data=items, many=True, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        services = []
+        for data in serializer.validated_data:
+            data.pop('gallery', None)
+            services.append(Service(provider=provider, **data))
+
+        with transaction.atomic():
+            Service.objects.bulk_create(services, batch_size=500)
+            # bulk_create skips post_save, so do what the signals would.
+            search.index_services(services)
+            enqueue('services.update_similar_services', service_ids=[service.pk for service in services])
+        cache.invalidate_services([service.pk for service in services])
+
+        return Response({'created': len(services), 'ids': [s.pk for s in services]}, status=status.HTTP_201_CREATED)
+
+
 class UpdateServiceView(generics.RetrieveUpdateAPIView):
     serializer_class = ServiceSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -65,8 +122,13 @@ class UpdateServiceView(generics.RetrieveUpdateAPIView):
         provider = ServiceProvider.objects.get(user=self.request.user)
         return Service.objects.filter(provider=provider)
 
+    def perform_update(self, serializer):
+        service = serializer.save()
+        if 'thumbnail' in serializer.validated_data or 'gallery' in serializer.validated_data:
+            enqueue('services.process_service_images', service_id=service.pk)
+
 
-class RetrieveProviderProfileView(APIView):
+class RetrieveProviderProfileView(ReplicaReadMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
     authentication_classes = [FirebaseAuthentication]
 
@@ -79,18 +141,21 @@ class RetrieveProviderProfileView(APIView):
             return Response({}, status=status.HTTP_200_OK)
 
 
-class ListProviderServicesView(generics.ListAPIView):
+class ListProviderServicesView(ReplicaReadMixin, ProjectionListMixin, generics.ListAPIView):
     serializer_class = ServiceSerializer
+    projection_class = ServiceProjection
     permission_classes = [permissions.IsAuthenticated]
     authentication_classes = [FirebaseAuthentication]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
 
     def get_queryset(self):
         provider = ServiceProvider.objects.get(user=self.request.user)
-        return Service.objects.filter(provider=provider)
+        return Service.objects.filter(provider=provider).select_related('provider__user').prefetch_related('gallery_images')
 
 
 
-class RetrieveServiceView(generics.RetrieveAPIView):
+class RetrieveServiceView(ReplicaReadMixin, generics.RetrieveAPIView):
     serializer_class = ServiceSerializer
     permission_classes = [permissions.IsAuthenticated]
     authentication_classes = [FirebaseAuthentication]
@@ -111,11 +176,46 @@ class DeleteServiceView(DestroyAPIView):
     serializer_class = ServiceSerializer
     lookup_field = 'id'
 
-class ListAllServicesView(ListAPIView):
-    queryset = Service.objects.all()
+class CatalogueQueryMixin:
+    orderings = {
+        'id': ('id',),
+        'rating': ('-rating_avg', '-rating_count', '-id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+    }
+
+    @property
+    def keyset_ordering(self):
+        ordering = self.request.query_params.get('ordering', 'id')
+        if ordering not in self.orderings:
+            raise ValidationError({'ordering': f"Must be one of: {', '.join(self.orderings)}."})
+        return self.orderings[ordering]
+
+    def catalogue_queryset(self):
+        # provider/provider.user are joined and the gallery is prefetched so
+        # the page costs a fixed number of queries regardless of its size.
+        return Service.objects.select_related('provider__user').prefetch_related('gallery_images')
+
+    def filter_catalogue(self, queryset):
+        category = self.request.query_params.get('category')
+        if category:
+            queryset = queryset.filter(category=category)
+        return queryset
+
+
+class ListAllServicesView(CatalogueQueryMixin, ProjectionListMixin, ListAPIView):
     serializer_class = ServiceSerializer
+    projection_class = ServiceProjection
     permission_classes = []
     authentication_classes = []
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return self.filter_catalogue(self.catalogue_queryset())
+
+    def get(self, request, *args, **kwargs):
+        render = super().get
+        return cache.cached_response(request, cache.list_cache_key(request), lambda: render(request, *args, **kwargs))
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -123,13 +223,159 @@ class ListAllServicesView(ListAPIView):
         return context
 
 
-class PublicRetrieveServiceView(generics.RetrieveAPIView):
-    queryset = Service.objects.all()
+class PublicRetrieveServiceView(CatalogueQueryMixin, generics.RetrieveAPIView):
     serializer_class = ServiceSerializer
     permission_classes = [permissions.AllowAny]
     authentication_classes = []
 
+    def get_queryset(self):
+        return self.catalogue_queryset()
+
+    def get(self, request, *args, **kwargs):
+        render = super().get
+        key = cache.detail_cache_key(request, kwargs['pk'])
+        return cache.cached_response(request, key, lambda: render(request, *args, **kwargs))
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request  
-        return context
\ No newline at end of file
+        return context
+
+
+class AsyncListAllServicesView(CatalogueQueryMixin, AsyncAPIView):
+    """ASGI counterpart of ListAllServicesView: same cache entries and body."""
+
+    async def aget(self, request):
+        self.request = request
+        key = await cache.alist_cache_key(request)
+        return await cache.acached_response(request, key, lambda: self.render_page(request))
+
+    async def render_page(self, request):
+        paginator = KeysetPagination()
+        projection = ServiceProjection({'request': request})
+        queryset = projection.values(self.filter_catalogue(self.catalogue_queryset()))
+        rows = await paginator.apaginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(await projection.arepresent(rows))
+
+
+class AsyncPublicRetrieveServiceView(CatalogueQueryMixin, AsyncAPIView):
+    """ASGI counterpart of PublicRetrieveServiceView."""
+
+    async def aget(self, request, pk):
+        key = await cache.adetail_cache_key(request, pk)
+        return await cache.acached_response(request, key, lambda: self.render_detail(request, pk))
+
+    async def render_detail(self, request, pk):
+        service = await self.catalogue_queryset().filter(pk=pk).afirst()
+        if service is None:
+            raise NotFound('No Service matches the given query.')
+        return Response(ServiceSerializer(service, context={'request': request}).data)
+
+
+class SimilarServicesView(ReplicaReadMixin, APIView):
+    """
+    Up to ``limit`` services most like this one, best first, each with its
+    similarity ``score``, read from the precomputed index in
+    services.similarity (not imported here: it loads NumPy).
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def get(self, request, pk):
+        try:
+            limit = int(request.query_params.get('limit', SimilarService.NEIGHBOURS))
+        except ValueError:
+            raise ValidationError("limit must be a number.")
+        if not 0 < limit <= SimilarService.NEIGHBOURS:
+            raise ValidationError(f"limit must be between 1 and {SimilarService.NEIGHBOURS}.")
+
+        scores = dict(
+            SimilarService.objects.filter(service_id=pk).order_by('rank').values_list('similar_id', 'score')[:limit]
+        )
+        if not scores and not Service.objects.filter(pk=pk).exists():
+            raise NotFound('No Service matches the given query.')
+        projection = ServiceProjection({'request': request})
+        rows = {row['id']: row for row in projection.values(Service.objects.filter(id__in=list(scores)))}
+        data = projection.represent([rows[similar_id] for similar_id in scores if similar_id in rows])
+        for row in data:
+            row['score'] = round(scores[row['id']], 4)
+        return Response(data)
+
+
+class ServiceSearchView(ReplicaReadMixin, APIView):
+    """
+    Ranked full-text search over service name/description with facet counts.
+    Broad queries are ranked and counted over their newest matches only (see
+    ``search.CANDIDATE_LIMIT``); ``approximate`` is then true and ``count``
+    and the facets are estimates.
+
+    Query params: ``q``, ``category``, ``min_price``, ``max_price``,
+    ``min_duration``, ``max_duration``, ``limit`` and ``offset``.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request):
+        params = request.query_params
+        queryset = Service.objects.all()
+
+        category = params.get('category')
+        if category:
+            queryset = queryset.filter(category=category)
+        unfiltered = queryset
+        try:
+            for param, lookup, parse in (
+                ('min_price', 'price__gte', Decimal),
+                ('max_price', 'price__lte', Decimal),
+                ('min_duration', 'duration_minutes__gte', int),
+                ('max_duration', 'duration_minutes__lte', int),
+            ):
+                if params.get(param):
+                    value = parse(params[param])
+                    if isinstance(value, Decimal) and not value.is_finite():
+                        raise ValueError(value)
+                    queryset = queryset.filter(**{lookup: value})
+            limit = min(int(params.get('limit', self.default_limit)), self.max_limit)
+            offset = int(params.get('offset', 0))
+        except (ValueError, ArithmeticError):
+            raise ValidationError("Numeric filters, limit and offset must be finite numbers.")
+        if limit < 0 or offset < 0:
+            raise ValidationError("limit and offset must not be negative.")
+
+        ranked = search.ranked_matches(params.get('q', ''), queryset, offset, limit)
+        if ranked is not None:
+            page_ids, rows, scale = ranked
+            facets = search.facets(rows, scale)
+        else:
+            page_ids = list(queryset.order_by('id').values_list('id', flat=True)[offset:offset + limit])
+            if queryset is unfiltered:
+                facets, scale = search.catalogue_facets(category or None), 1
+            else:
+                rows, scale = search.sample(queryset)
+                facets = search.facets(rows, scale)
+
+        projection = ServiceProjection({'request': request})
+        page = {row['id']: row for row in projection.values(Service.objects.filter(id__in=page_ids))}
+        return Response({
+            'count': sum(facets['category'].values()),
+            'approximate': scale != 1,
+            'results': projection.represent([page[pk] for pk in page_ids if pk in page]),
+            'facets': facets,
+        })
+
+
+
+class NearbyProvidersView(ReplicaReadMixin, APIView):
+    """Providers within ``radius_km`` of ``lat``/``lng``, nearest first."""
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        latitude, longitude, radius_km = geo.parse_point_query(request.query_params)
+        providers = geo.within_radius(ServiceProvider.objects.select_related('user'), latitude, longitude, radius_km)
+        data = ServiceProviderSerializer(providers, many=True, context={'request': request}).data
+        for row, provider in zip(data, providers):
+            row['distance_km'] = provider.distance_km
+        return Response(data)
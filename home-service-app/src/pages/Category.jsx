@@ -13,7 +13,7 @@ const Category = () => {
   const fetchServices = async () => {
     try {
       const res = await axios.get('http://127.0.0.1:8000/api/services/');
-      setServices(res.data);
+      setServices(res.data.results);
     } catch (error) {
       console.error('Error fetching services:', error);
     }
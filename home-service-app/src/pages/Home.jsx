@@ -13,8 +13,8 @@ const Home = () => {
   const fetchServices = async () => {
     try {
       const res = await axios.get('http://127.0.0.1:8000/api/services/');
-      setServices(res.data);
-      setFilteredServices(res.data);
+      setServices(res.data.results);
+      setFilteredServices(res.data.results);
     } catch (error) {
       console.error('Error fetching services:', error);
     }
@@ -44,7 +44,7 @@ const MyBookings = () => {
         headers: { Authorization: `Bearer ${token}` },
       });
 
-      setBookings(res.data);
+      setBookings(res.data.results);
     } catch (err) {
       console.error(err);
       setError('Failed to load your bookings. Please try again.');
@@ -17,7 +17,7 @@ const ProviderAllServices = () => {
       if (!response.ok) throw new Error('Failed to fetch services');
 
       const data = await response.json();
-      setServices(data);
+      setServices(data.results);
     } catch (error) {
       console.error('Error:', error);
     } finally {
@@ -18,7 +18,7 @@ const ProviderBookings = () => {
         const res = await axios.get('http://127.0.0.1:8000/api/provider/bookings/', {
           headers: { Authorization: `Bearer ${token}` },
         });
-        setBookings(res.data);
+        setBookings(res.data.results);
       } catch (err) {
         setError('Failed to load bookings');
         console.error(err);
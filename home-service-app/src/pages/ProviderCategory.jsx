@@ -21,7 +21,7 @@ const ProviderCategory = () => {
       if (!response.ok) throw new Error('Failed to fetch provider services');
 
       const data = await response.json();
-      setServices(data);
+      setServices(data.results);
     } catch (error) {
       console.error('Error:', error);
     }
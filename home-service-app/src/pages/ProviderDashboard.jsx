@@ -26,7 +26,7 @@ const ProviderDashboard = () => {
       }
 
       const data = await response.json();
-      setProviderServices(data);
+      setProviderServices(data.results);
     } catch (error) {
       console.error('Error fetching services:', error);
     } finally {
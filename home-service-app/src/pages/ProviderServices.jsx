@@ -15,7 +15,7 @@ const ProviderServices = () => {
       const res = await axios.get('http://127.0.0.1:8000/api/provider/services/', {
         headers: { Authorization: `Bearer ${token}` },
       });
-      setServices(res.data);
+      setServices(res.data.results);
     } catch (err) {
       toast.error("Failed to fetch services");
     }
@@ -44,7 +44,7 @@ const ServiceDetail = () => {
     const fetchSimilarServices = async () => {
       try {
         const res = await axios.get(`http://127.0.0.1:8000/api/services/?category=${service.category}`);
-        const filtered = res.data.filter((s) => s.id !== service.id);
+        const filtered = res.data.results.filter((s) => s.id !== service.id);
         setSimilarServices(filtered);
       } catch (err) {
         console.error('Failed to fetch similar services', err);